@@ -1,11 +1,31 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from app.dependencies import get_capital_manager, get_trading_context, get_user_service
+from app.services.async_mongodb_service import AsyncMongoUserService
 from app.services.coin_extractor import TopCoinsExtractor
 from app.services.capital_manager import CapitalManager
-from app.services.coin_scheduler import CoinScheduler
-from app.trader_bot.coin_trader import CoinTrader
+from app.services.data_store import TimestampedDataStore
+from app.services.execution_log_store import ExecutionLogStore
+from app.services.job_events import JobCompletionEvents
+from app.services.top_coins_cache import TopCoinsCache
+from app.services.trading_context import TradingContext
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import json
 import logging
 
 coin_router = APIRouter()
+data_store = TimestampedDataStore()
+# Snapshots saved through TimestampedDataStore are read memory-mapped; the
+# scheduler's extractor still writes JSON, which loads through the extractor
+top_coins_cache = TopCoinsCache(
+    loader=lambda: data_store.load_latest_records("top_coins")
+    or TopCoinsExtractor().load_most_recent_data()
+)
+execution_events = JobCompletionEvents()
+execution_log_store = ExecutionLogStore()
 
 
 @coin_router.get("/top_coins")
@@ -13,31 +33,10 @@ async def list_top_coin(
     limit: int = Query(default=10, ge=1, description="Number of top coins to return")
 ):
     try:
-        # Initialize the TopCoinsExtractor
-        extractor = TopCoinsExtractor()
-
-        # Load the most recent top coins data
-        top_coins = extractor.load_most_recent_data()
-
-        # Check if data is available
-        if top_coins is None:
-            logging.warning("No top coins data found for history extraction")
-            print("No top coins data found. Run top coins extraction first.")
-            return {
-                "status": "Error",
-                "message": "No top coins data found. Please run top coins extraction first.",
-                "data": [],
-            }
-
-        # Apply the limit to the top_coins list
-        limited_coins = top_coins[:limit] if top_coins else []
-
-        # Return the limited top coins data in the response
-        return {
-            "status": "Success",
-            "message": f"Retrieved {len(limited_coins)} top coins successfully.",
-            "data": limited_coins,
-        }
+        # Serve the pre-serialized snapshot; it is only reloaded from disk
+        # after the scheduler writes a newer top_coins file
+        body = await top_coins_cache.get_response(limit)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logging.error(f"Error retrieving top coins: {str(e)}")
         return {
@@ -48,9 +47,10 @@ async def list_top_coin(
 
 
 @coin_router.get("/available")
-async def list_available_coins():
+async def list_available_coins(
+    capital_manager: CapitalManager = Depends(get_capital_manager),
+):
     try:
-        capital_manager = CapitalManager(initial_capital=0.0)
         available_coins = capital_manager.get_available_coins()
 
         if not available_coins:
@@ -75,11 +75,13 @@ async def list_available_coins():
 
 
 @coin_router.get("/report/{coin}")
-async def get_coin_report(coin: str):
+async def get_coin_report(
+    coin: str, context: TradingContext = Depends(get_trading_context)
+):
     try:
-        capital_manager = CapitalManager()
-        trader = CoinTrader(coin=coin, override=True, capital_manager=capital_manager)
-        report_data = trader.get_report(coin)
+        await context.refresh()
+        trader = context.get_trader(coin)
+        report_data = await run_in_threadpool(trader.get_report, coin)
 
         if report_data is None:
             logging.warning(f"No report found for coin {coin.upper()}")
@@ -106,12 +108,47 @@ async def get_coin_report(coin: str):
         }
 
 
+@coin_router.get("/trades/{coin}")
+async def list_coin_trades(
+    coin: str,
+    days: Optional[int] = Query(default=None, gt=0, description="Look-back window in days"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    user_service: AsyncMongoUserService = Depends(get_user_service),
+):
+    """Retrieve a page of a coin's trades from the trade ledger, newest first."""
+    start_date = datetime.utcnow() - timedelta(days=days) if days else None
+    try:
+        page = await user_service.get_trades(
+            coin.lower(), start_date=start_date, cursor=cursor, limit=limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "status": "Success",
+        "message": f"Retrieved {len(page['trades'])} trades for {coin.upper()}",
+        "data": page,
+    }
+
+
 @coin_router.get("/execution_log")
-async def get_execution_log():
-    """Retrieve the last execution details using the CoinScheduler."""
+async def get_execution_log(
+    since: Optional[datetime] = Query(
+        default=None, description="Only return executions after this ISO timestamp"
+    ),
+):
+    """Retrieve the last execution details recorded by the scheduler process."""
     try:
-        scheduler = CoinScheduler()
-        execution_log = scheduler.load_execution_log()
+        if since is not None:
+            entries = await run_in_threadpool(execution_log_store.since, since)
+            return {
+                "status": "Success",
+                "message": f"Retrieved {len(entries)} executions since {since.isoformat()}.",
+                "data": entries,
+            }
+
+        execution_log = await run_in_threadpool(execution_log_store.latest)
 
         if not execution_log:
             logging.warning("Execution log is empty or not found.")
@@ -134,10 +171,43 @@ async def get_execution_log():
             "data": {},
         }
 
+
+def _sse_event(event: dict) -> str:
+    """Format a job completion or failure as a Server-Sent Event."""
+    name = "job_failed" if "error" in event else "job_completed"
+    return f"event: {name}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@coin_router.get("/execution_log/stream")
+async def stream_execution_log(request: Request):
+    """Stream scheduler job completions as Server-Sent Events."""
+    queue = execution_events.subscribe()
+
+    async def events():
+        try:
+            # Start with the latest known entry per job
+            for job_name, entry in execution_events.latest().items():
+                yield _sse_event({"job": job_name, **entry})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event(event)
+        finally:
+            execution_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @coin_router.get("/capitals")
-def get_capitals():
+async def get_capitals(capital_manager: CapitalManager = Depends(get_capital_manager)):
     """Retrieve the current capital allocations for all coins."""
-    capital_manager = CapitalManager()  # Singleton instance
-    capital_manager.load_state()  # Ensure the latest state is loaded from the database
+    # The shared instance is reloaded only when the state version changes
     capitals = capital_manager.get_all_capitals()
     return capitals
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import Depends, Request
+from app.services.async_mongodb_service import AsyncMongoUserService
+from app.services.capital_manager import CapitalManager
+from app.services.trading_context import TradingContext
+
+
+def get_user_service(request: Request) -> AsyncMongoUserService:
+    """Return the process-wide async Mongo service."""
+    return request.app.state.trading_context.state_service
+
+
+def get_trading_context(request: Request) -> TradingContext:
+    """Return the TradingContext built in the app lifespan."""
+    return request.app.state.trading_context
+
+
+async def get_capital_manager(
+    context: TradingContext = Depends(get_trading_context),
+) -> CapitalManager:
+    """Return the shared CapitalManager with its state brought up to date."""
+    await context.refresh()
+    return context.capital_manager
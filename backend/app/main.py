@@ -1,9 +1,44 @@
-from fastapi import FastAPI
-from app.users.user import auth_router
-from app.coin.coin import coin_router
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from app.services.capital_manager import CapitalManager
+from app.services.metrics import MetricsMiddleware, render_metrics
+from app.services.trading_context import TradingContext
+from app.services.user_cache_sync import UserCacheSync
+from app.users.user import auth_router, user_service
+from app.coin.coin import (
+    coin_router,
+    execution_events,
+    execution_log_store,
+    top_coins_cache,
+)
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare shared services on startup and release them on shutdown."""
+    await user_service.ensure_indexes()
+    # One CapitalManager per process, shared by the auth and coin routers
+    app.state.trading_context = TradingContext(
+        lambda: CapitalManager(initial_capital=1000.0), user_service
+    )
+    await app.state.trading_context.refresh(force=True)
+    top_coins_cache.start()
+    # The scheduler runs in its own process; follow its execution log for SSE clients
+    follow_task = asyncio.create_task(
+        execution_events.follow(execution_log_store.latest)
+    )
+    # Other workers and the scheduler write users too; drop our stale copies
+    cache_sync_task = asyncio.create_task(UserCacheSync(user_service.users).run())
+    yield
+    cache_sync_task.cancel()
+    follow_task.cancel()
+    top_coins_cache.stop()
+    user_service.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,7 +52,17 @@ app.add_middleware(
         "OPTIONS",
     ],  # Explicitly allow OPTIONS
     allow_headers=["Authorization", "Content-Type"],  # Allow Authorization header
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor for /auth/users
 )
+# Outermost, so timings include CORS handling
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 # Include routers
@@ -0,0 +1,381 @@
+from typing import AsyncIterator, Optional, Dict, List
+from datetime import datetime
+from pymongo import ReturnDocument
+from bson import ObjectId
+import logging
+from app.services.mongodb_service import (
+    TRADE_PROJECTION,
+    USER_LIST_PROJECTION,
+    to_datetime,
+    build_profit_trend_pipeline,
+    profit_trend_filters,
+    rollup_covers,
+    rollup_operations,
+    select_rollup_resolution,
+    build_trade_query,
+    trade_page,
+)
+from app.services.mongo_client import close_mongo_clients, get_async_mongo_client
+from app.services.metrics import instrument_mongo_service
+from app.services.user_cache import user_cache
+from app.users.models import SocialProvider, UserRole
+
+
+@instrument_mongo_service
+class AsyncMongoUserService:
+    """
+    Motor-backed counterpart of MongoUserService for the FastAPI process.
+
+    Exposes the same user, balance, wallet and profit-trend methods as
+    coroutines so request handlers never block the event loop on a Mongo
+    round-trip. The synchronous MongoUserService stays in use by the
+    scheduler process, CapitalManager and balance changes, which the API
+    runs in the threadpool.
+    """
+
+    def __init__(self):
+        """Initialize the Motor client and set up collections."""
+        try:
+            # Motor binds to the running event loop lazily on first use
+            self.client = get_async_mongo_client()
+            self.db = self.client.user_management
+            self.users = self.db.users
+            self.trading_state = self.db.trading_state
+            self.coin_states = self.db.coin_trading_state
+            self.trades = self.db.trades
+
+            logging.info("Async MongoDB client initialized")
+        except Exception as e:
+            logging.error(f"Failed to initialize async MongoDB client: {str(e)}")
+            raise
+
+    async def ensure_indexes(self):
+        """Create the indexes the user queries rely on."""
+        await self.users.create_index("email", unique=True)
+        await self.users.create_index([("social_id", 1), ("provider", 1)], unique=True)
+        # Polled by UserCacheSync when change streams are unavailable
+        await self.users.create_index("updated_at")
+        await self.trades.create_index([("coin", 1), ("timestamp", -1)])
+        await self.trades.create_index([("user_id", 1), ("coin", 1), ("timestamp", -1)])
+
+    def close(self):
+        """Close the shared Mongo clients of this process."""
+        close_mongo_clients()
+
+    async def create_user(
+        self,
+        email: str,
+        social_id: str,
+        provider: SocialProvider,
+        name: str,
+        profile_picture: Optional[str] = None,
+    ) -> Dict:
+        """Create a new user with social login details."""
+        try:
+            user = {
+                "email": email,
+                "social_id": social_id,
+                "provider": provider.value,
+                "name": name,
+                "discord": "",
+                "telegram": "",
+                "whatsapp": "",
+                "profile_picture": profile_picture,
+                "role": UserRole.USER.value,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+                "last_login": datetime.utcnow(),
+            }
+
+            result = await self.users.insert_one(user)
+            user["_id"] = result.inserted_id
+            return user
+        except Exception as e:
+            logging.error(f"Failed to create user: {str(e)}")
+            raise
+
+    async def get_all_users(self) -> List[Dict]:
+        """Retrieve all users."""
+        try:
+            return await self.users.find().to_list(length=None)
+        except Exception as e:
+            logging.error(f"Failed to get all users: {str(e)}")
+            return []
+
+    async def list_users_after(
+        self, after: Optional[str] = None, limit: int = 100
+    ) -> List[Dict]:
+        """
+        Retrieve a page of users ordered by `_id`, projected to the listing fields.
+
+        Args:
+            after (Optional[str]): Return users whose ID sorts after this one.
+            limit (int): Maximum number of users to return.
+
+        Returns:
+            List[Dict]: Up to `limit` projected user documents.
+        """
+        query = {"_id": {"$gt": ObjectId(after)}} if after else {}
+        return (
+            await self.users.find(query, USER_LIST_PROJECTION)
+            .sort("_id", 1)
+            .limit(limit)
+            .to_list(length=limit)
+        )
+
+    async def iter_users(
+        self, batch_size: int = 1000, projection: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """Stream every user, projected to the listing fields by default, in `_id` order."""
+        cursor = (
+            self.users.find({}, projection or USER_LIST_PROJECTION)
+            .sort("_id", 1)
+            .batch_size(batch_size)
+        )
+        async for user in cursor:
+            yield user
+
+    async def get_user_by_social_id(
+        self, social_id: str, provider: SocialProvider
+    ) -> Optional[Dict]:
+        """Retrieve user by social ID and provider."""
+        return await self.users.find_one(
+            {"social_id": social_id, "provider": provider.value}
+        )
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict]:
+        """Retrieve user by email."""
+        return await self.users.find_one({"email": email})
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict]:
+        """Retrieve user by MongoDB ID."""
+        try:
+            return await self.users.find_one({"_id": ObjectId(user_id)})
+        except Exception as e:
+            logging.error(f"Failed to get user by ID: {str(e)}")
+            return None
+
+    async def update_user_role(self, user_id: str, role: UserRole) -> bool:
+        """Update user's role (admin/user)."""
+        try:
+            result = await self.users.update_one(
+                {"_id": ObjectId(user_id)},
+                {"$set": {"role": role.value, "updated_at": datetime.utcnow()}},
+            )
+            user_cache.invalidate(user_id)
+            return result.modified_count > 0
+        except Exception as e:
+            logging.error(f"Failed to update user role: {str(e)}")
+            return False
+
+    async def social_login(
+        self, social_id: str, provider: SocialProvider
+    ) -> Optional[Dict]:
+        """Handle social login and update last login timestamp."""
+        try:
+            return await self.users.find_one_and_update(
+                {"social_id": social_id, "provider": provider.value},
+                {"$set": {"last_login": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER,
+            )
+        except Exception as e:
+            logging.error(f"Failed to process social login: {str(e)}")
+            return None
+
+    async def list_users(self, skip: int = 0, limit: int = 50) -> List[Dict]:
+        """Retrieve a paginated list of users."""
+        try:
+            return await self.users.find().skip(skip).limit(limit).to_list(length=limit)
+        except Exception as e:
+            logging.error(f"Failed to list users: {str(e)}")
+            return []
+
+    async def list_admins(self) -> List[Dict]:
+        """Retrieve all admin users."""
+        try:
+            return await self.users.find({"role": UserRole.ADMIN.value}).to_list(
+                length=None
+            )
+        except Exception as e:
+            logging.error(f"Failed to list admins: {str(e)}")
+            return []
+
+    async def delete_user(self, user_id: str) -> bool:
+        """Delete a user by ID."""
+        try:
+            result = await self.users.delete_one({"_id": ObjectId(user_id)})
+            user_cache.invalidate(user_id)
+            return result.deleted_count > 0
+        except Exception as e:
+            logging.error(f"Failed to delete user: {str(e)}")
+            return False
+
+    async def deposit_balance(self, user_id: str, coin: str, amount: float) -> bool:
+        """Increase the user's balance for a specific coin."""
+        try:
+            result = await self.users.update_one(
+                {"_id": ObjectId(user_id)},
+                {
+                    "$inc": {f"balances.{coin}": amount},
+                    "$set": {"updated_at": datetime.utcnow()},
+                },
+            )
+            user_cache.invalidate(user_id)
+            if result.modified_count == 0:
+                logging.warning(
+                    f"No user found or balance unchanged for user_id: {user_id}, coin: {coin}"
+                )
+            return result.modified_count > 0
+        except Exception as e:
+            logging.error(
+                f"Failed to deposit balance for user_id: {user_id}, coin: {coin}: {str(e)}"
+            )
+            raise
+
+    async def withdraw_balance(self, user_id: str, coin: str, amount: float) -> bool:
+        """Decrease the user's balance for a specific coin if sufficient funds exist."""
+        try:
+            result = await self.users.update_one(
+                {
+                    "_id": ObjectId(user_id),
+                    f"balances.{coin}": {"$gte": amount},  # Ensure sufficient balance
+                },
+                {
+                    "$inc": {f"balances.{coin}": -amount},
+                    "$set": {"updated_at": datetime.utcnow()},
+                },
+            )
+            user_cache.invalidate(user_id)
+            if result.matched_count == 0:
+                logging.warning(
+                    f"Insufficient balance or user not found for user_id: {user_id}, coin: {coin}"
+                )
+            return result.matched_count > 0 and result.modified_count > 0
+        except Exception as e:
+            logging.error(
+                f"Failed to withdraw balance for user_id: {user_id}, coin: {coin}: {str(e)}"
+            )
+            raise
+
+    async def get_trading_state_version(self) -> int:
+        """Return the version stamp of the scheduler's trading state (0 if unset)."""
+        state = await self.trading_state.find_one(
+            {"_id": "scheduler_state"}, {"version": 1}
+        )
+        return state.get("version", 0) if state else 0
+
+    async def get_trades(
+        self,
+        coin: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> Dict:
+        """Retrieve one page of a coin's trades, newest first (see MongoUserService.get_trades)."""
+        query = build_trade_query(coin, start_date, end_date, user_id, cursor)
+        try:
+            docs = (
+                await self.trades.find(query, TRADE_PROJECTION)
+                .sort([("timestamp", -1), ("_id", -1)])
+                .limit(limit + 1)
+                .to_list(length=limit + 1)
+            )
+            return trade_page(docs, limit)
+        except Exception as e:
+            logging.error(f"Failed to retrieve trades for {coin}: {str(e)}")
+            return {"trades": [], "next_cursor": None}
+
+    async def add_wallet(self, user_id: str, coin: str, wallet_address: str) -> bool:
+        """Add or update a wallet address for a specific coin for the user."""
+        try:
+            result = await self.users.update_one(
+                {"_id": ObjectId(user_id)},
+                {
+                    "$set": {
+                        f"wallets.{coin}": wallet_address,
+                        "updated_at": datetime.utcnow(),
+                    }
+                },
+            )
+            user_cache.invalidate(user_id)
+            return result.modified_count > 0
+        except Exception as e:
+            logging.error(
+                f"Failed to add wallet for user_id: {user_id}, coin: {coin}: {str(e)}"
+            )
+            return False
+
+    async def get_wallet(self, user_id: str, coin: str) -> Optional[str]:
+        """Retrieve the wallet address for a specific coin for the user."""
+        try:
+            user = await self.users.find_one(
+                {"_id": ObjectId(user_id)}, {"wallets": 1}
+            )
+            if user and "wallets" in user and coin in user["wallets"]:
+                return user["wallets"][coin]
+            return None
+        except Exception as e:
+            logging.error(
+                f"Failed to get wallet for user_id: {user_id}, coin: {coin}: {str(e)}"
+            )
+            return None
+
+    async def insert_profit_snapshot(self, snapshot: Dict) -> bool:
+        """Insert a profit snapshot and fold it into the hourly and daily rollups."""
+        try:
+            snapshot = {**snapshot, "timestamp": to_datetime(snapshot.get("timestamp"))}
+            result = await self.db.profit_snapshots.insert_one(snapshot)
+            await self.db.profit_rollups.bulk_write(
+                rollup_operations(snapshot), ordered=False
+            )
+            return result.inserted_id is not None
+        except Exception as e:
+            logging.error(f"Failed to insert profit snapshot: {str(e)}")
+            return False
+
+    async def get_profit_trend(
+        self,
+        coin: str,
+        start_date: datetime,
+        end_date: datetime,
+        points: Optional[int] = None,
+        interval: Optional[str] = None,
+        mode: str = "last",
+    ) -> List[Dict]:
+        """Retrieve profit trend data for a coin from rollups or raw snapshots."""
+        resolution = select_rollup_resolution(start_date, end_date, points, interval)
+        try:
+            if resolution:
+                pipeline = build_profit_trend_pipeline(
+                    coin, start_date, end_date, points, interval, mode, resolution
+                )
+                raw, rollup = profit_trend_filters(
+                    coin, start_date, end_date, resolution
+                )
+                raw_bounds = [
+                    await self.db.profit_snapshots.find_one(
+                        raw, {"timestamp": 1}, sort=[("timestamp", order)]
+                    )
+                    for order in (1, -1)
+                ]
+                rollup_bounds = [
+                    await self.db.profit_rollups.find_one(
+                        rollup, {"timestamp": 1}, sort=[("timestamp", order)]
+                    )
+                    for order in (1, -1)
+                ]
+                if rollup_covers(resolution, raw_bounds, rollup_bounds):
+                    return await self.db.profit_rollups.aggregate(pipeline).to_list(
+                        length=None
+                    )
+            pipeline = build_profit_trend_pipeline(
+                coin, start_date, end_date, points, interval, mode
+            )
+            return await self.db.profit_snapshots.aggregate(pipeline).to_list(
+                length=None
+            )
+        except Exception as e:
+            logging.error(f"Failed to retrieve profit trend: {str(e)}")
+            return []
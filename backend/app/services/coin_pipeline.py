@@ -0,0 +1,341 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from apscheduler.events import EVENT_JOB_ADDED
+from app.services.execution_log_store import ExecutionLogStore
+from app.services.mongodb_service import trading_state_scope
+
+# Seconds a timed-out worker process gets to exit after SIGTERM before SIGKILL
+TERMINATE_GRACE = 5.0
+# APScheduler id of the chain step that trades every coin
+TRADING_JOB_ID = "trading_bot"
+
+
+def load_pipeline(path: str) -> Callable[[str, threading.Event], Any]:
+    """
+    Resolve a per-coin pipeline from a `module:function` path.
+
+    The function runs one coin's CoinTrader lifecycle as `function(coin,
+    cancel_event)` and should return early once `cancel_event` is set.
+
+    Raises:
+        ValueError: If `path` is not of the form `module:function`.
+    """
+    module_name, _, function_name = path.partition(":")
+    if not module_name or not function_name:
+        raise ValueError(f"Expected module:function, got {path!r}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def available_coins() -> List[str]:
+    """Return the coins the CapitalManager trades, from the stored state."""
+    from app.services.capital_manager import CapitalManager
+
+    capital_manager = CapitalManager()
+    capital_manager.load_state()
+    return list(capital_manager.get_available_coins())
+
+
+def _run_scoped(run_coin: Callable, coin: str, cancel_event: threading.Event):
+    """Run one coin with its trading state saves limited to that coin."""
+    with trading_state_scope([coin]):
+        return run_coin(coin, cancel_event)
+
+
+def _run_in_process(run_coin: Callable, coin: str, conn):
+    """Process entry point: run the coin and send back None or the error."""
+    try:
+        _run_scoped(run_coin, coin, threading.Event())
+        conn.send(None)
+    except BaseException as e:
+        conn.send(str(e) or type(e).__name__)
+    finally:
+        conn.close()
+
+
+class ParallelCoinRunner:
+    """
+    Runs one pipeline per coin concurrently for the trading_bot chain step.
+
+    Each coin's pipeline is called as `run_coin(coin, cancel_event)` in its
+    own worker, at most `max_workers` at a time, so a chain over many coins
+    takes about as long as its slowest coin instead of the sum. Every coin's
+    outcome is appended to the execution log store as `<job_name>:<coin>`.
+    `attach` makes it the function of the scheduler's trading_bot job.
+    Workers save the trading state inside a `trading_state_scope` of their
+    coin, so they never overwrite each other's coins.
+
+    With `executor='process'` (the default) every coin runs in a fresh
+    process, which is terminated when the coin runs past `coin_timeout`;
+    `run_coin` must then be a picklable module-level function. With
+    `executor='thread'` a timed-out coin's `cancel_event` is set and the
+    runner returns without waiting for it; a `run_coin` that ignores the
+    event keeps its thread busy until it returns on its own.
+    """
+
+    def __init__(
+        self,
+        run_coin: Callable[[str, threading.Event], Any],
+        max_workers: Optional[int] = None,
+        coin_timeout: Optional[float] = None,
+        executor: Optional[str] = None,
+        store: Optional[ExecutionLogStore] = None,
+        job_name: str = TRADING_JOB_ID,
+        coins: Callable[[], Iterable[str]] = available_coins,
+    ):
+        """
+        Args:
+            run_coin (Callable): Runs the pipeline for one coin, e.g. from
+                `load_pipeline`.
+            max_workers (Optional[int]): Max coins in flight; defaults to
+                TRADING_MAX_PARALLEL or 4.
+            coin_timeout (Optional[float]): Seconds allowed per coin; defaults to
+                TRADING_COIN_TIMEOUT or 900.
+            executor (Optional[str]): 'process' or 'thread'; defaults to
+                TRADING_EXECUTOR or 'process'.
+            store (Optional[ExecutionLogStore]): Where per-coin outcomes are recorded.
+            job_name (str): Id of the job to run as, and prefix of the per-coin
+                execution log entries.
+            coins (Callable): Returns the coins a job run trades; defaults to
+                `available_coins`.
+        """
+        self.run_coin = run_coin
+        self.max_workers = max_workers or int(os.getenv("TRADING_MAX_PARALLEL", "4"))
+        self.coin_timeout = coin_timeout or float(
+            os.getenv("TRADING_COIN_TIMEOUT", "900")
+        )
+        self.executor = executor or os.getenv("TRADING_EXECUTOR", "process")
+        if self.executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {self.executor}")
+        self.store = store
+        self.job_name = job_name
+        self.coins = coins
+
+    @classmethod
+    def from_env(
+        cls, store: Optional[ExecutionLogStore] = None
+    ) -> Optional["ParallelCoinRunner"]:
+        """
+        Build a runner for the pipeline named by TRADING_PIPELINE.
+
+        Returns:
+            Optional[ParallelCoinRunner]: None when TRADING_PIPELINE is unset.
+        """
+        path = os.getenv("TRADING_PIPELINE")
+        if not path:
+            logging.info("TRADING_PIPELINE not set; trading_bot trades coins serially")
+            return None
+        return cls(load_pipeline(path), store=store)
+
+    def attach(self, scheduler):
+        """
+        Make `run_job` the function of the APScheduler job named `job_name`.
+
+        The job keeps its id, trigger and place in the chain. If it is not
+        registered yet, or is added again later, it is replaced when added.
+
+        Args:
+            scheduler: The APScheduler instance, e.g. `CoinScheduler.scheduler`.
+        """
+
+        def replace(job_id: str):
+            job = scheduler.get_job(job_id)
+            if job is not None and job.func != self.run_job:
+                scheduler.modify_job(job_id, func=self.run_job, args=(), kwargs={})
+                logging.info(
+                    f"{job_id} now runs up to {self.max_workers} coins at once"
+                )
+
+        def on_added(event):
+            if event.job_id == self.job_name:
+                replace(event.job_id)
+
+        scheduler.add_listener(on_added, EVENT_JOB_ADDED)
+        replace(self.job_name)
+
+    def run_job(self):
+        """
+        Run every coin as one scheduler job.
+
+        Raises:
+            RuntimeError: If a coin failed or timed out, so the job is
+                reported as failed; the other coins still ran.
+        """
+        results = self.run(self.coins())
+        failed = sorted(
+            coin for coin, result in results.items() if result["status"] != "completed"
+        )
+        if failed:
+            raise RuntimeError(
+                f"Trading pipeline did not complete for {len(failed)} of "
+                f"{len(results)} coins: {', '.join(failed)}"
+            )
+
+    def _record(self, coin: str, result: Dict):
+        """Append a coin's outcome to the execution log store."""
+        if self.store is None:
+            return
+        try:
+            self.store.append(
+                f"{self.job_name}:{coin}",
+                {"last_execution": datetime.now(timezone.utc).isoformat(), **result},
+            )
+        except Exception as e:
+            logging.error(f"Failed to record completion for {coin}: {e}")
+
+    def _finish(self, results: Dict, coin: str, duration: float, error: Optional[str]):
+        if error is None:
+            results[coin] = {"status": "completed", "duration": duration}
+        else:
+            logging.error(f"Trading pipeline failed for {coin}: {error}")
+            results[coin] = {"status": "failed", "duration": duration, "error": error}
+        self._record(coin, results[coin])
+
+    def _time_out(self, results: Dict, coin: str, duration: float):
+        logging.warning(
+            f"Trading pipeline for {coin} timed out after {self.coin_timeout}s"
+        )
+        results[coin] = {
+            "status": "timeout",
+            "duration": duration,
+            "error": f"Timed out after {self.coin_timeout}s",
+        }
+        self._record(coin, results[coin])
+
+    def run(self, coins: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Run the pipeline for every coin and wait for all of them to finish or time out.
+
+        Returns:
+            Dict[str, Dict]: Per coin, its `status` ('completed', 'failed' or
+            'timeout'), `duration` in seconds and `error` when it did not complete.
+        """
+        coins = list(coins)
+        if not coins:
+            return {}
+        if self.executor == "process":
+            results = self._run_processes(coins)
+        else:
+            results = self._run_threads(coins)
+        completed = sum(1 for r in results.values() if r["status"] == "completed")
+        logging.info(f"Trading pipelines finished: {completed}/{len(coins)} completed")
+        return results
+
+    def _run_processes(self, coins) -> Dict[str, Dict]:
+        queue = list(coins)
+        running: Dict[str, tuple] = {}
+        results: Dict[str, Dict] = {}
+        try:
+            while queue or running:
+                while queue and len(running) < self.max_workers:
+                    coin = queue.pop(0)
+                    receiver, sender = multiprocessing.Pipe(duplex=False)
+                    process = multiprocessing.Process(
+                        target=_run_in_process,
+                        args=(self.run_coin, coin, sender),
+                        name=f"{self.job_name}:{coin}",
+                    )
+                    process.start()
+                    sender.close()
+                    running[coin] = (process, receiver, time.monotonic())
+
+                now = time.monotonic()
+                nearest = min(start for _, _, start in running.values())
+                wait_connections(
+                    [process.sentinel for process, _, _ in running.values()],
+                    timeout=max(0.0, nearest + self.coin_timeout - now),
+                )
+
+                now = time.monotonic()
+                for coin, (process, receiver, start) in list(running.items()):
+                    if not process.is_alive():
+                        process.join()
+                        error = self._read_outcome(process, receiver)
+                        self._finish(results, coin, now - start, error)
+                    elif now - start >= self.coin_timeout:
+                        self._stop_process(process)
+                        self._time_out(results, coin, now - start)
+                    else:
+                        continue
+                    receiver.close()
+                    del running[coin]
+        finally:
+            for process, receiver, _ in running.values():
+                self._stop_process(process)
+                receiver.close()
+        return results
+
+    @staticmethod
+    def _read_outcome(process, receiver) -> Optional[str]:
+        """Return the error a finished worker reported, or None if it completed."""
+        try:
+            if receiver.poll():
+                return receiver.recv()
+        except EOFError:
+            pass
+        # Died without reporting, e.g. killed or crashed in native code
+        return f"Worker exited with code {process.exitcode}"
+
+    @staticmethod
+    def _stop_process(process):
+        process.terminate()
+        process.join(TERMINATE_GRACE)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _run_threads(self, coins) -> Dict[str, Dict]:
+        results: Dict[str, Dict] = {}
+        futures: Dict[Future, str] = {}
+        events: Dict[Future, threading.Event] = {}
+        started: Dict[Future, float] = {}
+        pool = ThreadPoolExecutor(max_workers=min(self.max_workers, len(coins)))
+        try:
+            for coin in coins:
+                event = threading.Event()
+                future = pool.submit(_run_scoped, self.run_coin, coin, event)
+                futures[future] = coin
+                events[future] = event
+
+            pending = set(futures)
+            while pending:
+                now = time.monotonic()
+                for future in pending:
+                    if future not in started and future.running():
+                        started[future] = now
+
+                # Wake on a completion, the nearest deadline, or to spot new starts
+                deadlines = [
+                    started[f] + self.coin_timeout for f in pending if f in started
+                ]
+                timeout = min([1.0] + [max(0.0, d - now) for d in deadlines])
+                done, pending = wait(
+                    pending, timeout=timeout, return_when=FIRST_COMPLETED
+                )
+
+                for future in done:
+                    error = future.exception()
+                    self._finish(
+                        results,
+                        futures[future],
+                        time.monotonic() - started.get(future, now),
+                        None if error is None else str(error),
+                    )
+
+                now = time.monotonic()
+                for future in list(pending):
+                    if future in started and now - started[future] >= self.coin_timeout:
+                        events[future].set()
+                        pending.discard(future)
+                        self._time_out(results, futures[future], now - started[future])
+        finally:
+            # Timed-out coins are abandoned rather than waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+        return results
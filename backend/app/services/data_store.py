@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from app.services.file_manager import TIMESTAMP_PATTERN, DataCleaner
+
+STORAGE_FORMATS = ("feather", "parquet", "json")
+
+# Row filters in pyarrow's DNF form, e.g. [("symbol", "=", "BTCUSDT")]
+Filters = Optional[List]
+
+
+class TimestampedDataStore:
+    """
+    Reads and writes timestamped datasets under the data directory.
+
+    Files are named `<base>_YYYYMMDD_HHMMSS.<ext>`, the naming DataCleaner
+    groups on. Datasets are written as uncompressed Arrow IPC (Feather v2)
+    files by default, so reading the latest one maps the file and its columns
+    are used in place without decoding or copying. Parquet is available
+    through DATA_STORAGE_FORMAT=parquet when files should be smaller; it is
+    memory-mapped too, and only the requested columns and row groups matching
+    `filters` are read. JSON stays available through DATA_STORAGE_FORMAT=json,
+    and JSON files already on disk are still readable with the same
+    column/filter arguments.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "data",
+        storage_format: Optional[str] = None,
+        cleaner: Optional[DataCleaner] = None,
+    ):
+        """
+        Args:
+            data_dir (str): Root directory of the timestamped files. Defaults to 'data'.
+            storage_format (Optional[str]): 'feather', 'parquet' or 'json'.
+                Defaults to DATA_STORAGE_FORMAT or 'feather'.
+            cleaner (Optional[DataCleaner]): Notified of every written file, so its
+                incremental cleanup sees new snapshots without a watcher.
+        """
+        self.data_dir = Path(data_dir)
+        self.storage_format = (
+            storage_format or os.getenv("DATA_STORAGE_FORMAT", "feather")
+        ).lower()
+        if self.storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format: {self.storage_format}")
+        self.cleaner = cleaner
+        self.parquet_compression = os.getenv("DATA_PARQUET_COMPRESSION", "none")
+
+    @staticmethod
+    def _to_table(data) -> pa.Table:
+        if isinstance(data, pd.DataFrame):
+            return pa.Table.from_pandas(data, preserve_index=False)
+        return pa.Table.from_pylist(list(data))
+
+    def _write_feather(self, path: Path, data) -> None:
+        # Compressed buffers would have to be decoded, defeating the zero-copy read
+        feather.write_feather(self._to_table(data), path, compression="uncompressed")
+
+    def _write_parquet(self, path: Path, data) -> None:
+        pq.write_table(self._to_table(data), path, compression=self.parquet_compression)
+
+    def _write_json(self, path: Path, data) -> None:
+        if isinstance(data, pd.DataFrame):
+            data = json.loads(data.to_json(orient="records", date_format="iso"))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, default=str)
+
+    def save(
+        self,
+        base_name: str,
+        data: Union[pd.DataFrame, Sequence[Dict]],
+        subdir: str = "",
+        timestamp: Optional[datetime] = None,
+    ) -> Optional[Path]:
+        """
+        Write a dataset as a new timestamped file.
+
+        The file is written under a temporary name and renamed into place, so
+        readers and watchers never see a partial file. Data that cannot be
+        represented as an Arrow table (e.g. mixed types in one column) is
+        written as JSON instead.
+
+        Args:
+            base_name (str): Base of the file name, e.g. 'top_coins'.
+            data: A DataFrame or a list of records.
+            subdir (str): Directory under the data directory.
+            timestamp (Optional[datetime]): Timestamp in the file name. Defaults to now.
+
+        Returns:
+            Optional[Path]: The written file, or None on failure.
+        """
+        directory = self.data_dir / subdir
+        stamp = (timestamp or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        formats = [self.storage_format]
+        if self.storage_format != "json":
+            formats.append("json")
+
+        for storage_format in formats:
+            path = directory / f"{base_name}_{stamp}.{storage_format}"
+            tmp_path = path.with_name(path.name + ".tmp")
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                if storage_format == "feather":
+                    self._write_feather(tmp_path, data)
+                elif storage_format == "parquet":
+                    self._write_parquet(tmp_path, data)
+                else:
+                    self._write_json(tmp_path, data)
+                os.replace(tmp_path, path)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                logging.warning(
+                    f"Cannot store {base_name} as {storage_format}, using JSON: {e}"
+                )
+                tmp_path.unlink(missing_ok=True)
+                continue
+            except Exception as e:
+                logging.error(f"Failed to write {path}: {str(e)}")
+                tmp_path.unlink(missing_ok=True)
+                return None
+
+            if self.cleaner is not None:
+                self.cleaner.record_file(path)
+            return path
+        return None
+
+    def latest_path(self, base_name: str, subdir: str = "") -> Optional[Path]:
+        """
+        Return the most recent file of a dataset in any supported format.
+
+        Args:
+            base_name (str): Base of the file name, e.g. 'top_coins'.
+            subdir (str): Directory under the data directory.
+
+        Returns:
+            Optional[Path]: The latest file, or None if there is none.
+        """
+        pattern = re.compile(re.escape(base_name) + TIMESTAMP_PATTERN)
+        latest, latest_stamp = None, ""
+        try:
+            entries = os.scandir(self.data_dir / subdir)
+        except FileNotFoundError:
+            return None
+        with entries:
+            for entry in entries:
+                match = pattern.match(entry.name)
+                if (
+                    match
+                    and match.group(2) in STORAGE_FORMATS
+                    and match.group(1) > latest_stamp
+                ):
+                    latest, latest_stamp = Path(entry.path), match.group(1)
+        return latest
+
+    def read_table(
+        self,
+        path: Path,
+        columns: Optional[List[str]] = None,
+        filters: Filters = None,
+    ) -> pa.Table:
+        """
+        Read a dataset file as an Arrow table.
+
+        Args:
+            path (Path): A Feather, Parquet or JSON file written by this store.
+            columns (Optional[List[str]]): Columns to read. Defaults to all.
+            filters: Row filters in pyarrow's DNF form.
+
+        Returns:
+            pa.Table: The selected rows and columns.
+        """
+        if path.suffix == ".parquet":
+            # Memory-mapped read with column projection and row-group pruning
+            return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+        if path.suffix == ".feather":
+            # Zero-copy: the columns point into the mapped file
+            table = feather.read_table(path, memory_map=True)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            table = pa.Table.from_pylist(data if isinstance(data, list) else [data])
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        if columns is not None:
+            table = table.select(columns)
+        return table
+
+    def load_latest_table(
+        self,
+        base_name: str,
+        subdir: str = "",
+        columns: Optional[List[str]] = None,
+        filters: Filters = None,
+    ) -> Optional[pa.Table]:
+        """
+        Load the most recent dataset as an Arrow table.
+
+        Returns:
+            Optional[pa.Table]: The table, or None if there is no file or it cannot be read.
+        """
+        path = self.latest_path(base_name, subdir)
+        if path is None:
+            return None
+        try:
+            return self.read_table(path, columns=columns, filters=filters)
+        except Exception as e:
+            logging.error(f"Failed to read {path}: {str(e)}")
+            return None
+
+    def load_latest_frame(
+        self,
+        base_name: str,
+        subdir: str = "",
+        columns: Optional[List[str]] = None,
+        filters: Filters = None,
+    ) -> Optional[pd.DataFrame]:
+        """Load the most recent dataset as a pandas DataFrame."""
+        table = self.load_latest_table(base_name, subdir, columns, filters)
+        return table.to_pandas() if table is not None else None
+
+    def load_latest_records(
+        self,
+        base_name: str,
+        subdir: str = "",
+        columns: Optional[List[str]] = None,
+        filters: Filters = None,
+    ) -> Optional[List[Dict]]:
+        """
+        Load the most recent dataset as a list of records, like the JSON loaders return.
+
+        A JSON file read without columns or filters is returned as stored, so
+        records that do not fit an Arrow schema still load.
+        """
+        if columns is None and not filters:
+            path = self.latest_path(base_name, subdir)
+            if path is not None and path.suffix == ".json":
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        return json.load(f)
+                except Exception as e:
+                    logging.error(f"Failed to read {path}: {str(e)}")
+                    return None
+        table = self.load_latest_table(base_name, subdir, columns, filters)
+        return table.to_pylist() if table is not None else None
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+
+def _as_aware(value) -> Optional[datetime]:
+    """Parse an ISO timestamp (or datetime) as an aware datetime."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class ExecutionLogStore:
+    """
+    Append-only JSON-lines store of scheduler job executions.
+
+    The scheduler process appends one line per completed job. Readers keep a
+    byte offset and only parse lines appended since their last read, holding
+    the latest entry per job and a bounded tail of recent entries in memory.
+
+    Appends and `compact` also take an flock on `<path>.lock`, shared for
+    appends and exclusive for compaction, so an entry appended by another
+    process is never lost while the file is rewritten.
+    """
+
+    def __init__(
+        self,
+        path: str = "data/execution_log.jsonl",
+        max_recent: int = 10000,
+        keep_per_job: int = 100,
+    ):
+        """
+        Args:
+            path (str): Location of the JSON-lines file.
+            max_recent (int): Number of recent entries kept in memory for `since`.
+            keep_per_job (int): Entries per job retained by `compact`.
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.keep_per_job = keep_per_job
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._inode = None
+        self._latest: Dict[str, Dict] = {}
+        self._recent = deque(maxlen=max_recent)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Hold the cross-process lock on the log, exclusive or shared."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        # A separate file, since compaction replaces the log and its inode
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, job_name: str, entry: Dict):
+        """Append a job execution entry."""
+        line = json.dumps({"job": job_name, **entry}, default=str)
+        with self._lock, self._file_lock(exclusive=False):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        self.refresh()
+
+    def refresh(self):
+        """Read entries appended since the last refresh into the in-memory index."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return
+            size = stat.st_size
+            if stat.st_ino != self._inode or size < self._offset:
+                # File was compacted or replaced; rebuild from the start
+                self._inode = stat.st_ino
+                self._offset = 0
+                self._latest = {}
+                self._recent.clear()
+            if size == self._offset:
+                return
+
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(size - self._offset)
+
+            # Leave a partially written trailing line for the next refresh
+            end = chunk.rfind(b"\n") + 1
+            for raw in chunk[:end].splitlines():
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    logging.warning(f"Skipping malformed execution log line: {raw!r}")
+                    continue
+                job_name = record.pop("job", None)
+                if job_name is None:
+                    continue
+                self._latest[job_name] = record
+                self._recent.append((job_name, record))
+            self._offset += end
+
+    def latest(self) -> Dict[str, Dict]:
+        """Return the latest entry per job, in the shape of `load_execution_log()`."""
+        self.refresh()
+        with self._lock:
+            return dict(self._latest)
+
+    def since(self, since: datetime) -> List[Dict]:
+        """Return entries whose `last_execution` is after `since`, oldest first."""
+        since = _as_aware(since)
+        self.refresh()
+        with self._lock:
+            recent = list(self._recent)
+        entries = []
+        for job_name, record in recent:
+            executed_at = _as_aware(record.get("last_execution"))
+            if executed_at is not None and executed_at > since:
+                entries.append({"job": job_name, **record})
+        return entries
+
+    def compact(self):
+        """Rewrite the file keeping only the last `keep_per_job` entries per job."""
+        with self._lock, self._file_lock(exclusive=True):
+            if not os.path.exists(self.path):
+                return
+            per_job = defaultdict(lambda: deque(maxlen=self.keep_per_job))
+            lines = []
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        job_name = json.loads(line).get("job")
+                    except ValueError:
+                        continue
+                    per_job[job_name].append(len(lines))
+                    lines.append(line)
+            keep = sorted(i for indexes in per_job.values() for i in indexes)
+            if len(keep) == len(lines):
+                return
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(lines[i] for i in keep)
+            os.replace(tmp_path, self.path)
+            self._offset = 0
+            self._latest = {}
+            self._recent.clear()
+            logging.info(
+                f"Compacted execution log from {len(lines)} to {len(keep)} entries"
+            )
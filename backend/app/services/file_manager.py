@@ -1,65 +1,535 @@
+import json
 import re
+import tarfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from collections import defaultdict
 from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
 import os
 import logging
+from apscheduler.events import EVENT_JOB_EXECUTED
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+# Timestamp suffix in the format '_YYYYMMDD_HHMMSS' before the extension
+TIMESTAMP_PATTERN = r"_(\d{8}_\d{6})\.(\w+)$"
+
+# Index of timestamped files kept by DataCleaner, relative to its data directory
+INDEX_FILE_NAME = ".cleaner_index.json"
+
+# Directory under the data directory holding per-day archives of older snapshots
+ARCHIVE_DIR_NAME = "archive"
+
+# Each archiving run adds its own '<base>_<YYYYMMDD>.<ext>.<HHMMSS>.tar.gz' per
+# day, named after the newest snapshot in it, instead of rewriting the day's
+# archive; '<base>_<YYYYMMDD>.<ext>.*.tar.gz' lists a day's archives
+ARCHIVE_NAME_FORMAT = "{base}_{day}.{ext}.{time}.tar.gz"
+
+GroupKey = Tuple[str, str, str]
+
+
+def parse_timestamped_name(file_name: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Split a timestamped file name into its parts.
+
+    Args:
+        file_name (str): e.g. 'top_coins_20250414_120000.json'.
+
+    Returns:
+        Optional[Tuple[str, str, str]]: (base, timestamp, extension), or None if the
+        name has no valid timestamp.
+    """
+    match = re.search(TIMESTAMP_PATTERN, file_name)
+    if not match:
+        return None
+    try:
+        datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    except ValueError:
+        logging.warning(f"Invalid timestamp format in file: {file_name}")
+        return None
+    return file_name[: match.start(1) - 1], match.group(1), match.group(2)
+
+
+class _IndexEventHandler(FileSystemEventHandler):
+    """Keeps a DataCleaner's file index in step with the data directory."""
+
+    def __init__(self, cleaner: "DataCleaner"):
+        self.cleaner = cleaner
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.cleaner.record_file(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.cleaner.record_deleted(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.cleaner.record_deleted(event.src_path)
+            self.cleaner.record_file(event.dest_path)
+
+
+def select_retained(
+    files: Dict[str, str], keep_last: int = 1, keep_hourly: int = 0, keep_daily: int = 0
+) -> Set[str]:
+    """
+    Pick the files of a group that a retention policy keeps.
+
+    Args:
+        files (Dict[str, str]): File names mapped to their 'YYYYMMDD_HHMMSS' timestamps.
+        keep_last (int): Number of most recent files kept.
+        keep_hourly (int): Number of most recent hours for which the latest file is kept.
+        keep_daily (int): Number of most recent days for which the latest file is kept.
+
+    Returns:
+        Set[str]: Names of the files to keep.
+    """
+    # Timestamps are fixed-width, so they sort as strings
+    ordered = sorted(files, key=files.get, reverse=True)
+    keep = set(ordered[:keep_last])
+    hours, days = set(), set()
+    for file_name in ordered:
+        timestamp = files[file_name]
+        hour, day = timestamp[:11], timestamp[:8]
+        if len(hours) < keep_hourly and hour not in hours:
+            hours.add(hour)
+            keep.add(file_name)
+        if len(days) < keep_daily and day not in days:
+            days.add(day)
+            keep.add(file_name)
+    return keep
+
 
 class DataCleaner:
-    def __init__(self, data_dir: str = "data"):
+    def __init__(
+        self,
+        data_dir: str = "data",
+        index_path: Optional[str] = None,
+        keep_last: Optional[int] = None,
+        keep_hourly: Optional[int] = None,
+        keep_daily: Optional[int] = None,
+        archive: Optional[bool] = None,
+        max_workers: Optional[int] = None,
+    ):
         """
         Initialize the DataCleaner with the directory to clean.
 
+        Retention defaults come from DATA_KEEP_LAST (1), DATA_KEEP_HOURLY (0),
+        DATA_KEEP_DAILY (0), DATA_ARCHIVE (false) and DATA_CLEANER_WORKERS (2),
+        which together keep only the most recent file per group, as before.
+
         Args:
             data_dir (str): The root directory to scan for timestamped files. Defaults to 'data'.
+            index_path (Optional[str]): Where the file index is persisted. Defaults to
+                '.cleaner_index.json' inside `data_dir`.
+            keep_last (Optional[int]): Number of most recent files kept per group.
+            keep_hourly (Optional[int]): Hours for which the latest file is also kept.
+            keep_daily (Optional[int]): Days for which the latest file is also kept.
+            archive (Optional[bool]): Pack files outside the retention policy into
+                tar.gz archives under 'archive/', one per day and run, instead of
+                deleting them.
+            max_workers (Optional[int]): Threads deleting and archiving files.
         """
         self.data_dir = Path(data_dir)
         # Regex pattern to match timestamps in the format '_YYYYMMDD_HHMMSS' before the extension
-        self.timestamp_pattern = r"_(\d{8}_\d{6})\.(\w+)$"
+        self.timestamp_pattern = TIMESTAMP_PATTERN
+        self.index_path = Path(index_path) if index_path else self.data_dir / INDEX_FILE_NAME
+        self.observer = None
+        self._lock = threading.RLock()
+        # (directory relative to data_dir, base, extension) -> {file name: timestamp}
+        self._groups: Dict[GroupKey, Dict[str, str]] = {}
+        # Groups that gained files since they were last cleaned
+        self._dirty: Set[GroupKey] = set()
+        self._index_loaded = False
+        # Runs cleanups one at a time in the background
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._queued: Optional[Tuple[bool, Future]] = None
+        if keep_last is None:
+            keep_last = int(os.getenv("DATA_KEEP_LAST", "1"))
+        if keep_hourly is None:
+            keep_hourly = int(os.getenv("DATA_KEEP_HOURLY", "0"))
+        if keep_daily is None:
+            keep_daily = int(os.getenv("DATA_KEEP_DAILY", "0"))
+        self.keep_last = max(1, keep_last)
+        self.keep_hourly = keep_hourly
+        self.keep_daily = keep_daily
+        self.archive = (
+            archive
+            if archive is not None
+            else os.getenv("DATA_ARCHIVE", "false").lower() in ("1", "true", "yes")
+        )
+        self.max_workers = max_workers or int(os.getenv("DATA_CLEANER_WORKERS", "2"))
+
+    def _group_entry(self, path) -> Optional[Tuple[GroupKey, str, str]]:
+        """Return (group key, file name, timestamp) for a timestamped file path."""
+        path = Path(path)
+        parsed = parse_timestamped_name(path.name)
+        if parsed is None:
+            return None
+        base, timestamp, extension = parsed
+        try:
+            directory = os.path.relpath(path.parent, self.data_dir)
+        except ValueError:
+            return None
+        if directory.startswith(".."):
+            return None
+        return (directory, base, extension), path.name, timestamp
+
+    def _path(self, key: GroupKey, file_name: str) -> Path:
+        return self.data_dir / key[0] / file_name
 
-    def clean_timestamped_files(self):
+    def record_file(self, path):
         """
-        Traverse the data directory, identify timestamped files, group them, and keep only the most recent one.
-        Files without timestamps are ignored.
+        Add a newly written timestamped file to the index.
+
+        Call this after writing a snapshot when no watcher is running, so the next
+        incremental cleanup knows the group changed.
+
+        Args:
+            path: Path of the file, inside the data directory.
         """
-        # Dictionary to group files by (directory, base_name, extension)
-        file_groups = defaultdict(list)
+        entry = self._group_entry(path)
+        if entry is None:
+            return
+        key, file_name, timestamp = entry
+        with self._lock:
+            files = self._groups.setdefault(key, {})
+            files[file_name] = timestamp
+            if len(files) > 1:
+                self._dirty.add(key)
+
+    def record_deleted(self, path):
+        """Drop a removed file from the index."""
+        entry = self._group_entry(path)
+        if entry is None:
+            return
+        key, file_name, _ = entry
+        with self._lock:
+            files = self._groups.get(key)
+            if files is not None:
+                files.pop(file_name, None)
+                if not files:
+                    del self._groups[key]
+                    self._dirty.discard(key)
+
+    def _read_index(
+        self,
+    ) -> Optional[Tuple[Dict[GroupKey, Dict[str, str]], Set[GroupKey]]]:
+        """Read the persisted index as (groups, dirty groups); None if unavailable."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            groups = {}
+            dirty = set()
+            for group in data["groups"]:
+                key = (group["dir"], group["base"], group["ext"])
+                groups[key] = dict(group["files"])
+                if group.get("dirty"):
+                    dirty.add(key)
+            return groups, dirty
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.error(f"Failed to load file index {self.index_path}: {str(e)}")
+            return None
 
-        # Step 1: Traverse all files in data_dir and its subdirectories
+    def _scan(self) -> Dict[GroupKey, Dict[str, str]]:
+        """List the timestamped files under the data directory by group."""
+        groups = defaultdict(dict)
+
+        # Traverse all files in data_dir and its subdirectories
         for root, _, files in os.walk(self.data_dir):
-            root_path = Path(root)
             for file in files:
-                file_path = root_path / file
-                # Step 2: Check if the file matches the timestamp pattern
-                match = re.search(self.timestamp_pattern, file)
-                if match:
-                    timestamp_str = match.group(1)  # e.g., '20250414_120000'
-                    extension = match.group(2)      # e.g., 'json'
-                    # Extract base name by removing the '_timestamp.extension' part
-                    base = file[:match.start(1) - 1]  # e.g., 'top_coins'
-                    # Use a tuple of (directory, base, extension) as the key
-                    key = (str(root_path), base, extension)
-                    
-                    # Step 3: Parse the timestamp for comparison
-                    try:
-                        timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-                        file_groups[key].append((file_path, timestamp))
-                    except ValueError:
-                        logging.warning(f"Invalid timestamp format in file: {file_path}")
-                        continue
-
-        # Step 4: Process each group to keep only the most recent file
-        for key, files in file_groups.items():
-            if len(files) > 1:  # Only proceed if there are duplicates
-                # Find the file with the latest timestamp
-                latest_file = max(files, key=lambda x: x[1])[0]  # x[1] is the timestamp
-                # Remove all other files in the group
-                for file_path, _ in files:
-                    if file_path != latest_file:
-                        logging.info(f"Deleting duplicate file: {file_path}")
-                        try:
-                            file_path.unlink()  # Delete the file
-                        except Exception as e:
-                            logging.error(f"Failed to delete {file_path}: {e}")
-            else:
-                logging.info(f"No duplicates found for {key[1]}.{key[2]} in {key[0]}")
\ No newline at end of file
+                entry = self._group_entry(Path(root) / file)
+                if entry is not None:
+                    key, file_name, timestamp = entry
+                    groups[key][file_name] = timestamp
+        return dict(groups)
+
+    def _swap_in(self, groups: Dict[GroupKey, Dict[str, str]], dirty: Set[GroupKey]):
+        """
+        Replace the index with a scan, keeping files recorded while it ran.
+
+        Call with the lock held. The scan ran without it, so a file the
+        watcher or `record_file` added meanwhile may be missing from it.
+        """
+        for key, files in self._groups.items():
+            for file_name, timestamp in files.items():
+                if file_name in groups.get(key, {}):
+                    continue
+                if self._path(key, file_name).exists():
+                    groups.setdefault(key, {})[file_name] = timestamp
+                    dirty.add(key)
+        self._groups = groups
+        self._dirty = {key for key in dirty if len(groups.get(key, {})) > 1}
+        self._index_loaded = True
+
+    def load_index(self) -> bool:
+        """
+        Load the persisted file index and reconcile it with the data directory.
+
+        The directory is listed once, so files written or removed while no
+        watcher was running (e.g. while the process was down) are not missed:
+        groups that gained files since the index was saved, or that were not
+        cleaned yet when it was saved, are marked for the next incremental
+        cleanup. Without a persisted index every group with several files is.
+
+        Returns:
+            bool: True if a persisted index was found.
+        """
+        persisted = self._read_index()
+        # List the directory without holding up watcher events
+        groups = self._scan()
+        if persisted is None:
+            dirty = set(groups)
+        else:
+            saved, saved_dirty = persisted
+            dirty = {
+                key
+                for key, files in groups.items()
+                if key in saved_dirty or set(files) - set(saved.get(key, {}))
+            }
+        with self._lock:
+            self._swap_in(groups, dirty | self._dirty)
+        return persisted is not None
+
+    def save_index(self):
+        """Persist the file index atomically."""
+        with self._lock:
+            data = {
+                "groups": [
+                    {
+                        "dir": key[0],
+                        "base": key[1],
+                        "ext": key[2],
+                        "files": files,
+                        "dirty": key in self._dirty,
+                    }
+                    for key, files in self._groups.items()
+                ]
+            }
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logging.error(f"Failed to save file index {self.index_path}: {str(e)}")
+
+    def rebuild_index(self):
+        """Rebuild the file index from a full scan of the data directory."""
+        groups = self._scan()
+        with self._lock:
+            self._swap_in(groups, set(groups))
+
+    def start_watching(self):
+        """Keep the index up to date from file system events under the data directory."""
+        if self.observer is not None:
+            return
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.observer = Observer()
+        self.observer.schedule(
+            _IndexEventHandler(self), path=str(self.data_dir), recursive=True
+        )
+        self.observer.daemon = True
+        self.observer.start()
+
+    def stop_watching(self):
+        """Stop the file system watcher."""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def _archive_path(self, key: GroupKey, day: str, newest: str) -> Path:
+        """Return a new archive for a group's files of one day, up to `newest`."""
+        directory, base, extension = key
+        folder = self.data_dir / ARCHIVE_DIR_NAME / directory
+        archive_name = ARCHIVE_NAME_FORMAT.format(
+            base=base, day=day, ext=extension, time=newest[9:]
+        )
+        path, suffix = folder / archive_name, 1
+        while path.exists():
+            suffix += 1
+            path = folder / archive_name.replace(".tar.gz", f"-{suffix}.tar.gz")
+        return path
+
+    def _archive_files(self, key: GroupKey, day: str, files: Dict[str, str]) -> List[str]:
+        """
+        Pack files of one day into a new archive of the group.
+
+        Earlier archives of the day are left as they are, so each run only
+        compresses the files it expires.
+
+        Args:
+            files (Dict[str, str]): File names mapped to their timestamps.
+
+        Returns:
+            List[str]: The names that were archived and can be deleted.
+        """
+        archive_path = self._archive_path(key, day, max(files.values()))
+        tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+        try:
+            archive_path.parent.mkdir(parents=True, exist_ok=True)
+            archived = []
+            with tarfile.open(tmp_path, "w:gz") as tmp_tar:
+                for file_name in sorted(files, key=files.get):
+                    file_path = self._path(key, file_name)
+                    if file_path.exists():
+                        tmp_tar.add(file_path, arcname=file_name)
+                    archived.append(file_name)
+            os.replace(tmp_path, archive_path)
+            logging.info(f"Archived {len(archived)} files into {archive_path}")
+            return archived
+        except Exception as e:
+            logging.error(f"Failed to archive files into {archive_path}: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return []
+
+    def _clean_group(self, key: GroupKey, files: Dict[str, str]) -> Dict[str, str]:
+        """
+        Apply the retention policy to a group, archiving or deleting the other files.
+
+        Args:
+            key (GroupKey): The group's (directory, base, extension).
+            files (Dict[str, str]): File names of the group mapped to their timestamps.
+
+        Returns:
+            Dict[str, str]: The files still present after cleaning.
+        """
+        keep = select_retained(files, self.keep_last, self.keep_hourly, self.keep_daily)
+        expired = [file_name for file_name in files if file_name not in keep]
+        removable = expired
+        if self.archive and expired:
+            by_day = defaultdict(dict)
+            for file_name in expired:
+                by_day[files[file_name][:8]][file_name] = files[file_name]
+            removable = []
+            for day, day_files in sorted(by_day.items()):
+                removable.extend(self._archive_files(key, day, day_files))
+
+        remaining = {file_name: files[file_name] for file_name in files}
+        # Remove all other files in the group
+        for file_name in removable:
+            file_path = self._path(key, file_name)
+            logging.info(f"Deleting duplicate file: {file_path}")
+            try:
+                file_path.unlink()  # Delete the file
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.error(f"Failed to delete {file_path}: {e}")
+                continue
+            del remaining[file_name]
+        return remaining
+
+    def _process_group(self, key: GroupKey, files: Dict[str, str]):
+        """Clean one group and drop the removed files from the index."""
+        remaining = self._clean_group(key, files)
+        with self._lock:
+            current = self._groups.get(key)
+            if current is not None:
+                for file_name in files:
+                    if file_name not in remaining:
+                        current.pop(file_name, None)
+
+    def clean_timestamped_files(self, incremental: Optional[bool] = None) -> Future:
+        """
+        Identify timestamped files, group them, and apply the retention policy to
+        each group (by default, keep only the most recent file). Files without
+        timestamps are ignored. Groups are cleaned concurrently on a thread pool.
+
+        The cleanup runs in the background and this returns at once; runs are
+        queued one after another, so a group is never cleaned twice at a time.
+
+        Args:
+            incremental (Optional[bool]): Only clean groups that gained files since
+                the last run, using the index kept up to date by `record_file` or
+                the watcher. The first run loads the persisted index and
+                reconciles it with the directory (see `load_index`). Defaults to
+                True while the watcher runs, and to a rescan of the whole data
+                directory otherwise.
+
+        Returns:
+            Future: Completes once the files are cleaned and the index is saved.
+        """
+        if incremental is None:
+            incremental = self.observer is not None
+        with self._lock:
+            queued = self._queued
+            if queued is not None and queued[0] == incremental and not (
+                queued[1].running() or queued[1].done()
+            ):
+                # A run that has not started yet will see the same changes
+                return queued[1]
+            if self._runner is None:
+                self._runner = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="data-cleaner"
+                )
+            future = self._runner.submit(self._clean, incremental)
+            self._queued = (incremental, future)
+            return future
+
+    def clean_after_jobs(self, scheduler):
+        """
+        Queue an incremental cleanup after every job an APScheduler runs.
+
+        Snapshots a job wrote are then cleaned as soon as it finishes, from
+        the index the watcher keeps, without waiting for the data_cleanup
+        step. Cleanups queued while another one waits to start are merged.
+
+        Args:
+            scheduler: The APScheduler scheduler, e.g. `CoinScheduler.scheduler`.
+        """
+
+        def on_job_executed(event):
+            try:
+                self.clean_timestamped_files(incremental=True)
+            except Exception as e:
+                logging.error(f"Failed to queue data cleanup after {event.job_id}: {e}")
+
+        scheduler.add_listener(on_job_executed, EVENT_JOB_EXECUTED)
+
+    def _clean(self, incremental: bool):
+        # Directory scans run before taking the lock
+        if not incremental:
+            self.rebuild_index()
+        elif not self._index_loaded:
+            self.load_index()
+        with self._lock:
+            # A full run visits every group, as before
+            keys = list(self._dirty if incremental else self._groups)
+            groups = {key: dict(self._groups[key]) for key in keys if key in self._groups}
+            self._dirty.difference_update(keys)
+
+        # Process groups outside the lock so watcher events are not held up
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for key, files in groups.items():
+                if len(files) > self.keep_last:  # Only proceed if something may expire
+                    futures.append(executor.submit(self._process_group, key, files))
+                else:
+                    logging.info(
+                        f"No duplicates found for {key[1]}.{key[2]} in {self._path(key, '')}"
+                    )
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Failed to clean file group: {e}")
+
+        self.save_index()
+
+    def close(self, wait: bool = True):
+        """Stop accepting cleanups, by default after the queued ones finish."""
+        with self._lock:
+            runner, self._runner = self._runner, None
+        if runner is not None:
+            runner.shutdown(wait=wait)
@@ -0,0 +1,134 @@
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth import jwt as google_jwt
+
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+
+# PEM certificates used by Google to sign OAuth2 ID tokens
+DEFAULT_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens against a locally cached set of signing certs.
+
+    Certs are fetched through one pooled session and kept for the
+    `Cache-Control: max-age` Google sends with them, so verifying a token is
+    normally local crypto only. A token signed with an unknown key id
+    triggers one early refetch (at most every `min_refresh_interval`
+    seconds), which picks up key rotations without letting bogus tokens
+    hammer the certs endpoint. `verify` blocks; call it from a threadpool.
+    """
+
+    def __init__(
+        self,
+        certs_url: Optional[str] = None,
+        timeout: float = 5.0,
+        default_max_age: int = 300,
+        min_refresh_interval: float = 30.0,
+        clock_skew: int = 10,
+    ):
+        """
+        Args:
+            certs_url (Optional[str]): Where the certs are fetched from. Defaults to
+                GOOGLE_CERTS_URL or Google's v1 certs endpoint (point it at a local
+                stub in tests).
+            timeout (float): Seconds per certs request.
+            default_max_age (int): Cache lifetime when the response has no max-age.
+            min_refresh_interval (float): Minimum seconds between forced refetches.
+            clock_skew (int): Seconds of clock skew tolerated on `iat`/`exp`.
+        """
+        self.certs_url = certs_url or os.getenv("GOOGLE_CERTS_URL", DEFAULT_CERTS_URL)
+        self.timeout = timeout
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.clock_skew = clock_skew
+        self._lock = threading.Lock()
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+    def _fetch(self):
+        """Download the certs and work out how long they may be cached."""
+        response = self._session.get(self.certs_url, timeout=self.timeout)
+        response.raise_for_status()
+        certs = response.json()
+        match = _MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        now = time.monotonic()
+        self._certs = certs
+        self._fetched_at = now
+        self._expires_at = now + max_age
+        logging.info(f"Fetched {len(certs)} Google signing certs, cached for {max_age}s")
+
+    def get_certs(self, key_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Return the cached certs, refetching them if they expired or if `key_id`
+        is not among them.
+
+        Args:
+            key_id (Optional[str]): Key id (`kid`) the caller needs.
+
+        Returns:
+            Dict[str, str]: PEM certificates by key id.
+        """
+        with self._lock:
+            now = time.monotonic()
+            expired = now >= self._expires_at
+            unknown_key = (
+                key_id is not None
+                and key_id not in self._certs
+                and now - self._fetched_at >= self.min_refresh_interval
+            )
+            if expired or unknown_key:
+                try:
+                    self._fetch()
+                except Exception as e:
+                    if not self._certs:
+                        raise
+                    # Keep serving the previous certs rather than failing every login
+                    logging.error(f"Failed to refresh Google certs: {str(e)}")
+                    self._fetched_at = now
+                    self._expires_at = now + self.min_refresh_interval
+            return self._certs
+
+    def verify(self, token: str, audience: Optional[str] = None) -> Dict:
+        """
+        Verify an ID token's signature, expiry, audience and issuer.
+
+        Args:
+            token (str): The Google ID token.
+            audience (Optional[str]): Expected `aud`, i.e. our OAuth client id.
+
+        Returns:
+            Dict: The token's claims.
+
+        Raises:
+            ValueError: If the token is invalid.
+        """
+        header = google_jwt.decode_header(token)
+        certs = self.get_certs(header.get("kid"))
+        claims = google_jwt.decode(
+            token,
+            certs=certs,
+            audience=audience,
+            clock_skew_in_seconds=self.clock_skew,
+        )
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Invalid issuer: {claims.get('iss')}")
+        return claims
+
+
+# Process-wide verifier shared by all logins
+google_token_verifier = GoogleTokenVerifier()
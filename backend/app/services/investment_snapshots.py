@@ -0,0 +1,99 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class InvestmentSnapshotCache:
+    """
+    Materialized per-(user, coin) investment figures.
+
+    A snapshot holds the output of `get_user_investment_details` and
+    `get_coin_performance_summary` for one state version and one price,
+    exactly as the CapitalManager computed it. Coin summaries are shared by
+    every user of the coin. Request prices come from the latest stored coin
+    stats, which only move when the scheduler records new ones, so until
+    then every request for the coin is served from the snapshot; a deposit,
+    withdrawal or trade bumps the state version and the next request
+    rebuilds it.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        """
+        Args:
+            max_size (Optional[int]): Maximum user snapshots kept. Defaults to
+                INVESTMENT_SNAPSHOT_CACHE_SIZE or 10000.
+        """
+        self.max_size = max_size or int(
+            os.getenv("INVESTMENT_SNAPSHOT_CACHE_SIZE", "10000")
+        )
+        self._users: "OrderedDict[Tuple[str, str], Tuple]" = OrderedDict()
+        self._coins: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_coin_summary(
+        self, coin: str, version: Optional[int], price: float
+    ) -> Optional[Dict]:
+        """Return a copy of the coin summary at `price`, or None on a miss."""
+        with self._lock:
+            entry = self._coins.get(coin)
+        if entry is None or entry[0] != (version, price):
+            return None
+        return copy.deepcopy(entry[1])
+
+    def set_coin_summary(
+        self, coin: str, version: Optional[int], price: float, summary: Dict
+    ):
+        """Store a coin summary computed at `price` under `version`."""
+        with self._lock:
+            self._coins[coin] = ((version, price), copy.deepcopy(summary))
+
+    def get(
+        self, user_id: str, coin: str, version: Optional[int], price: float
+    ) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Return copies of the user's details and the coin summary at `price`.
+
+        Returns:
+            Optional[Tuple[Dict, Dict]]: (details, summary), or None on a miss.
+        """
+        with self._lock:
+            entry = self._users.get((user_id, coin))
+            if entry is None or entry[0] != (version, price):
+                self.misses += 1
+                return None
+            self._users.move_to_end((user_id, coin))
+            self.hits += 1
+        _, details, summary = entry
+        return copy.deepcopy(details), copy.deepcopy(summary)
+
+    def set(
+        self,
+        user_id: str,
+        coin: str,
+        version: Optional[int],
+        price: float,
+        details: Dict,
+        summary: Dict,
+    ):
+        """Store a user's details and the coin summary computed at `price`."""
+        entry = ((version, price), copy.deepcopy(details), copy.deepcopy(summary))
+        with self._lock:
+            self._users[(user_id, coin)] = entry
+            self._users.move_to_end((user_id, coin))
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def clear(self):
+        """Drop every snapshot, e.g. when the state version moves."""
+        with self._lock:
+            self._users.clear()
+            self._coins.clear()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {"size": len(self._users), "hits": self.hits, "misses": self.misses}
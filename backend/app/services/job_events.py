@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from app.services.execution_log_store import ExecutionLogStore
+
+
+def _parse_execution_time(value) -> Optional[datetime]:
+    """Parse a `last_execution` value from the execution log as an aware datetime."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class JobFailedError(RuntimeError):
+    """A scheduler job raised while someone was waiting on its chain."""
+
+    def __init__(self, job_id: str, error: str, failed_at: datetime):
+        super().__init__(f"Job {job_id} failed at {failed_at.isoformat()}: {error}")
+        self.job_id = job_id
+        self.error = error
+        self.failed_at = failed_at
+
+
+class JobCompletionEvents:
+    """
+    Completion notifications for CoinScheduler jobs.
+
+    Each time a job's `last_execution` in the execution log moves forward,
+    waiters blocked in `wait_for`/`wait_for_async` are woken and the entry is
+    pushed to every `subscribe`d queue. Attach it to a scheduler to be
+    notified as soon as each APScheduler job finishes instead of polling;
+    jobs that raise are recorded as failures and end any wait started
+    before them.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._latest: Dict[str, datetime] = {}
+        self._entries: Dict[str, Dict] = {}
+        self._failures: Dict[str, Tuple[datetime, str]] = {}
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+    def record(self, job_name: str, entry: Dict) -> bool:
+        """
+        Record an execution log entry, notifying waiters if it is newer.
+
+        Args:
+            job_name (str): The job name, e.g. 'top_coins' or 'trading_bot'.
+            entry (Dict): The job's execution log entry with `last_execution`.
+
+        Returns:
+            bool: True if the entry was newer than the last one seen.
+        """
+        executed_at = _parse_execution_time(entry.get("last_execution"))
+        if executed_at is None:
+            return False
+
+        with self._condition:
+            previous = self._latest.get(job_name)
+            if previous is not None and executed_at <= previous:
+                return False
+            self._latest[job_name] = executed_at
+            self._entries[job_name] = entry
+            subscribers = list(self._subscribers)
+            self._condition.notify_all()
+
+        self._publish(subscribers, {"job": job_name, **entry})
+        return True
+
+    @staticmethod
+    def _publish(subscribers, event: Dict):
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop is closed; it will be dropped on unsubscribe
+                pass
+
+    def record_failure(
+        self, job_id: str, error, failed_at: Optional[datetime] = None
+    ):
+        """
+        Record that a job raised, waking waiters and notifying subscribers.
+
+        Args:
+            job_id (str): The APScheduler job id.
+            error: The exception (or message) the job raised.
+            failed_at (Optional[datetime]): When it failed; now by default.
+        """
+        failed_at = _parse_execution_time(failed_at or datetime.now(timezone.utc))
+        with self._condition:
+            self._failures[job_id] = (failed_at, str(error))
+            subscribers = list(self._subscribers)
+            self._condition.notify_all()
+
+        self._publish(
+            subscribers,
+            {"job": job_id, "error": str(error), "failed_at": failed_at.isoformat()},
+        )
+
+    def sync_from_log(self, log_data: Dict) -> List[Tuple[str, Dict]]:
+        """
+        Record every entry of an execution log dict, e.g. `load_execution_log()`.
+
+        Returns:
+            List[Tuple[str, Dict]]: The (job, entry) pairs that were new.
+        """
+        new_entries = []
+        for job_name, entry in (log_data or {}).items():
+            if isinstance(entry, dict) and self.record(job_name, entry):
+                new_entries.append((job_name, entry))
+        return new_entries
+
+    def latest(self) -> Dict[str, Dict]:
+        """Return the latest known entry per job."""
+        with self._condition:
+            return dict(self._entries)
+
+    def _completed_since(self, job_name: str, since: datetime) -> bool:
+        executed_at = self._latest.get(job_name)
+        return executed_at is not None and executed_at > since
+
+    def _failure_since(self, since: datetime) -> Optional[JobFailedError]:
+        for job_id, (failed_at, error) in self._failures.items():
+            if failed_at > since:
+                return JobFailedError(job_id, error, failed_at)
+        return None
+
+    def _outcome(self, job_name: str, since: datetime) -> bool:
+        # A job failing anywhere in the chain means `job_name` will not run
+        if self._completed_since(job_name, since):
+            return True
+        failure = self._failure_since(since)
+        if failure is not None:
+            raise failure
+        return False
+
+    def wait_for(
+        self, job_name: str, since: datetime, timeout: Optional[float] = None
+    ) -> bool:
+        """
+        Block until `job_name` completes after `since`.
+
+        Returns:
+            bool: True if the job completed, False on timeout.
+
+        Raises:
+            JobFailedError: If a job raised after `since` before it completed.
+        """
+        since = _parse_execution_time(since)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._completed_since(job_name, since)
+                or self._failure_since(since) is not None,
+                timeout=timeout,
+            )
+            return self._outcome(job_name, since)
+
+    async def wait_for_async(
+        self, job_name: str, since: datetime, timeout: Optional[float] = None
+    ) -> bool:
+        """Awaitable variant of `wait_for`."""
+        since = _parse_execution_time(since)
+        queue = self.subscribe()
+        try:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                with self._condition:
+                    if self._outcome(job_name, since):
+                        return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return False
+        finally:
+            self.unsubscribe(queue)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return a queue receiving every new completion; call from the event loop."""
+        queue = asyncio.Queue()
+        with self._condition:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Stop delivering completions to `queue`."""
+        with self._condition:
+            self._subscribers = [s for s in self._subscribers if s[1] is not queue]
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def attach(self, coin_scheduler, store: Optional[ExecutionLogStore] = None):
+        """
+        Fire completions from a CoinScheduler running in this process.
+
+        Registers an APScheduler listener on `coin_scheduler.scheduler`; after
+        each job finishes, the execution log is read once and any newer
+        entries are recorded and, if a `store` is given, appended to it so
+        other processes can follow them. Jobs that raise are also recorded
+        with `record_failure`.
+        """
+        if store is not None:
+            store.compact()
+            self.sync_from_log(store.latest())
+
+        def sync():
+            log_data = coin_scheduler.load_execution_log()
+            for job_name, entry in self.sync_from_log(log_data):
+                if store is not None:
+                    store.append(job_name, entry)
+
+        def on_job_finished(event):
+            if event.exception is not None:
+                self.record_failure(event.job_id, event.exception)
+            try:
+                sync()
+            except Exception as e:
+                logging.error(f"Failed to read execution log after job event: {e}")
+
+        coin_scheduler.scheduler.add_listener(
+            on_job_finished, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+        )
+        sync()
+
+    async def follow(self, load_log: Callable[[], Dict], interval: float = 2.0):
+        """
+        Keep the events in sync with an execution log owned by another process.
+
+        The log is only read while someone is subscribed.
+        """
+        while True:
+            if self.has_subscribers:
+                try:
+                    log_data = await asyncio.to_thread(load_log)
+                    self.sync_from_log(log_data)
+                except Exception as e:
+                    logging.error(f"Failed to follow execution log: {e}")
+            await asyncio.sleep(interval)
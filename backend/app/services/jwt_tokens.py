@@ -0,0 +1,149 @@
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+JWT_BACKENDS = ("jose", "pyjwt")
+
+
+class InvalidTokenError(Exception):
+    """Raised when a token fails verification, whichever backend is in use."""
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens that already passed signature verification.
+
+    Keyed by a SHA-256 over the algorithm, the secret and the token, so raw
+    tokens and secrets are not kept in memory and an entry only matches the
+    key and algorithm it was verified with: rotating SECRET_KEY or changing
+    the algorithm cannot serve claims from before the change. An entry is
+    valid until the token's own `exp`, so a cache hit never accepts a token
+    the backend would reject for being expired.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        Args:
+            max_size (int): Maximum number of tokens kept.
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str, secret: str, algorithm: str) -> str:
+        digest = hashlib.sha256()
+        for part in (algorithm, secret, token):
+            encoded = part.encode()
+            # Length-prefixed so no two (algorithm, secret, token) collide
+            digest.update(len(encoded).to_bytes(4, "big") + encoded)
+        return digest.hexdigest()
+
+    def get(self, token: str, secret: str, algorithm: str) -> Optional[Dict]:
+        """Return a copy of the verified claims, or None on a miss or expiry."""
+        key = self._key(token, secret, algorithm)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            claims = entry[1]
+        return copy.deepcopy(claims)
+
+    def set(self, token: str, secret: str, algorithm: str, claims: Dict):
+        """Store verified claims; tokens without a numeric `exp` are not cached."""
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token, secret, algorithm)
+        with self._lock:
+            self._entries[key] = (expires_at, copy.deepcopy(claims))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class JWTCodec:
+    """
+    Signs and verifies access tokens with python-jose or, when JWT_BACKEND is
+    'pyjwt' and PyJWT is installed, with PyJWT. Verified tokens are served
+    from a VerifiedTokenCache, so a hot token costs one hash and a dict lookup.
+    """
+
+    def __init__(self, backend: Optional[str] = None, cache_size: int = 10000):
+        """
+        Args:
+            backend (Optional[str]): 'jose' or 'pyjwt'. Defaults to JWT_BACKEND or 'jose'.
+            cache_size (int): Verified tokens kept in memory; 0 disables the cache.
+        """
+        backend = (backend or os.getenv("JWT_BACKEND", "jose")).lower()
+        if backend not in JWT_BACKENDS:
+            raise ValueError(f"Unknown JWT backend: {backend}")
+        if backend == "pyjwt":
+            try:
+                import jwt as pyjwt
+
+                self._pyjwt = pyjwt
+            except ImportError:
+                logging.warning("PyJWT is not installed, falling back to python-jose")
+                backend = "jose"
+        if backend == "jose":
+            from jose import jwt as jose_jwt, JWTError
+
+            self._jose = jose_jwt
+            self._jose_error = JWTError
+        self.backend = backend
+        self.cache = VerifiedTokenCache(cache_size) if cache_size else None
+
+    def encode(self, claims: Dict, secret: str, algorithm: str) -> str:
+        """Sign `claims` into a token."""
+        if self.backend == "pyjwt":
+            return self._pyjwt.encode(claims, secret, algorithm=algorithm)
+        return self._jose.encode(claims, secret, algorithm=algorithm)
+
+    def decode(self, token: str, secret: str, algorithm: str) -> Dict:
+        """
+        Verify a token and return its claims.
+
+        Raises:
+            InvalidTokenError: If the signature or expiry check fails.
+        """
+        if self.cache is not None:
+            claims = self.cache.get(token, secret, algorithm)
+            if claims is not None:
+                return claims
+
+        if self.backend == "pyjwt":
+            try:
+                claims = self._pyjwt.decode(token, secret, algorithms=[algorithm])
+            except self._pyjwt.PyJWTError as e:
+                raise InvalidTokenError(str(e))
+        else:
+            try:
+                claims = self._jose.decode(token, secret, algorithms=[algorithm])
+            except self._jose_error as e:
+                raise InvalidTokenError(str(e))
+
+        if self.cache is not None:
+            self.cache.set(token, secret, algorithm, claims)
+        return claims
+
+
+# Process-wide codec used to issue and check access tokens
+jwt_codec = JWTCodec()
@@ -1,32 +1,545 @@
+import abc
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 from config import config
 
+# Telegram rejects messages longer than this
+TELEGRAM_MAX_LENGTH = 4096
+
+# Upper bounds (seconds) of the enqueue-to-delivery latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+def split_text(text: str, max_length: int) -> List[str]:
+    """Cut `text` into parts of at most `max_length`, at a line break when possible."""
+    parts = []
+    while len(text) > max_length:
+        cut = text.rfind("\n", 0, max_length + 1)
+        if cut <= 0:
+            cut = max_length
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+def _pooled_session() -> requests.Session:
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    return session
+
+
+class NotificationSink(abc.ABC):
+    """
+    An outbound notification channel.
+
+    Subclasses implement `deliver`, which may block and retry; it runs on
+    the sink's own worker thread, never on the caller's.
+    """
+
+    name = "sink"
+    # Longest text the channel accepts; coalesced batches are split to fit
+    max_length: Optional[int] = None
+
+    def __init__(self):
+        self._closing = threading.Event()
+
+    @abc.abstractmethod
+    def deliver(self, text: str) -> bool:
+        """
+        Deliver one message.
+
+        Returns:
+            bool: True if the message was delivered.
+        """
+
+    def close(self):
+        """Abort pending retries and release resources."""
+        self._closing.set()
+
+    def _backoff(self, attempt: int) -> float:
+        return min(30.0, 2**attempt) + random.uniform(0, 0.5)
+
+    def _sleep(self, seconds: float) -> bool:
+        """Sleep unless the sink is closing; returns False if it is."""
+        return not self._closing.wait(seconds)
+
+
+class TelegramSink(NotificationSink):
+    """
+    Sends messages to a Telegram chat through the Bot API.
+
+    Sends at most one message per `min_interval` and retries 5xx and
+    connection errors with exponential backoff, honoring `retry_after` on
+    HTTP 429. A message Telegram rejects with 400, typically Markdown it
+    cannot parse, is sent once more as plain text.
+    """
+
+    name = "telegram"
+    max_length = TELEGRAM_MAX_LENGTH
+
+    def __init__(
+        self,
+        bot_token: Optional[str] = None,
+        chat_id: Optional[str] = None,
+        api_url: Optional[str] = None,
+        timeout: float = 10.0,
+        max_retries: int = 5,
+        min_interval: Optional[float] = None,
+    ):
+        """
+        Args:
+            bot_token (Optional[str]): Bot token. Defaults to config.telegram_bot_token.
+            chat_id (Optional[str]): Target chat. Defaults to config.telegram_chat_id.
+            api_url (Optional[str]): Bot API base URL. Defaults to TELEGRAM_API_URL or
+                'https://api.telegram.org' (point it at a local stub in tests).
+            timeout (float): Seconds per HTTP request.
+            max_retries (int): Attempts per message before it is dropped.
+            min_interval (Optional[float]): Minimum seconds between sends; Telegram
+                allows about one message per second per chat. Defaults to
+                TELEGRAM_MIN_INTERVAL or 1.0.
+        """
+        super().__init__()
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.api_url = (
+            api_url or os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+        ).rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.min_interval = (
+            min_interval
+            if min_interval is not None
+            else float(os.getenv("TELEGRAM_MIN_INTERVAL", "1.0"))
+        )
+        self._last_sent = 0.0
+        self._session = _pooled_session()
+
+    def deliver(self, text: str) -> bool:
+        bot_token = self.bot_token or config.telegram_bot_token
+        chat_id = self.chat_id or config.telegram_chat_id
+        url = f"{self.api_url}/bot{bot_token}/sendMessage"
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "Markdown",
+        }
+
+        for attempt in range(self.max_retries):
+            # Respect the per-chat rate limit
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0 and not self._sleep(wait):
+                break
+            delay = self._backoff(attempt)
+            try:
+                response = self._session.post(url, json=payload, timeout=self.timeout)
+                self._last_sent = time.monotonic()
+                if response.status_code == 429:
+                    # Telegram says how long to back off for
+                    try:
+                        retry_after = response.json()["parameters"]["retry_after"]
+                    except (ValueError, KeyError, TypeError):
+                        retry_after = response.headers.get("Retry-After", delay)
+                    delay = float(retry_after)
+                elif response.status_code >= 500:
+                    logging.warning(
+                        f"Telegram returned {response.status_code}, retrying in {delay:.1f}s"
+                    )
+                elif response.status_code == 400 and "parse_mode" in payload:
+                    logging.warning(
+                        f"Telegram rejected the message ({response.text}), "
+                        "resending it as plain text"
+                    )
+                    del payload["parse_mode"]
+                    continue
+                else:
+                    response.raise_for_status()
+                    return True
+            except requests.HTTPError as e:
+                # Other 4xx errors will not succeed on retry
+                logging.error(f"Error sending message: {e}")
+                return False
+            except requests.RequestException as e:
+                self._last_sent = time.monotonic()
+                logging.warning(f"Error sending message: {e}, retrying in {delay:.1f}s")
+            if not self._sleep(delay):
+                break
+        return False
+
+    def close(self):
+        super().close()
+        self._session.close()
+
+
+class WebhookSink(NotificationSink):
+    """POSTs `{"text": ...}` to a webhook URL, retrying 5xx and connection errors."""
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10.0, max_retries: int = 5):
+        """
+        Args:
+            url (str): Webhook endpoint.
+            timeout (float): Seconds per HTTP request.
+            max_retries (int): Attempts per message before it is dropped.
+        """
+        super().__init__()
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._session = _pooled_session()
+
+    def deliver(self, text: str) -> bool:
+        for attempt in range(self.max_retries):
+            delay = self._backoff(attempt)
+            try:
+                response = self._session.post(
+                    self.url, json={"text": text}, timeout=self.timeout
+                )
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return True
+                logging.warning(
+                    f"Webhook returned {response.status_code}, retrying in {delay:.1f}s"
+                )
+            except requests.HTTPError as e:
+                logging.error(f"Error sending webhook notification: {e}")
+                return False
+            except requests.RequestException as e:
+                logging.warning(
+                    f"Error sending webhook notification: {e}, retrying in {delay:.1f}s"
+                )
+            if not self._sleep(delay):
+                break
+        return False
+
+    def close(self):
+        super().close()
+        self._session.close()
+
+
+class FileSink(NotificationSink):
+    """Appends each message as a JSON line to a local file."""
+
+    name = "file"
+
+    def __init__(self, path: str = "data/notifications.jsonl"):
+        """
+        Args:
+            path (str): File the notifications are appended to.
+        """
+        super().__init__()
+        self.path = path
+
+    def deliver(self, text: str) -> bool:
+        line = json.dumps(
+            {"timestamp": datetime.now(timezone.utc).isoformat(), "text": text}
+        )
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            return True
+        except OSError as e:
+            logging.error(f"Failed to write notification to {self.path}: {e}")
+            return False
+
+
+class SinkMetrics:
+    """Delivery counters and an enqueue-to-delivery latency histogram for one sink."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record_queued(self):
+        with self._lock:
+            self.queued += 1
+
+    def record_dropped(self, count: int = 1):
+        with self._lock:
+            self.dropped += count
+
+    def record_sent(self, latencies: List[float]):
+        with self._lock:
+            self.sent += len(latencies)
+            for latency in latencies:
+                self.latency_sum += latency
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if latency <= bound:
+                        self.latency_buckets[i] += 1
+                        break
+
+    def snapshot(self) -> Dict:
+        """Return the counters, with cumulative histogram buckets keyed by upper bound."""
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+                cumulative += count
+                buckets[str(bound) if bound != float("inf") else "+Inf"] = cumulative
+            return {
+                "queued": self.queued,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "latency_sum": self.latency_sum,
+                "latency_count": self.sent,
+                "latency_buckets": buckets,
+            }
+
+
+class SinkWorker:
+    """
+    Queue and background thread delivering messages to one sink.
+
+    Messages arriving within `coalesce_window` are joined into one delivery,
+    split so each part fits the sink's `max_length`; a single message over
+    the limit is sent in several parts.
+    """
+
+    def __init__(
+        self,
+        sink: NotificationSink,
+        coalesce_window: float = 1.0,
+        max_queue: int = 1000,
+    ):
+        self.sink = sink
+        self.coalesce_window = coalesce_window
+        self.metrics = SinkMetrics()
+        self._queue: "queue.Queue[Tuple[str, float]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def send(self, message: str) -> bool:
+        """Queue a message; returns False if the queue is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((message, time.monotonic()))
+        except queue.Full:
+            logging.warning(f"{self.sink.name} notification queue is full, dropping message")
+            self.metrics.record_dropped()
+            return False
+        self.metrics.record_queued()
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued message was delivered or dropped."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        """Deliver what is queued (up to `timeout`) and stop the worker."""
+        self.flush(timeout)
+        self._stopping.set()
+        self.sink.close()
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(
+                    target=self._run, name=f"{self.sink.name}-notifier", daemon=True
+                )
+                self._worker.start()
+
+    def _next_batch(self) -> List[Tuple[str, float]]:
+        """Block for a message, then gather what arrives within the coalesce window."""
+        batch = [self._queue.get(timeout=0.5)]
+        length = len(batch[0][0])
+        deadline = time.monotonic() + self.coalesce_window
+        while self.sink.max_length is None or length < self.sink.max_length:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            length += len(item[0]) + 2
+        return batch
+
+    def _split(self, batch: List[Tuple[str, float]]) -> List[List[Tuple[str, int]]]:
+        """
+        Group a batch into as few messages as fit the sink's length limit.
+
+        Returns:
+            List[List[Tuple[str, int]]]: Per delivery, the texts joined into it
+            and the index in `batch` of the message each came from.
+        """
+        max_length = self.sink.max_length
+        parts = []
+        for index, (message, _) in enumerate(batch):
+            texts = split_text(message, max_length) if max_length else [message]
+            parts.extend((text, index) for text in texts)
+
+        groups, current, length = [], [], 0
+        for part in parts:
+            added = len(part[0]) + (2 if current else 0)
+            if current and max_length is not None and length + added > max_length:
+                groups.append(current)
+                current, length, added = [], 0, len(part[0])
+            current.append(part)
+            length += added
+        if current:
+            groups.append(current)
+        return groups
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = self._next_batch()
+            except queue.Empty:
+                continue
+            try:
+                failed = set()
+                for group in self._split(batch):
+                    text = "\n\n".join(part for part, _ in group)
+                    try:
+                        delivered = self.sink.deliver(text)
+                    except Exception as e:
+                        logging.error(f"{self.sink.name} notifier failed: {e}")
+                        delivered = False
+                    if not delivered:
+                        failed.update(index for _, index in group)
+                now = time.monotonic()
+                latencies = [
+                    now - queued
+                    for index, (_, queued) in enumerate(batch)
+                    if index not in failed
+                ]
+                if latencies:
+                    self.metrics.record_sent(latencies)
+                if failed:
+                    logging.error(
+                        f"Dropping {len(failed)} {self.sink.name} notification(s)"
+                    )
+                    self.metrics.record_dropped(len(failed))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class Notifier:
+    """
+    Fans messages out to several sinks.
+
+    Each sink has its own queue and worker thread, so `send` returns
+    immediately and a slow or failing channel does not delay the others.
+    """
+
+    def __init__(
+        self,
+        sinks: List[NotificationSink],
+        coalesce_window: Optional[float] = None,
+        max_queue: int = 1000,
+    ):
+        """
+        Args:
+            sinks (List[NotificationSink]): Channels every message is sent to.
+            coalesce_window (Optional[float]): Seconds to gather messages into one
+                delivery. Defaults to NOTIFY_COALESCE_WINDOW or 1.0.
+            max_queue (int): Messages held per sink before new ones are dropped.
+        """
+        if coalesce_window is None:
+            coalesce_window = float(os.getenv("NOTIFY_COALESCE_WINDOW", "1.0"))
+        self.workers = [SinkWorker(sink, coalesce_window, max_queue) for sink in sinks]
+
+    def send(self, message: str) -> bool:
+        """
+        Queue a message on every sink.
+
+        Returns:
+            bool: True if at least one sink accepted the message.
+        """
+        accepted = [worker.send(message) for worker in self.workers]
+        return any(accepted)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every sink's queue drained."""
+        deadline = time.monotonic() + timeout
+        return all(
+            worker.flush(max(0.0, deadline - time.monotonic())) for worker in self.workers
+        )
+
+    def stop(self, timeout: float = 5.0):
+        """Flush and stop every sink's worker."""
+        self.flush(timeout)
+        for worker in self.workers:
+            worker.stop(0.5)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Return delivery metrics per sink name."""
+        return {worker.sink.name: worker.metrics.snapshot() for worker in self.workers}
+
+
+def build_default_sinks() -> List[NotificationSink]:
+    """
+    Sinks configured for this deployment.
+
+    Telegram is always used; NOTIFY_WEBHOOK_URL adds a webhook sink and
+    NOTIFY_FILE_PATH a local JSON-lines file sink.
+    """
+    sinks: List[NotificationSink] = [TelegramSink()]
+    webhook_url = os.getenv("NOTIFY_WEBHOOK_URL")
+    if webhook_url:
+        sinks.append(WebhookSink(webhook_url))
+    file_path = os.getenv("NOTIFY_FILE_PATH")
+    if file_path:
+        sinks.append(FileSink(file_path))
+    return sinks
+
+
+notifier = Notifier(build_default_sinks())
+atexit.register(notifier.stop, 2.0)
+
+
+def send_notification(message: str) -> bool:
+    """
+    Queues a message on every configured notification sink.
+
+    Args:
+        message (str): The message to be sent.
+
+    Returns:
+        bool: True if the message was queued, False otherwise.
+    """
+    return notifier.send(message)
+
 
 def send_telegram_message(message: str) -> bool:
     """
-    Sends a message to a Telegram chat using the Telegram Bot API.
+    Queues a message for the Telegram chat (and any other configured sinks);
+    delivery happens on background threads.
 
     Args:
         message (str): The message to be sent.
 
     Returns:
-        bool: True if the message was sent successfully, False otherwise.
-    """
-    # Assign defaults from config if not passed explicitly
-    bot_token = config.telegram_bot_token
-    chat_id = config.telegram_chat_id
-
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "Markdown",
-    }
-
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return True
-    except requests.RequestException as e:
-        print(f"Error sending message: {e}")
-        return False
+        bool: True if the message was queued, False otherwise.
+    """
+    return send_notification(message)
@@ -0,0 +1,326 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily,
+)
+
+# With PROMETHEUS_MULTIPROC_DIR set, every process (API workers, scheduler)
+# writes its samples there and /metrics aggregates them
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+http_requests = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status code",
+    ["method", "route", "status"],
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+http_response_size = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size by route",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+mongo_operation_duration = Histogram(
+    "mongo_operation_duration_seconds",
+    "Duration of Mongo service calls",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+mongo_operation_errors = Counter(
+    "mongo_operation_errors_total",
+    "Mongo service calls that raised",
+    ["operation"],
+)
+scheduler_job_duration = Histogram(
+    "scheduler_job_duration_seconds",
+    "Duration of scheduler jobs",
+    ["job"],
+    buckets=JOB_BUCKETS,
+)
+scheduler_job_failures = Counter(
+    "scheduler_job_failures_total",
+    "Scheduler jobs that raised",
+    ["job"],
+)
+
+
+def time_mongo(operation: str) -> Callable:
+    """
+    Decorator recording the duration of a Mongo service call, sync or async.
+
+    Args:
+        operation (str): Label for the call, e.g. 'MongoUserService.get_trades'.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        histogram = mongo_operation_duration.labels(operation)
+        errors = mongo_operation_errors.labels(operation)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_mongo_service(cls):
+    """
+    Class decorator timing every public method of a Mongo service.
+
+    Async generators are left as they are, since their time is spent in the
+    caller's iteration.
+    """
+    for name, member in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(member):
+            continue
+        if inspect.isasyncgenfunction(member):
+            continue
+        setattr(cls, name, time_mongo(f"{cls.__name__}.{name}")(member))
+    return cls
+
+
+def time_job(job: str) -> Callable:
+    """
+    Decorator recording the duration and failures of a scheduler job function.
+
+    Args:
+        job (str): Job name, e.g. 'trading_bot'.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                scheduler_job_failures.labels(job).inc()
+                raise
+            finally:
+                scheduler_job_duration.labels(job).observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_scheduler(scheduler):
+    """
+    Record durations of every job run by an APScheduler scheduler.
+
+    Uses the scheduler's submit/executed/error events, so jobs do not need
+    to be decorated with `time_job`.
+    """
+    # Submission and completion events of one run share its scheduled run time
+    started: Dict[Tuple[str, object], float] = {}
+    lock = threading.Lock()
+
+    def on_event(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            now = time.perf_counter()
+            with lock:
+                for run_time in event.scheduled_run_times:
+                    started[(event.job_id, run_time)] = now
+            return
+        with lock:
+            start = started.pop((event.job_id, event.scheduled_run_time), None)
+        if event.code == EVENT_JOB_ERROR:
+            scheduler_job_failures.labels(event.job_id).inc()
+        if start is not None:
+            scheduler_job_duration.labels(event.job_id).observe(
+                time.perf_counter() - start
+            )
+
+    scheduler.add_listener(
+        on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+    )
+
+
+class _ServiceStatsCollector:
+    """Exports the in-process counters kept by the user cache, Mongo pool and notifier."""
+
+    def collect(self):
+        from app.services.messaging import notifier
+        from app.services.mongo_client import pool_metrics
+        from app.services.user_cache import user_cache
+
+        pid = str(os.getpid())
+        cache = user_cache.stats()
+        for key in ("hits", "misses", "invalidations"):
+            metric = CounterMetricFamily(
+                f"user_cache_{key}", f"User cache {key}", labels=["pid"]
+            )
+            metric.add_metric([pid], cache[key])
+            yield metric
+        size = GaugeMetricFamily("user_cache_size", "User cache entries", labels=["pid"])
+        size.add_metric([pid], cache["size"])
+        yield size
+
+        pool = pool_metrics.snapshot()
+        for key in ("open_connections", "checked_out", "max_checked_out"):
+            metric = GaugeMetricFamily(
+                f"mongo_pool_{key}", f"Mongo connection pool {key}", labels=["pid"]
+            )
+            metric.add_metric([pid], pool[key])
+            yield metric
+        for key in ("checkouts", "checkout_failures", "pool_clears"):
+            metric = CounterMetricFamily(
+                f"mongo_pool_{key}", f"Mongo connection pool {key}", labels=["pid"]
+            )
+            metric.add_metric([pid], pool[key])
+            yield metric
+        wait = CounterMetricFamily(
+            "mongo_pool_checkout_wait_seconds",
+            "Total time spent waiting for pooled connections",
+            labels=["pid"],
+        )
+        wait.add_metric([pid], pool["wait_time_total"])
+        yield wait
+
+        sinks = notifier.metrics()
+        for key in ("queued", "sent", "dropped"):
+            metric = CounterMetricFamily(
+                f"notifications_{key}", f"Notifications {key} per sink", labels=["sink"]
+            )
+            for sink, stats in sinks.items():
+                metric.add_metric([sink], stats[key])
+            yield metric
+        latency = HistogramMetricFamily(
+            "notification_delivery_seconds",
+            "Time from enqueue to delivery per sink",
+            labels=["sink"],
+        )
+        for sink, stats in sinks.items():
+            latency.add_metric(
+                [sink],
+                list(stats["latency_buckets"].items()),
+                sum_value=stats["latency_sum"],
+            )
+        yield latency
+
+
+_service_stats_collector = _ServiceStatsCollector()
+if not MULTIPROCESS:
+    REGISTRY.register(_service_stats_collector)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple[bytes, str]: The body and its content type.
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # Cache, pool and notifier counters live in memory; report this process's
+        registry.register(_service_stats_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, status codes, in-flight
+    requests and response body sizes.
+
+    Routes are labeled by their path template (e.g. '/coin/trades/{coin}')
+    so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = _route_label(scope)
+            method = scope.get("method", "")
+            http_request_duration.labels(method, route).observe(
+                time.perf_counter() - start
+            )
+            http_requests.labels(method, route, str(status_code)).inc()
+            http_response_size.labels(method, route).observe(size)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path: Optional[str] = getattr(route, "path", None)
+    # Unmatched paths share one label instead of one per URL
+    return path or "unmatched"
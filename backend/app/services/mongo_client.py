@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import quote_plus
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+from config import config
+
+
+def build_mongo_uri() -> str:
+    """Build the MongoDB connection URI from config, escaping credentials."""
+    # Get base URI and credentials from config
+    base_uri = config.mongodb_uri
+    username = config.mongodb_username
+    password = config.mongodb_password
+
+    # Construct the MongoDB URI
+    if username and password:
+        # Escape username and password to handle special characters
+        escaped_username = quote_plus(username)
+        escaped_password = quote_plus(password)
+        # Ensure the URI includes credentials and authSource
+        if base_uri.startswith("mongodb://"):
+            base_uri = base_uri[len("mongodb://") :]
+        mongo_uri = f"mongodb://{escaped_username}:{escaped_password}@{base_uri}"
+        if "?authSource=" not in mongo_uri:
+            mongo_uri += "?authSource=admin"
+    else:
+        # Use the base URI as-is (no credentials)
+        mongo_uri = base_uri
+        if "?authSource=" not in mongo_uri and "mongodb://" in mongo_uri:
+            mongo_uri += "?authSource=admin"
+
+    # Log connection attempt (mask password)
+    logging.info(
+        f"Connecting to MongoDB at {mongo_uri.replace(password, '****') if password else mongo_uri}"
+    )
+    return mongo_uri
+
+
+def client_options() -> Dict:
+    """
+    Connection pool options, overridable through the environment.
+
+    MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE,
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS, MONGODB_COMPRESSORS (comma separated;
+    the default 'zstd,zlib' only names compressors whose packages are in
+    requirements.txt, add 'snappy' only where python-snappy is installed)
+    and MONGODB_READ_PREFERENCE.
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(
+            os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")
+        ),
+        "compressors": os.getenv("MONGODB_COMPRESSORS", "zstd,zlib"),
+        "readPreference": os.getenv("MONGODB_READ_PREFERENCE", "primary"),
+    }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool listener tracking checked-out connections and checkout wait time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = 0
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        # `duration` is the time spent waiting for the connection, in seconds
+        duration = getattr(event, "duration", 0.0) or 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.wait_time_total += duration
+            self.wait_time_max = max(self.wait_time_max, duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> Dict:
+        """Return the current pool counters."""
+        with self._lock:
+            return {
+                "pools": self.pools,
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+                "wait_time_avg": (
+                    self.wait_time_total / self.checkouts if self.checkouts else 0.0
+                ),
+                "pool_clears": self.pool_clears,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+_lock = threading.Lock()
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncIOMotorClient] = None
+_client_pid: Optional[int] = None
+
+
+def _reset_after_fork():
+    """Drop clients inherited from a parent process; they are not fork-safe."""
+    global _client, _async_client, _client_pid
+    if _client_pid != os.getpid():
+        _client = None
+        _async_client = None
+        _client_pid = os.getpid()
+
+
+def get_mongo_client() -> MongoClient:
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client
+    with _lock:
+        _reset_after_fork()
+        if _client is None:
+            _client = MongoClient(
+                build_mongo_uri(), event_listeners=[pool_metrics], **client_options()
+            )
+        return _client
+
+
+def get_async_mongo_client() -> AsyncIOMotorClient:
+    """Return the process-wide Motor client, creating it on first use."""
+    global _async_client
+    with _lock:
+        _reset_after_fork()
+        if _async_client is None:
+            _async_client = AsyncIOMotorClient(
+                build_mongo_uri(), event_listeners=[pool_metrics], **client_options()
+            )
+        return _async_client
+
+
+def close_mongo_clients():
+    """Close the shared clients; the next `get_*` call opens new ones."""
+    global _client, _async_client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        if _async_client is not None:
+            _async_client.close()
+            _async_client = None
@@ -1,61 +1,771 @@
-from typing import Optional, Dict, List
-from datetime import datetime
-from pymongo import MongoClient
+from typing import Callable, Iterable, Optional, Dict, List, Set, Tuple
+from collections import defaultdict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+import copy
+import hashlib
+import json
+import math
+import re
+import threading
 from bson import ObjectId
 import logging
-from config import config
-from urllib.parse import quote_plus
+from app.services.mongo_client import get_mongo_client
+from app.services.metrics import instrument_mongo_service
+from app.services.user_cache import user_cache
 from app.users.models import SocialProvider, UserRole
 
+# Fields always present in the trading state returned to CapitalManager
+DEFAULT_STATE_FIELDS = (
+    "user_investments",
+    "total_deposits",
+    "capital",
+    "positions",
+    "total_cost",
+    "trade_records",
+)
+# Bookkeeping fields on the `scheduler_state` document that are not trading state
+STATE_META_FIELDS = ("_id", "version", "layout")
+STATE_LAYOUT = "per_coin"
+TRADE_PROJECTION = {"_id": 1, "timestamp": 1, "record": 1}
+# Only the fields UserResponse needs when listing users
+USER_LIST_PROJECTION = {
+    "email": 1,
+    "name": 1,
+    "profile_picture": 1,
+    "role": 1,
+    "created_at": 1,
+}
+INTERVAL_UNITS = {"m": "minute", "h": "hour", "d": "day", "w": "week"}
+INTERVAL_DELTAS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+# Rollups maintained on snapshot insert, finest first
+ROLLUP_RESOLUTIONS = (("hour", timedelta(hours=1)), ("day", timedelta(days=1)))
+# Fewest buckets a rollup must yield before it replaces raw snapshots by default
+ROLLUP_MIN_POINTS = 60
+# Server error code for transactions on a standalone mongod
+TRANSACTIONS_UNSUPPORTED_CODE = 20
+# Coins the trading state saves of the current thread are limited to
+_state_scope = threading.local()
 
+
+@contextmanager
+def trading_state_scope(coins: Iterable[str]):
+    """
+    Limit the `set_trading_state` calls made in this thread to `coins`.
+
+    A per-coin trading worker saves its CapitalManager's whole state, but
+    inside this scope only the documents and trades of its own coins are
+    written and the state-wide fields are left alone, so workers running
+    side by side do not overwrite each other.
+    """
+    previous = getattr(_state_scope, "coins", None)
+    _state_scope.coins = set(coins)
+    try:
+        yield
+    finally:
+        _state_scope.coins = previous
+
+
+def to_datetime(value) -> datetime:
+    """Coerce a stored timestamp to a datetime for range queries."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+
+def trade_document(coin: str, seq: int, record) -> Dict:
+    """Wrap a trade record for the trades ledger, lifting the indexed fields."""
+    doc = {"coin": coin, "seq": seq, "record": record}
+    if isinstance(record, dict):
+        doc["timestamp"] = to_datetime(record.get("timestamp"))
+        if record.get("user_id") is not None:
+            doc["user_id"] = str(record["user_id"])
+    else:
+        doc["timestamp"] = datetime.utcnow()
+    return doc
+
+
+def record_fingerprint(record) -> bytes:
+    """Digest of a trade record, used to spot records changed in memory."""
+    encoded = json.dumps(record, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+class LazyTradeRecords(MutableMapping):
+    """
+    The `trade_records` map of a loaded trading state, `{coin: [records]}`.
+
+    A coin's records are read from the trades ledger the first time the
+    coin is accessed, so loading the state does not pull every coin's full
+    history. Only accessed (`loaded`) coins can have changed and need saving.
+    """
+
+    def __init__(self, coins: Iterable[str], load: Callable[[str], List]):
+        """
+        Args:
+            coins (Iterable[str]): Coins that have stored trade records.
+            load (Callable[[str], List]): Reads one coin's records in seq order.
+        """
+        self._pending: Set[str] = set(coins)
+        self._loaded: Dict[str, List] = {}
+        self._load = load
+
+    def __getitem__(self, coin: str) -> List:
+        if coin not in self._loaded:
+            if coin not in self._pending:
+                raise KeyError(coin)
+            self._loaded[coin] = self._load(coin)
+            self._pending.discard(coin)
+        return self._loaded[coin]
+
+    def __setitem__(self, coin: str, records: List):
+        self._pending.discard(coin)
+        self._loaded[coin] = records
+
+    def __delitem__(self, coin: str):
+        if coin not in self._loaded and coin not in self._pending:
+            raise KeyError(coin)
+        self._pending.discard(coin)
+        self._loaded.pop(coin, None)
+
+    def __contains__(self, coin) -> bool:
+        return coin in self._loaded or coin in self._pending
+
+    def __iter__(self):
+        yield from list(self._loaded)
+        yield from list(self._pending)
+
+    def __len__(self) -> int:
+        return len(self._loaded) + len(self._pending)
+
+    def __copy__(self):
+        clone = LazyTradeRecords(self._pending, self._load)
+        clone._loaded = dict(self._loaded)
+        return clone
+
+    def __deepcopy__(self, memo):
+        clone = LazyTradeRecords(self._pending, self._load)
+        clone._loaded = copy.deepcopy(self._loaded, memo)
+        return clone
+
+    def loaded(self) -> Dict[str, List]:
+        """Return the coins whose records were accessed or assigned."""
+        return self._loaded
+
+    def to_dict(self) -> Dict[str, List]:
+        """Load every coin and return a plain dict, e.g. for serialization."""
+        return {coin: self[coin] for coin in list(self)}
+
+
+def build_trade_query(
+    coin: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Dict:
+    """Build the trades ledger filter for a window and keyset cursor."""
+    query: Dict = {"coin": coin.lower()}
+    if user_id is not None:
+        query["user_id"] = user_id
+    if start_date or end_date:
+        query["timestamp"] = {}
+        if start_date:
+            query["timestamp"]["$gte"] = start_date
+        if end_date:
+            query["timestamp"]["$lte"] = end_date
+    if cursor:
+        # Cursor is "<timestamp iso>|<ObjectId>" of the last trade on the previous page
+        timestamp_str, last_id = cursor.split("|", 1)
+        timestamp = datetime.fromisoformat(timestamp_str)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": ObjectId(last_id)}},
+        ]
+    return query
+
+
+def trade_page(docs: List[Dict], limit: int) -> Dict:
+    """Turn `limit + 1` ledger documents into a page of trades and a next cursor."""
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = f"{last['timestamp'].isoformat()}|{last['_id']}"
+    trades = []
+    for doc in docs:
+        record = doc["record"]
+        if isinstance(record, dict) and "timestamp" not in record:
+            record = {**record, "timestamp": doc["timestamp"]}
+        trades.append(record)
+    return {"trades": trades, "next_cursor": next_cursor}
+
+
+def parse_interval(interval: str) -> Tuple[str, int]:
+    """
+    Parse a bucket interval such as '15m', '1h', '1d' or '1w'.
+
+    Returns:
+        Tuple[str, int]: The `$dateTrunc` unit and bin size.
+    """
+    match = re.fullmatch(r"(\d+)([mhdw])", interval.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid interval: {interval}")
+    return INTERVAL_UNITS[match.group(2)], int(match.group(1))
+
+
+def truncate_timestamp(timestamp: datetime, resolution: str) -> datetime:
+    """Return the start of the rollup bucket containing `timestamp`."""
+    if resolution == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def select_rollup_resolution(
+    start_date: datetime,
+    end_date: datetime,
+    points: Optional[int] = None,
+    interval: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Pick the coarsest rollup that still answers a profit trend query.
+
+    With an `interval`, the rollup bucket must evenly divide it. Otherwise the
+    rollup must yield at least `points` (default ROLLUP_MIN_POINTS) buckets
+    over the range. Returns None when only raw snapshots are fine enough.
+    """
+    if interval:
+        unit, bin_size = parse_interval(interval)
+        bucket = INTERVAL_DELTAS[unit] * bin_size
+        for resolution, size in reversed(ROLLUP_RESOLUTIONS):
+            if bucket >= size and bucket % size == timedelta(0):
+                return resolution
+        return None
+
+    target = points or ROLLUP_MIN_POINTS
+    for resolution, size in reversed(ROLLUP_RESOLUTIONS):
+        if (end_date - start_date) / size >= target:
+            return resolution
+    return None
+
+
+def profit_trend_filters(
+    coin: str, start_date: datetime, end_date: datetime, resolution: str
+) -> Tuple[Dict, Dict]:
+    """Return the raw snapshot and `resolution` rollup filters for a trend range."""
+    raw = {"coin": coin.lower(), "timestamp": {"$gte": start_date, "$lte": end_date}}
+    rollup = {
+        "coin": coin.lower(),
+        "resolution": resolution,
+        "timestamp": {
+            "$gte": truncate_timestamp(start_date, resolution),
+            "$lte": end_date,
+        },
+    }
+    return raw, rollup
+
+
+def rollup_covers(
+    resolution: str,
+    raw_bounds: Tuple[Optional[Dict], Optional[Dict]],
+    rollup_bounds: Tuple[Optional[Dict], Optional[Dict]],
+) -> bool:
+    """
+    Tell whether a rollup spans the same buckets as the raw snapshots in a range.
+
+    Rollups are only written from the moment they were enabled, so on a
+    database with older snapshots they start late until
+    `rebuild_profit_rollups` runs; the first and last raw snapshots of the
+    range must fall in buckets the rollup has.
+
+    Args:
+        resolution (str): The rollup resolution.
+        raw_bounds: First and last raw snapshots in the range, or None.
+        rollup_bounds: First and last rollup buckets in the range, or None.
+
+    Returns:
+        bool: True if the rollup can stand in for the raw snapshots.
+    """
+    raw_first, raw_last = raw_bounds
+    rollup_first, rollup_last = rollup_bounds
+    if raw_first is None:
+        return True
+    if rollup_first is None:
+        return False
+    return (
+        truncate_timestamp(raw_first["timestamp"], resolution)
+        >= rollup_first["timestamp"]
+        and truncate_timestamp(raw_last["timestamp"], resolution)
+        <= rollup_last["timestamp"]
+    )
+
+
+def build_profit_trend_pipeline(
+    coin: str,
+    start_date: datetime,
+    end_date: datetime,
+    points: Optional[int] = None,
+    interval: Optional[str] = None,
+    mode: str = "last",
+    resolution: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Build the aggregation pipeline for a coin's profit trend.
+
+    Reads raw snapshots, or the `resolution` rollup when one is given.
+    Without `points` or `interval` those rows are returned as-is. Otherwise
+    they are grouped into time buckets (fixed `interval`, or the range split
+    into `points` equal buckets) and each bucket keeps the last snapshot, plus
+    price open/high/low/close when `mode` is 'ohlc'.
+    """
+    raw, rollup = profit_trend_filters(
+        coin, start_date, end_date, resolution or ROLLUP_RESOLUTIONS[0][0]
+    )
+    if resolution:
+        match = rollup
+        price, open_, high, low = "$close", "$open", "$high", "$low"
+    else:
+        match = raw
+        price = open_ = high = low = "$price"
+
+    pipeline = [{"$match": match}, {"$sort": {"timestamp": 1}}]
+    if not points and not interval:
+        projection = {"_id": 0, "timestamp": 1, "price": price, "global": 1}
+        if resolution and mode == "ohlc":
+            projection.update({"open": 1, "high": 1, "low": 1, "close": 1})
+        pipeline.append({"$project": projection})
+        return pipeline
+
+    if interval:
+        unit, bin_size = parse_interval(interval)
+        bucket = {
+            "$dateTrunc": {"date": "$timestamp", "unit": unit, "binSize": bin_size}
+        }
+    else:
+        range_ms = (end_date - start_date).total_seconds() * 1000
+        width_ms = max(1, math.ceil(range_ms / points))
+        offset = {"$subtract": ["$timestamp", start_date]}
+        bucket = {
+            "$add": [
+                start_date,
+                {"$multiply": [{"$floor": {"$divide": [offset, width_ms]}}, width_ms]},
+            ]
+        }
+
+    group = {"_id": bucket, "price": {"$last": price}, "global": {"$last": "$global"}}
+    projection = {"_id": 0, "timestamp": "$_id", "price": 1, "global": 1}
+    if mode == "ohlc":
+        group.update(
+            {
+                "open": {"$first": open_},
+                "high": {"$max": high},
+                "low": {"$min": low},
+                "close": {"$last": price},
+            }
+        )
+        projection.update({"open": 1, "high": 1, "low": 1, "close": 1})
+
+    pipeline += [{"$group": group}, {"$sort": {"_id": 1}}, {"$project": projection}]
+    return pipeline
+
+
+def net_investment(ledger: Optional[Dict], user_id: str) -> float:
+    """Return a user's deposits minus withdrawals in a coin ledger document."""
+    ledger = ledger or {}
+    deposits = (ledger.get("user_investments") or {}).get(user_id, 0.0)
+    withdrawals = (ledger.get("user_withdrawals") or {}).get(user_id, 0.0)
+    return deposits - withdrawals
+
+
+def user_balance_update(user_id: str, amounts: Dict[str, float]) -> Tuple[Dict, Dict]:
+    """
+    Build the users filter and update moving a user's coin balances by signed
+    `amounts`. Every balance that goes down is required to cover the change,
+    so a filter that matches nothing means a withdrawal is not covered.
+    """
+    user_filter: Dict = {"_id": ObjectId(user_id)}
+    for coin, amount in amounts.items():
+        if amount < 0:
+            user_filter[f"balances.{coin}"] = {"$gte": -amount}
+    return user_filter, {
+        "$inc": {f"balances.{coin}": amount for coin, amount in amounts.items()},
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def coin_state_update(previous: Dict, fields: Dict) -> Optional[Dict]:
+    """
+    Build the update moving a stored coin document from `previous` to `fields`.
+
+    Numbers, and numbers inside maps such as `user_investments`, are written
+    as `$inc` of the difference rather than `$set` of the new value. A
+    deposit or withdrawal the API applied since the scheduler loaded its
+    state is then kept instead of being overwritten with a stale total.
+    Everything else is `$set`, and fields or map keys that disappeared are
+    `$unset`.
+
+    Args:
+        previous (Dict): The coin's fields as last read or written.
+        fields (Dict): The coin's fields now.
+
+    Returns:
+        Optional[Dict]: The update, or None when nothing changed.
+    """
+    set_fields, inc_fields, unset_fields = {}, {}, {}
+    for field, value in fields.items():
+        old = previous.get(field)
+        if field in previous and old == value:
+            continue
+        if _is_number(value) and _is_number(old):
+            inc_fields[field] = value - old
+        elif (
+            isinstance(value, dict)
+            and isinstance(old, dict)
+            and all(_is_number(v) for v in value.values())
+            and all(_is_number(v) for v in old.values())
+        ):
+            for key, amount in value.items():
+                if amount != old.get(key):
+                    inc_fields[f"{field}.{key}"] = amount - old.get(key, 0)
+            for key in old:
+                if key not in value:
+                    unset_fields[f"{field}.{key}"] = ""
+        else:
+            set_fields[field] = value
+    for field in previous:
+        if field not in fields:
+            unset_fields[field] = ""
+
+    update = {}
+    for operator, values in (
+        ("$set", set_fields),
+        ("$inc", inc_fields),
+        ("$unset", unset_fields),
+    ):
+        if values:
+            update[operator] = values
+    return update or None
+
+
+def plan_bulk_balance_changes(
+    operations: List[Dict], users: Dict[str, Dict], ledgers: Dict[str, Dict]
+) -> Tuple[List[Dict], Dict[Tuple[str, str], Dict[str, float]]]:
+    """
+    Validate a batch of signed balance changes.
+
+    Operations are checked in order against the current balances, net
+    investments and free capital, so a withdrawal may rely on an earlier
+    deposit in the same batch. Accepted changes are summed per (user, coin).
+
+    Args:
+        operations (List[Dict]): Items with `user_id`, `coin` and signed `amount`.
+        users (Dict[str, Dict]): Current user documents (with `balances`) by ID.
+        ledgers (Dict[str, Dict]): Current coin ledger documents by coin.
+
+    Returns:
+        Tuple: Per-item results, and the `deposited`/`withdrawn` totals of the
+        accepted items by (user_id, coin).
+    """
+    balances = {uid: dict(user.get("balances") or {}) for uid, user in users.items()}
+    investments: Dict[Tuple[str, str], float] = {}
+    capital = {coin: doc.get("capital", 0.0) for coin, doc in ledgers.items()}
+    changes: Dict[Tuple[str, str], Dict[str, float]] = {}
+    results = []
+
+    for index, operation in enumerate(operations):
+        user_id, coin, amount = operation["user_id"], operation["coin"], operation["amount"]
+        result = {"index": index, "user_id": user_id, "coin": coin, "amount": amount}
+        key = (user_id, coin)
+        if key not in investments:
+            investments[key] = net_investment(ledgers.get(coin), user_id)
+        if not ObjectId.is_valid(user_id) or user_id not in balances:
+            error = "User not found"
+        elif amount < 0 and (
+            balances[user_id].get(coin, 0.0) < -amount or investments[key] < -amount
+        ):
+            error = "Insufficient balance"
+        elif amount < 0 and capital.get(coin, 0.0) < -amount:
+            error = "Insufficient free capital"
+        else:
+            error = None
+
+        if error:
+            results.append({**result, "status": "failed", "error": error})
+            continue
+        balances[user_id][coin] = balances[user_id].get(coin, 0.0) + amount
+        investments[key] += amount
+        capital[coin] = capital.get(coin, 0.0) + amount
+        totals = changes.setdefault(key, {"deposited": 0.0, "withdrawn": 0.0})
+        totals["deposited" if amount >= 0 else "withdrawn"] += abs(amount)
+        results.append({**result, "status": "applied"})
+    return results, changes
+
+
+def bulk_user_updates(
+    changes: Dict[Tuple[str, str], Dict[str, float]], marker: str
+) -> Tuple[List[str], List[UpdateOne]]:
+    """
+    Build one users update per user from `plan_bulk_balance_changes` totals.
+
+    Each update guards the balances it lowers and adds `marker` to the
+    user's `balance_batches`, so the users it matched can be found afterwards.
+
+    Returns:
+        Tuple: The user IDs and their updates, in the same order.
+    """
+    per_user: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for (user_id, coin), totals in changes.items():
+        per_user[user_id][coin] = totals["deposited"] - totals["withdrawn"]
+
+    user_ids, updates = [], []
+    for user_id, coins in per_user.items():
+        user_filter, update = user_balance_update(user_id, coins)
+        update["$addToSet"] = {"balance_batches": marker}
+        user_ids.append(user_id)
+        updates.append(UpdateOne(user_filter, update))
+    return user_ids, updates
+
+
+def bulk_ledger_updates(
+    changes: Dict[Tuple[str, str], Dict[str, float]]
+) -> Dict[str, Tuple[Dict, Dict, bool]]:
+    """
+    Build one ledger update per coin from deposited/withdrawn totals by
+    (user_id, coin), as summed by `plan_bulk_balance_changes`.
+
+    The ledger moves the way CapitalManager.deposit/withdraw move it: a
+    deposit adds to the user's `user_investments` entry, `total_deposits`
+    and `capital`; a withdrawal adds to `user_withdrawals` and
+    `total_withdrawals` and takes the amount out of `capital`. A coin whose
+    capital goes down is guarded: its filter requires the free capital, and
+    the net investment of every user withdrawing on balance, to cover the
+    change. Without a transaction a guarded update can then match nothing
+    instead of driving the ledger negative. Only unguarded updates upsert.
+
+    Returns:
+        Dict[str, Tuple[Dict, Dict, bool]]: The filter, update and upsert
+        flag by coin.
+    """
+    increments: Dict[str, Dict[str, float]] = defaultdict(
+        lambda: {"total_deposits": 0.0, "total_withdrawals": 0.0, "capital": 0.0}
+    )
+    investment_guards: Dict[str, List[Dict]] = defaultdict(list)
+    for (user_id, coin), totals in changes.items():
+        coin_inc = increments[coin]
+        if totals["deposited"]:
+            coin_inc[f"user_investments.{user_id}"] = totals["deposited"]
+        if totals["withdrawn"]:
+            coin_inc[f"user_withdrawals.{user_id}"] = totals["withdrawn"]
+        coin_inc["total_deposits"] += totals["deposited"]
+        coin_inc["total_withdrawals"] += totals["withdrawn"]
+        coin_inc["capital"] += totals["deposited"] - totals["withdrawn"]
+        withdrawn = totals["withdrawn"] - totals["deposited"]
+        if withdrawn > 0:
+            investment_guards[coin].append(
+                {
+                    "$gte": [
+                        {
+                            "$subtract": [
+                                {"$ifNull": [f"$user_investments.{user_id}", 0]},
+                                {"$ifNull": [f"$user_withdrawals.{user_id}", 0]},
+                            ]
+                        },
+                        withdrawn,
+                    ]
+                }
+            )
+
+    updates = {}
+    for coin, coin_inc in increments.items():
+        ledger_filter: Dict = {"_id": coin}
+        if coin_inc["capital"] < 0:
+            ledger_filter["capital"] = {"$gte": -coin_inc["capital"]}
+        if investment_guards[coin]:
+            ledger_filter["$expr"] = {"$and": investment_guards[coin]}
+        guarded = len(ledger_filter) > 1
+        updates[coin] = (ledger_filter, {"$inc": coin_inc}, not guarded)
+    return updates
+
+
+def drop_rejected_coins(
+    results: List[Dict],
+    changes: Dict[Tuple[str, str], Dict[str, float]],
+    rejected: Set[str],
+) -> Tuple[Dict[Tuple[str, str], Dict[str, float]], List[UpdateOne]]:
+    """
+    Mark the items in coins whose ledger update matched nothing as failed.
+
+    Returns:
+        Tuple: The changes of the other coins, and the users updates taking
+        the rejected coins' amounts back out of the balances already changed.
+    """
+    for result in results:
+        if result["status"] == "applied" and result["coin"] in rejected:
+            result["status"] = "failed"
+            result["error"] = (
+                f"Insufficient investment or free capital in {result['coin']}"
+            )
+
+    reverts: Dict[str, Dict[str, float]] = defaultdict(dict)
+    kept = {}
+    for (user_id, coin), totals in changes.items():
+        if coin in rejected:
+            amount = totals["deposited"] - totals["withdrawn"]
+            reverts[user_id][f"balances.{coin}"] = -amount
+        else:
+            kept[(user_id, coin)] = totals
+    return kept, [
+        UpdateOne({"_id": ObjectId(user_id)}, {"$inc": inc})
+        for user_id, inc in reverts.items()
+    ]
+
+
+def drop_unmatched_changes(
+    results: List[Dict],
+    changes: Dict[Tuple[str, str], Dict[str, float]],
+    matched: Set[str],
+) -> Dict[Tuple[str, str], Dict[str, float]]:
+    """
+    Mark the items of users whose update matched nothing as failed and return
+    the changes of the users that were updated.
+    """
+    for result in results:
+        if result["status"] == "applied" and result["user_id"] not in matched:
+            result["status"] = "failed"
+            result["error"] = "Balance changed during the update"
+    return {key: totals for key, totals in changes.items() if key[0] in matched}
+
+
+def rollup_operations(snapshot: Dict) -> List[UpdateOne]:
+    """
+    Build the upserts that fold one profit snapshot into its hourly and daily rollups.
+
+    Each rollup keeps the first price as `open`, the running `high`/`low`,
+    and the latest price and global figures as `close`/`global`. Snapshots
+    are assumed to arrive in time order, as the scheduler writes them.
+    """
+    timestamp = snapshot["timestamp"]
+    price = snapshot.get("price")
+    operations = []
+    for resolution, _ in ROLLUP_RESOLUTIONS:
+        update = {
+            "$set": {"close": price, "global": snapshot.get("global")},
+            "$inc": {"count": 1},
+            "$setOnInsert": {"open": price},
+        }
+        if price is not None:
+            update["$min"] = {"low": price}
+            update["$max"] = {"high": price}
+        operations.append(
+            UpdateOne(
+                {
+                    "coin": snapshot.get("coin"),
+                    "resolution": resolution,
+                    "timestamp": truncate_timestamp(timestamp, resolution),
+                },
+                update,
+                upsert=True,
+            )
+        )
+    return operations
+
+
+@instrument_mongo_service
 class MongoUserService:
+    # Set once ensure_indexes has run in this process
+    _indexes_ensured = False
+    _indexes_lock = threading.Lock()
+
     def __init__(self):
         """Initialize MongoDB connection and set up collections."""
         try:
-            # Get base URI and credentials from config
-            base_uri = config.mongodb_uri
-            username = config.mongodb_username
-            password = config.mongodb_password
-
-            # Construct the MongoDB URI
-            if username and password:
-                # Escape username and password to handle special characters
-                escaped_username = quote_plus(username)
-                escaped_password = quote_plus(password)
-                # Ensure the URI includes credentials and authSource
-                if base_uri.startswith("mongodb://"):
-                    base_uri = base_uri[len("mongodb://") :]
-                mongo_uri = (
-                    f"mongodb://{escaped_username}:{escaped_password}@{base_uri}"
-                )
-                if "?authSource=" not in mongo_uri:
-                    mongo_uri += "?authSource=admin"
-            else:
-                # Use the base URI as-is (no credentials)
-                mongo_uri = base_uri
-                if "?authSource=" not in mongo_uri and "mongodb://" in mongo_uri:
-                    mongo_uri += "?authSource=admin"
-
-            # Log connection attempt (mask password)
-            logging.info(
-                f"Connecting to MongoDB at {mongo_uri.replace(password, '****') if password else mongo_uri}"
-            )
-
-            # Connect to MongoDB
-            self.client = MongoClient(mongo_uri)
+            # Share one pooled client across every instance in this process
+            self.client = get_mongo_client()
             self.db = self.client.user_management
             self.users = self.db.users
             self.trading_state = self.db.trading_state
-
-            # Create indexes
-            self.users.create_index("email", unique=True)
-            self.users.create_index([("social_id", 1), ("provider", 1)], unique=True)
+            self.coin_states = self.db.coin_trading_state
+            self.trades = self.db.trades
+            # Last stored per-coin fields and per-seq trade record digests, used
+            # to diff saves, and the coins that had trade records when loaded
+            self._persisted_coins: Dict[str, Dict] = {}
+            self._trade_hashes: Dict[str, List[bytes]] = {}
+            self._trade_coins: Set[str] = set()
+            # Guards the snapshots above when trading threads share this instance
+            self._state_lock = threading.RLock()
 
             logging.info("Successfully connected to MongoDB")
         except Exception as e:
             logging.error(f"Failed to connect to MongoDB: {str(e)}")
             raise
 
+    def ensure_indexes(self):
+        """
+        Create the indexes and collections the scheduler's queries rely on.
+
+        Called once at startup by the scheduler process (see run.py) rather
+        than on every instantiation; later calls in the same process return
+        without touching the server. Also backfills the profit rollups when
+        snapshots predate them.
+        """
+        with MongoUserService._indexes_lock:
+            if MongoUserService._indexes_ensured:
+                return
+            self.users.create_index("email", unique=True)
+            self.users.create_index([("social_id", 1), ("provider", 1)], unique=True)
+            self.trades.create_index([("coin", 1), ("seq", 1)], unique=True)
+            self.trades.create_index([("coin", 1), ("timestamp", -1)])
+            self.trades.create_index([("user_id", 1), ("coin", 1), ("timestamp", -1)])
+            self._ensure_profit_snapshots()
+            MongoUserService._indexes_ensured = True
+
+    def _ensure_profit_snapshots(self):
+        """Create profit_snapshots as a time-series collection when possible."""
+        if "profit_snapshots" not in self.db.list_collection_names():
+            try:
+                self.db.create_collection(
+                    "profit_snapshots",
+                    timeseries={
+                        "timeField": "timestamp",
+                        "metaField": "coin",
+                        "granularity": "minutes",
+                    },
+                )
+                logging.info("Created profit_snapshots time-series collection")
+            except (CollectionInvalid, OperationFailure) as e:
+                # Older servers or a concurrent creator; fall back to the index below
+                logging.warning(
+                    f"Could not create profit_snapshots as time-series: {str(e)}"
+                )
+        self.db.profit_snapshots.create_index([("coin", 1), ("timestamp", 1)])
+        self.db.profit_rollups.create_index(
+            [("coin", 1), ("resolution", 1), ("timestamp", 1)], unique=True
+        )
+        # Backfill rollups for snapshots written before rollups existed
+        if self.db.profit_rollups.find_one({}, {"_id": 1}) is None and (
+            self.db.profit_snapshots.find_one({}, {"_id": 1}) is not None
+        ):
+            self.rebuild_profit_rollups()
+
     def create_user(
         self,
         email: str,
@@ -121,6 +831,7 @@ class MongoUserService:
                 {"_id": ObjectId(user_id)},
                 {"$set": {"role": role.value, "updated_at": datetime.utcnow()}},
             )
+            user_cache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logging.error(f"Failed to update user role: {str(e)}")
@@ -159,18 +870,12 @@ class MongoUserService:
         """Delete a user by ID."""
         try:
             result = self.users.delete_one({"_id": ObjectId(user_id)})
+            user_cache.invalidate(user_id)
             return result.deleted_count > 0
         except Exception as e:
             logging.error(f"Failed to delete user: {str(e)}")
             return False
 
-    def __del__(self):
-        """Clean up MongoDB connection."""
-        try:
-            self.client.close()
-        except:
-            pass
-
     # Add to MongoUserService class in app/users/mongodb_service.py
 
     def deposit_balance(self, user_id: str, coin: str, amount: float) -> bool:
@@ -184,6 +889,7 @@ class MongoUserService:
                 },
             )
             # $inc creates the balances field and coin entry if they don't exist
+            user_cache.invalidate(user_id)
             if result.modified_count == 0:
                 logging.warning(
                     f"No user found or balance unchanged for user_id: {user_id}, coin: {coin}"
@@ -208,6 +914,7 @@ class MongoUserService:
                     "$set": {"updated_at": datetime.utcnow()},
                 },
             )
+            user_cache.invalidate(user_id)
             if result.matched_count == 0:
                 logging.warning(
                     f"Insufficient balance or user not found for user_id: {user_id}, coin: {coin}"
@@ -219,40 +926,524 @@ class MongoUserService:
             )
             raise
 
-    def get_trading_state(self) -> Dict:
-        """Retrieve the scheduler's trading state from the database."""
-        state = self.trading_state.find_one({"_id": "scheduler_state"})
-        if state:
-            return {
-                "user_investments": state.get("user_investments", {}),
-                "total_deposits": state.get("total_deposits", {}),
-                "capital": state.get("capital", {}),
-                "positions": state.get("positions", {}),
-                "total_cost": state.get("total_cost", {}),
-                "trade_records": state.get("trade_records", {}),
-            }
-        # Return empty state if no document exists
+    def _apply_balance_change(
+        self, user_id: str, coin: str, amount: float, session=None
+    ) -> Dict:
+        # A one-item batch: same ledger rules and guards as the bulk path
+        totals = {"deposited": max(amount, 0.0), "withdrawn": max(-amount, 0.0)}
+        ledger_filter, ledger_update, upsert = bulk_ledger_updates(
+            {(user_id, coin): totals}
+        )[coin]
+        user = self.users.find_one_and_update(
+            *user_balance_update(user_id, {coin: amount}),
+            projection={f"balances.{coin}": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if user is None:
+            raise ValueError("Insufficient balance or user not found")
+
+        ledger = self.coin_states.find_one_and_update(
+            ledger_filter,
+            ledger_update,
+            projection={
+                f"user_investments.{user_id}": 1,
+                f"user_withdrawals.{user_id}": 1,
+            },
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if ledger is None:
+            if session is None:
+                # No transaction to roll back; undo the balance change by hand
+                self.users.update_one(
+                    {"_id": ObjectId(user_id)}, {"$inc": {f"balances.{coin}": -amount}}
+                )
+            raise ValueError(f"Insufficient investment or free capital in {coin}")
+
+        self.trading_state.update_one(
+            {"_id": "scheduler_state"},
+            {"$set": {"layout": STATE_LAYOUT}, "$inc": {"version": 1}},
+            upsert=True,
+            session=session,
+        )
         return {
-            "user_investments": {},
-            "total_deposits": {},
-            "capital": {},
-            "positions": {},
-            "total_cost": {},
-            "trade_records": {},
+            "balance": user.get("balances", {}).get(coin, 0.0),
+            "investment": net_investment(ledger, user_id),
+        }
+
+    def apply_balance_change(self, user_id: str, coin: str, amount: float) -> Dict:
+        """
+        Apply a deposit (positive amount) or withdrawal (negative amount) to the
+        user's balance and the coin's ledger in one transaction.
+
+        Both documents are updated with `find_one_and_update`, so the new
+        figures come back without another read. The ledger update is the one
+        `bulk_ledger_updates` builds for a batch of this single change, so
+        single and bulk operations follow the same CapitalManager rules. The
+        state version is bumped so every CapitalManager reloads. On servers
+        without transactions the updates run in sequence and the balance
+        change is reverted if the ledger update fails. This is the only
+        implementation; the API runs it in the threadpool.
+
+        Args:
+            user_id (str): The user's ID.
+            coin (str): Lowercase coin symbol.
+            amount (float): Signed amount.
+
+        Returns:
+            Dict: The new `balance` and net `investment` of the user in this coin.
+
+        Raises:
+            ValueError: If a withdrawal exceeds the balance, the user's net
+                investment or the coin's free capital.
+        """
+        try:
+            with self.client.start_session() as session:
+                return session.with_transaction(
+                    lambda s: self._apply_balance_change(user_id, coin, amount, s)
+                )
+        except OperationFailure as e:
+            if e.code != TRANSACTIONS_UNSUPPORTED_CODE:
+                raise
+            return self._apply_balance_change(user_id, coin, amount)
+        finally:
+            user_cache.invalidate(user_id)
+
+    def _bulk_apply_balance_changes(self, operations: List[Dict], session=None) -> Dict:
+        user_ids = [
+            ObjectId(op["user_id"]) for op in operations if ObjectId.is_valid(op["user_id"])
+        ]
+        coins = list({op["coin"] for op in operations})
+        users = {
+            str(user["_id"]): user
+            for user in self.users.find(
+                {"_id": {"$in": user_ids}}, {"balances": 1}, session=session
+            )
+        }
+        ledgers = {
+            doc["_id"]: doc
+            for doc in self.coin_states.find(
+                {"_id": {"$in": coins}},
+                {"user_investments": 1, "user_withdrawals": 1, "capital": 1},
+                session=session,
+            )
         }
+        results, changes = plan_bulk_balance_changes(operations, users, ledgers)
+        if not changes:
+            return {"results": results, "unmatched": 0}
+
+        marker = str(ObjectId())
+        changed_ids, user_updates = bulk_user_updates(changes, marker)
+        write = self.users.bulk_write(user_updates, ordered=False, session=session)
+        # Only possible without a transaction, if balances moved since the read
+        unmatched = len(user_updates) - write.matched_count
+        changed_oids = [ObjectId(user_id) for user_id in changed_ids]
+        if unmatched:
+            logging.warning(f"{unmatched} bulk balance updates matched no user")
+            matched = {
+                str(user["_id"])
+                for user in self.users.find(
+                    {"_id": {"$in": changed_oids}, "balance_batches": marker},
+                    {"_id": 1},
+                    session=session,
+                )
+            }
+            changes = drop_unmatched_changes(results, changes, matched)
+        self.users.update_many(
+            {"_id": {"$in": changed_oids}},
+            {"$pull": {"balance_batches": marker}},
+            session=session,
+        )
+
+        # One update per coin, so a guard that no longer holds is seen per coin
+        rejected = set()
+        for coin, (ledger_filter, update, upsert) in bulk_ledger_updates(
+            changes
+        ).items():
+            write = self.coin_states.update_one(
+                ledger_filter, update, upsert=upsert, session=session
+            )
+            if not write.matched_count and write.upserted_id is None:
+                rejected.add(coin)
+        if rejected:
+            # Only possible without a transaction, if the ledger moved since the read
+            logging.warning(f"Bulk ledger updates rejected for {sorted(rejected)}")
+            changes, reverts = drop_rejected_coins(results, changes, rejected)
+            if reverts:
+                self.users.bulk_write(reverts, ordered=False, session=session)
+
+        if changes:
+            self.trading_state.update_one(
+                {"_id": "scheduler_state"},
+                {"$set": {"layout": STATE_LAYOUT}, "$inc": {"version": 1}},
+                upsert=True,
+                session=session,
+            )
+        return {"results": results, "unmatched": unmatched}
+
+    def bulk_apply_balance_changes(self, operations: List[Dict]) -> Dict:
+        """
+        Apply many deposits/withdrawals with unordered bulk writes.
+
+        Balances are read once, every operation is validated in order (see
+        `plan_bulk_balance_changes`), then accepted changes are written with one
+        users `bulk_write`, one guarded update per coin ledger and a single
+        state version bump. Runs in a transaction when the server supports it.
+        Without one, a user update can miss because the balance moved since
+        the read; the ledger then only receives the changes of users that were
+        updated, and the items of the others are reported as failed. Likewise
+        a coin whose free capital or investments no longer cover its
+        withdrawals is left untouched, its balance changes are reverted and
+        its items are reported as failed.
+
+        Args:
+            operations (List[Dict]): Items with `user_id`, lowercase `coin` and
+                signed `amount` (negative for withdrawals).
+
+        Returns:
+            Dict: `results` with a status (and error) per item, and `unmatched`,
+            the number of per-user updates that no longer matched at write time.
+        """
+        try:
+            try:
+                with self.client.start_session() as session:
+                    return session.with_transaction(
+                        lambda s: self._bulk_apply_balance_changes(operations, s)
+                    )
+            except OperationFailure as e:
+                if e.code != TRANSACTIONS_UNSUPPORTED_CODE:
+                    raise
+                return self._bulk_apply_balance_changes(operations)
+        finally:
+            for operation in operations:
+                user_cache.invalidate(operation["user_id"])
+
+    def get_trading_state(self) -> Dict:
+        """
+        Retrieve the scheduler's trading state from the database.
+
+        The state is reassembled from one document per coin into the
+        `{field: {coin: value}}` shape the CapitalManager expects.
+        `trade_records` is a LazyTradeRecords that reads a coin's trades on
+        first access. A legacy single-document state is migrated on first read.
+        """
+        with self._state_lock:
+            meta = self.trading_state.find_one({"_id": "scheduler_state"})
+            if meta and meta.get("layout") != STATE_LAYOUT:
+                self.migrate_trading_state()
+                meta = self.trading_state.find_one({"_id": "scheduler_state"})
+
+            state = {field: {} for field in DEFAULT_STATE_FIELDS}
+            for key, value in (meta or {}).items():
+                if key not in STATE_META_FIELDS:
+                    state[key] = value
+
+            persisted = {}
+            for doc in self.coin_states.find():
+                coin = doc.pop("_id")
+                for field, value in doc.items():
+                    state.setdefault(field, {})[coin] = value
+                persisted[coin] = copy.deepcopy(doc)
+
+            # Remember what is stored so the next save only writes what changed
+            self._persisted_coins = persisted
+            self._trade_hashes = {}
+            self._trade_coins = set(self.trades.distinct("coin"))
+            state["trade_records"] = LazyTradeRecords(
+                self._trade_coins, self._load_trade_records
+            )
+            return state
+
+    def _load_trade_records(self, coin: str) -> List:
+        """Read a coin's trade records in seq order and remember their digests."""
+        with self._state_lock:
+            records = [
+                doc["record"]
+                for doc in self.trades.find(
+                    {"coin": coin}, {"_id": 0, "record": 1}
+                ).sort("seq", 1)
+            ]
+            self._trade_hashes[coin] = [record_fingerprint(r) for r in records]
+            return records
 
     def set_trading_state(self, state: Dict) -> bool:
-        """Save or update the scheduler's trading state in the database."""
+        """
+        Save the scheduler's trading state in the database.
+
+        Only coins whose fields differ from what this instance last read or
+        wrote are updated, with the partial update built by
+        `coin_state_update`, so balances moved by the API in the meantime are
+        preserved; a coin document deleted since it was read is recreated
+        with the full fields rather than the deltas. As with a `$set` of the
+        whole state, a coin missing from a field that is saved loses that
+        field, and a coin left with no fields is deleted. Trade records are
+        diffed per seq (see `_save_trade_records`); with a LazyTradeRecords
+        only accessed coins are compared. Inside a `trading_state_scope`
+        only the scoped coins are saved.
+        """
+        scope = getattr(_state_scope, "coins", None)
+        with self._state_lock:
+            try:
+                coin_slices = defaultdict(dict)
+                meta_fields = {}
+                saved_fields = set()
+                trade_records = None
+                for field, value in state.items():
+                    if field in STATE_META_FIELDS:
+                        continue
+                    if field == "trade_records":
+                        trade_records = value
+                        continue
+                    if not isinstance(value, dict):
+                        if scope is None:
+                            meta_fields[field] = value
+                        continue
+                    saved_fields.add(field)
+                    for coin, coin_value in value.items():
+                        if scope is None or coin in scope:
+                            coin_slices[coin][field] = coin_value
+
+                if trade_records is not None:
+                    self._save_all_trade_records(trade_records, scope)
+
+                operations = []
+                for coin in set(coin_slices) | set(self._persisted_coins):
+                    if scope is not None and coin not in scope:
+                        continue
+                    previous = self._persisted_coins.get(coin, {})
+                    # Fields this save does not mention are left as they are
+                    fields = {
+                        field: value
+                        for field, value in previous.items()
+                        if field not in saved_fields
+                    }
+                    fields.update(coin_slices.get(coin, {}))
+                    if not fields:
+                        operations.append(DeleteOne({"_id": coin}))
+                        self._persisted_coins.pop(coin, None)
+                        continue
+                    update = coin_state_update(previous, fields)
+                    if update is None:
+                        continue
+                    if previous:
+                        # The deltas only apply to an existing document; if it
+                        # was deleted meanwhile, insert the full fields instead
+                        operations.append(UpdateOne({"_id": coin}, update))
+                        operations.append(
+                            UpdateOne(
+                                {"_id": coin}, {"$setOnInsert": fields}, upsert=True
+                            )
+                        )
+                    else:
+                        operations.append(UpdateOne({"_id": coin}, update, upsert=True))
+                    self._persisted_coins[coin] = copy.deepcopy(fields)
+
+                if operations:
+                    # Ordered, so a coin's $setOnInsert runs after its deltas
+                    self.coin_states.bulk_write(operations, ordered=True)
+
+                # Bump the version stamp so readers know to reload
+                self.trading_state.update_one(
+                    {"_id": "scheduler_state"},
+                    {
+                        "$set": {**meta_fields, "layout": STATE_LAYOUT},
+                        "$inc": {"version": 1},
+                    },
+                    upsert=True,
+                )
+                return True
+            except Exception as e:
+                # Force a full rewrite on the next save rather than trusting the snapshot
+                self._persisted_coins = {}
+                self._trade_hashes = {}
+                logging.error(f"Failed to set trading state: {str(e)}")
+                return False
+
+    def _save_all_trade_records(
+        self, trade_records, scope: Optional[Set[str]] = None
+    ) -> None:
+        """
+        Save changed coins of `trade_records` and drop coins no longer in it,
+        only looking at the coins in `scope` when one is given.
+        """
+        if isinstance(trade_records, LazyTradeRecords):
+            changed = trade_records.loaded()
+        else:
+            changed = trade_records
+        for coin, records in changed.items():
+            if isinstance(records, list) and (scope is None or coin in scope):
+                self._save_trade_records(coin, records)
+        coins = set(trade_records)
+        for coin in self._trade_coins - coins:
+            if scope is None or coin in scope:
+                self.trades.delete_many({"coin": coin})
+                self._trade_hashes.pop(coin, None)
+        if scope is None:
+            self._trade_coins = coins
+        else:
+            self._trade_coins = (self._trade_coins - scope) | (coins & scope)
+
+    def _save_trade_records(self, coin: str, records: List) -> None:
+        """
+        Write the trade records of a coin that differ from the stored ones.
+
+        Records are compared by seq with the digests taken when they were
+        read or last written: new seqs are inserted, changed ones replaced
+        and seqs past the end of `records` deleted.
+        """
+        stored = self._trade_hashes.get(coin)
+        if stored is None:
+            # Never read through this instance; diff against the stored records
+            self._load_trade_records(coin)
+            stored = self._trade_hashes[coin]
+
+        digests = [record_fingerprint(record) for record in records]
+        operations = []
+        for seq, (record, digest) in enumerate(zip(records, digests)):
+            if seq >= len(stored):
+                operations.append(InsertOne(trade_document(coin, seq, record)))
+            elif digest != stored[seq]:
+                operations.append(
+                    ReplaceOne({"coin": coin, "seq": seq}, trade_document(coin, seq, record))
+                )
+        if len(records) < len(stored):
+            operations.append(DeleteMany({"coin": coin, "seq": {"$gte": len(records)}}))
+
+        if operations:
+            self.trades.bulk_write(operations, ordered=True)
+        self._trade_hashes[coin] = digests
+
+    def append_trades(self, coin: str, records: List) -> int:
+        """
+        Append trade records for a coin to the trades ledger in one bulk write.
+
+        Args:
+            coin (str): The coin the trades belong to.
+            records (List): Trade records in execution order.
+
+        Returns:
+            int: The number of records inserted.
+        """
+        with self._state_lock:
+            if not records:
+                return 0
+            stored = self._trade_hashes.get(coin)
+            start = (
+                len(stored)
+                if stored is not None
+                else self.trades.count_documents({"coin": coin})
+            )
+            result = self.trades.insert_many(
+                [
+                    trade_document(coin, seq, record)
+                    for seq, record in enumerate(records, start=start)
+                ],
+                ordered=False,
+            )
+            if stored is not None:
+                stored.extend(record_fingerprint(record) for record in records)
+            self._trade_coins.add(coin)
+            return len(result.inserted_ids)
+
+    def get_trades(
+        self,
+        coin: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> Dict:
+        """
+        Retrieve one page of a coin's trades, newest first.
+
+        Args:
+            coin (str): The coin symbol.
+            start_date (Optional[datetime]): Only trades at or after this time.
+            end_date (Optional[datetime]): Only trades at or before this time.
+            user_id (Optional[str]): Only trades attributed to this user.
+            cursor (Optional[str]): `next_cursor` from the previous page.
+            limit (int): Maximum number of trades to return.
+
+        Returns:
+            Dict: `trades` for this page and `next_cursor` (None on the last page).
+        """
+        query = build_trade_query(coin, start_date, end_date, user_id, cursor)
         try:
-            result = self.trading_state.update_one(
-                {"_id": "scheduler_state"},  # Fixed ID for the scheduler's state
-                {"$set": state},
-                upsert=True,  # Create the document if it doesn’t exist
+            docs = list(
+                self.trades.find(query, TRADE_PROJECTION)
+                .sort([("timestamp", -1), ("_id", -1)])
+                .limit(limit + 1)
             )
-            return result.modified_count > 0 or result.upserted_id is not None
+            return trade_page(docs, limit)
         except Exception as e:
-            logging.error(f"Failed to set trading state: {str(e)}")
-            return False
+            logging.error(f"Failed to retrieve trades for {coin}: {str(e)}")
+            return {"trades": [], "next_cursor": None}
+
+    def migrate_trading_state(self) -> bool:
+        """
+        Split a legacy single `scheduler_state` document into per-coin documents.
+
+        The original document is kept as `scheduler_state_legacy`. Safe to run
+        more than once; it does nothing once the state uses the per-coin layout.
+
+        Returns:
+            bool: True if a legacy document was migrated, False otherwise.
+        """
+        with self._state_lock:
+            try:
+                legacy = self.trading_state.find_one({"_id": "scheduler_state"})
+                if not legacy or legacy.get("layout") == STATE_LAYOUT:
+                    return False
+
+                self.trading_state.replace_one(
+                    {"_id": "scheduler_state_legacy"},
+                    {**legacy, "_id": "scheduler_state_legacy"},
+                    upsert=True,
+                )
+
+                coin_docs = defaultdict(dict)
+                meta = {"layout": STATE_LAYOUT, "version": legacy.get("version", 0) + 1}
+                for field, value in legacy.items():
+                    if field in STATE_META_FIELDS or field == "_id":
+                        continue
+                    if not isinstance(value, dict):
+                        meta[field] = value
+                        continue
+                    for coin, coin_value in value.items():
+                        if field == "trade_records" and isinstance(coin_value, list):
+                            self.trades.delete_many({"coin": coin})
+                            if coin_value:
+                                self.trades.insert_many(
+                                    [
+                                        trade_document(coin, seq, record)
+                                        for seq, record in enumerate(coin_value)
+                                    ]
+                                )
+                        else:
+                            coin_docs[coin][field] = coin_value
+
+                for coin, fields in coin_docs.items():
+                    self.coin_states.replace_one({"_id": coin}, fields, upsert=True)
+
+                self.trading_state.replace_one({"_id": "scheduler_state"}, meta)
+                self._persisted_coins = {}
+                self._trade_hashes = {}
+                self._trade_coins = set()
+                logging.info(
+                    f"Migrated trading state to per-coin layout for {len(coin_docs)} coins"
+                )
+                return True
+            except Exception as e:
+                logging.error(f"Failed to migrate trading state: {str(e)}")
+                return False
+
+    def get_trading_state_version(self) -> int:
+        """Return the version stamp of the scheduler's trading state (0 if unset)."""
+        state = self.trading_state.find_one({"_id": "scheduler_state"}, {"version": 1})
+        return state.get("version", 0) if state else 0
 
     def add_wallet(self, user_id: str, coin: str, wallet_address: str) -> bool:
         """
@@ -276,6 +1467,7 @@ class MongoUserService:
                     }
                 },
             )
+            user_cache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logging.error(
@@ -336,6 +1528,13 @@ class MongoUserService:
                 f"Deleted {result_trading.deleted_count} documents from trading_state collection"
             )
 
+            # Delete per-coin trading state and trade records
+            self.coin_states.delete_many({})
+            self.trades.delete_many({})
+            self._persisted_coins = {}
+            self._trade_hashes = {}
+            self._trade_coins = set()
+
             # Delete all documents from the investment_records collection
             result_investments = self.db.investment_records.delete_many({})
             logging.info(
@@ -348,9 +1547,12 @@ class MongoUserService:
             return False
 
     def insert_profit_snapshot(self, snapshot: Dict) -> bool:
-        """Insert a profit snapshot into the database."""
+        """Insert a profit snapshot and fold it into the hourly and daily rollups."""
         try:
+            # Time-series collections require a BSON date in the time field
+            snapshot = {**snapshot, "timestamp": to_datetime(snapshot.get("timestamp"))}
             result = self.db.profit_snapshots.insert_one(snapshot)
+            self.db.profit_rollups.bulk_write(rollup_operations(snapshot), ordered=False)
             return result.inserted_id is not None
         except Exception as e:
             logging.error(f"Failed to insert profit snapshot: {str(e)}")
@@ -361,54 +1563,161 @@ class MongoUserService:
         coin: str,
         start_date: datetime,
         end_date: datetime,
+        points: Optional[int] = None,
+        interval: Optional[str] = None,
+        mode: str = "last",
     ) -> List[Dict]:
-        """Retrieve profit trend data for a coin within a date range."""
-        query = {
-            "coin": coin.lower(),
-            "timestamp": {"$gte": start_date, "$lte": end_date},
-        }
-        projection = {"_id": 0, "timestamp": 1, "price": 1, "global": 1}
+        """
+        Retrieve profit trend data for a coin within a date range.
 
-        print(f"Querying profit trend with: {query} and projection: {projection}")
+        Reads the coarsest hourly/daily rollup adequate for the range, so long
+        ranges cost O(buckets); falls back to raw snapshots when no rollup fits
+        or the rollup does not cover every raw snapshot in the range.
 
+        Args:
+            coin (str): The coin symbol.
+            start_date (datetime): Start of the range.
+            end_date (datetime): End of the range.
+            points (Optional[int]): Downsample to at most this many buckets.
+            interval (Optional[str]): Downsample to fixed buckets, e.g. '1h' or '1d'.
+            mode (str): 'last' keeps the last snapshot per bucket, 'ohlc' adds price OHLC.
+
+        Returns:
+            List[Dict]: Snapshots (or buckets) sorted by timestamp.
+        """
+        resolution = select_rollup_resolution(start_date, end_date, points, interval)
         try:
-            snapshots = list(
-                self.db.profit_snapshots.find(query, projection).sort("timestamp", 1)
+            if resolution:
+                pipeline = build_profit_trend_pipeline(
+                    coin, start_date, end_date, points, interval, mode, resolution
+                )
+                if self._rollup_covers_range(coin, start_date, end_date, resolution):
+                    return list(self.db.profit_rollups.aggregate(pipeline))
+            pipeline = build_profit_trend_pipeline(
+                coin, start_date, end_date, points, interval, mode
             )
-            return snapshots
+            return list(self.db.profit_snapshots.aggregate(pipeline))
         except Exception as e:
             logging.error(f"Failed to retrieve profit trend: {str(e)}")
             return []
 
+    def _rollup_covers_range(
+        self, coin: str, start_date: datetime, end_date: datetime, resolution: str
+    ) -> bool:
+        """Check the rollup against the first and last raw snapshots in the range."""
+        raw, rollup = profit_trend_filters(coin, start_date, end_date, resolution)
+
+        def bounds(collection, query):
+            return tuple(
+                collection.find_one(query, {"timestamp": 1}, sort=[("timestamp", order)])
+                for order in (1, -1)
+            )
+
+        covered = rollup_covers(
+            resolution,
+            bounds(self.db.profit_snapshots, raw),
+            bounds(self.db.profit_rollups, rollup),
+        )
+        if not covered:
+            logging.warning(
+                f"Profit {resolution} rollup for {coin} does not cover the range; "
+                "reading raw snapshots"
+            )
+        return covered
+
+    def rebuild_profit_rollups(self, coin: Optional[str] = None) -> bool:
+        """
+        Recompute hourly and daily rollups from raw profit snapshots.
+
+        Use after enabling rollups on a database that already has snapshots.
+
+        Args:
+            coin (Optional[str]): Only rebuild this coin; all coins when None.
+
+        Returns:
+            bool: True if the rebuild succeeded, False otherwise.
+        """
+        match = {"coin": coin.lower()} if coin else {}
+        try:
+            for resolution, _ in ROLLUP_RESOLUTIONS:
+                self.db.profit_snapshots.aggregate(
+                    [
+                        {"$match": match},
+                        {"$sort": {"timestamp": 1}},
+                        {
+                            "$group": {
+                                "_id": {
+                                    "coin": "$coin",
+                                    "timestamp": {
+                                        "$dateTrunc": {
+                                            "date": "$timestamp",
+                                            "unit": resolution,
+                                        }
+                                    },
+                                },
+                                "open": {"$first": "$price"},
+                                "high": {"$max": "$price"},
+                                "low": {"$min": "$price"},
+                                "close": {"$last": "$price"},
+                                "global": {"$last": "$global"},
+                                "count": {"$sum": 1},
+                            }
+                        },
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "coin": "$_id.coin",
+                                "resolution": {"$literal": resolution},
+                                "timestamp": "$_id.timestamp",
+                                "open": 1,
+                                "high": 1,
+                                "low": 1,
+                                "close": 1,
+                                "global": 1,
+                                "count": 1,
+                            }
+                        },
+                        {
+                            "$merge": {
+                                "into": "profit_rollups",
+                                "on": ["coin", "resolution", "timestamp"],
+                                "whenMatched": "replace",
+                                "whenNotMatched": "insert",
+                            }
+                        },
+                    ]
+                )
+            logging.info(f"Rebuilt profit rollups for {coin or 'all coins'}")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to rebuild profit rollups: {str(e)}")
+            return False
 
     def reset_coin_records(self, coin: str) -> bool:
         """Reset all records related to a specific coin, including user balances, trading state, and profit snapshots."""
         try:
             coin = coin.lower()
+            self.migrate_trading_state()
             
             # Reset user balances for the coin
             result_users = self.users.update_many({}, {"$unset": {f"balances.{coin}": ""}})
+            user_cache.clear()
             logging.info(f"Removed balance for coin {coin} from {result_users.modified_count} user records")
             
             # Reset trading state for the coin
-            unset_fields = {
-                f"user_investments.{coin}": "",
-                f"total_deposits.{coin}": "",
-                f"capital.{coin}": "",
-                f"positions.{coin}": "",
-                f"total_cost.{coin}": "",
-                f"trade_records.{coin}": "",
-                f"user_withdrawals.{coin}": "",
-                f"total_withdrawals.{coin}": "",
-                f"realized_profits.{coin}": "",
-            }
-            result_trading = self.trading_state.update_one(
-                {"_id": "scheduler_state"}, {"$unset": unset_fields}
+            self.coin_states.delete_one({"_id": coin})
+            self.trades.delete_many({"coin": coin})
+            self._persisted_coins.pop(coin, None)
+            self._trade_hashes.pop(coin, None)
+            self._trade_coins.discard(coin)
+            self.trading_state.update_one(
+                {"_id": "scheduler_state"}, {"$inc": {"version": 1}}
             )
             logging.info(f"Reset trading state for coin {coin}")
             
             # Reset profit snapshots for the coin
             result_snapshots = self.db.profit_snapshots.delete_many({"coin": coin})
+            self.db.profit_rollups.delete_many({"coin": coin})
             logging.info(f"Deleted {result_snapshots.deleted_count} profit snapshots for coin {coin}")
             
             return True
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from app.services.data_store import STORAGE_FORMATS
+from app.services.file_manager import TIMESTAMP_PATTERN
+
+
+class _SnapshotEventHandler(FileSystemEventHandler):
+    """Forwards file events for new top coins snapshots to the cache."""
+
+    def __init__(self, cache: "TopCoinsCache"):
+        self.cache = cache
+
+    def on_created(self, event):
+        self.cache.notify_file(event.src_path)
+
+    def on_modified(self, event):
+        self.cache.notify_file(event.src_path)
+
+    def on_moved(self, event):
+        self.cache.notify_file(event.dest_path)
+
+
+class TopCoinsCache:
+    """
+    Process-wide snapshot of the most recent top coins data.
+
+    The snapshot is loaded once and only reloaded after a newer
+    `top_coins_YYYYMMDD_HHMMSS.<ext>` file, in any TimestampedDataStore
+    format, shows up under the data directory (the naming DataCleaner
+    recognizes). Responses are pre-serialized per
+    `limit`, so serving the endpoint is a dictionary lookup with no file I/O.
+    Reloads run on the threadpool, one at a time, so the event loop never
+    waits on the disk.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Optional[List[Dict]]],
+        data_dir: str = "data",
+        base_name: str = "top_coins",
+    ):
+        """
+        Args:
+            loader (Callable): Returns the most recent top coins list, or None.
+            data_dir (str): Directory the scheduler writes snapshots into.
+            base_name (str): Base name of the timestamped snapshot files.
+        """
+        self.loader = loader
+        self.data_dir = os.path.abspath(data_dir)
+        self.file_pattern = re.compile(re.escape(base_name) + TIMESTAMP_PATTERN)
+        self.observer = None
+        # Guards the stamp and flag the watcher thread updates; never held over I/O
+        self._lock = threading.Lock()
+        self._reload_lock = asyncio.Lock()
+        self._latest_stamp = ""
+        self._stale = True
+        # Loaded coins and their serialized responses, swapped in together
+        self._snapshot: Tuple[Optional[List[Dict]], Dict[int, bytes]] = (None, {})
+
+    def start(self):
+        """Start watching the data directory for new snapshots."""
+        if self.observer is not None:
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.observer = Observer()
+        self.observer.schedule(
+            _SnapshotEventHandler(self), path=self.data_dir, recursive=True
+        )
+        self.observer.daemon = True
+        self.observer.start()
+        logging.info(f"Watching {self.data_dir} for new top coins snapshots")
+
+    def stop(self):
+        """Stop the directory watcher."""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def notify_file(self, path: str):
+        """Mark the snapshot stale if `path` is a newer top coins file."""
+        match = self.file_pattern.search(os.path.basename(path))
+        if not match or match.group(2) not in STORAGE_FORMATS:
+            return
+        with self._lock:
+            if match.group(1) >= self._latest_stamp:
+                self._latest_stamp = match.group(1)
+                self._stale = True
+
+    def _newest_stamp(self) -> str:
+        """Return the timestamp of the newest top coins file in the data directory."""
+        newest = ""
+        try:
+            entries = os.scandir(self.data_dir)
+        except FileNotFoundError:
+            return newest
+        with entries:
+            for entry in entries:
+                match = self.file_pattern.search(entry.name)
+                if match and match.group(2) in STORAGE_FORMATS:
+                    newest = max(newest, match.group(1))
+        return newest
+
+    def _reload(self):
+        """Reload the snapshot through the loader and drop cached responses."""
+        # Taken before loading: events for older files no longer mark the
+        # snapshot stale, while a file landing mid-load is at least this new
+        newest = self._newest_stamp()
+        with self._lock:
+            self._stale = False
+            self._latest_stamp = max(self._latest_stamp, newest)
+        try:
+            coins = self.loader()
+        except Exception:
+            with self._lock:
+                self._stale = True
+            raise
+        self._snapshot = (coins, {})
+
+    async def get_response(self, limit: int) -> bytes:
+        """Return the serialized `/coin/top_coins` response body for `limit`."""
+        # Without a watcher there is no invalidation signal, so always reload
+        if self._stale or self.observer is None:
+            async with self._reload_lock:
+                if self._stale or self.observer is None:
+                    await run_in_threadpool(self._reload)
+
+        coins, responses = self._snapshot
+        key = min(limit, len(coins)) if coins else 0
+        body = responses.get(key)
+        if body is None:
+            body = self._serialize(coins, key)
+            responses[key] = body
+        return body
+
+    @staticmethod
+    def _serialize(coins: Optional[List[Dict]], limit: int) -> bytes:
+        """Build the response body in the format the endpoint has always returned."""
+        if coins is None:
+            logging.warning("No top coins data found for history extraction")
+            content = {
+                "status": "Error",
+                "message": "No top coins data found. Please run top coins extraction first.",
+                "data": [],
+            }
+        else:
+            limited_coins = coins[:limit]
+            content = {
+                "status": "Success",
+                "message": f"Retrieved {len(limited_coins)} top coins successfully.",
+                "data": limited_coins,
+            }
+        return json.dumps(
+            content, ensure_ascii=False, separators=(",", ":"), default=str
+        ).encode("utf-8")
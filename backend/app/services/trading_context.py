@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from app.services.async_mongodb_service import AsyncMongoUserService
+from app.services.capital_manager import CapitalManager
+from app.services.investment_snapshots import InvestmentSnapshotCache
+from app.trader_bot.coin_trader import CoinTrader
+
+
+class TradingContext:
+    """
+    Shared CapitalManager and CoinTrader instances for the API process.
+
+    Built once in the app lifespan. Instead of reloading the trading state on
+    every request, `refresh` compares the version stamp on the
+    `scheduler_state` document and only loads the state when it changed.
+    The state is loaded into a new CapitalManager, which then replaces the
+    shared one, so requests still using the previous instance never see it
+    half reloaded. Per-user investment figures are kept in an
+    InvestmentSnapshotCache keyed by that version.
+    """
+
+    def __init__(
+        self,
+        create_capital_manager: Callable[[], CapitalManager],
+        state_service: AsyncMongoUserService,
+        refresh_interval: float = 1.0,
+    ):
+        """
+        Args:
+            create_capital_manager (Callable[[], CapitalManager]): Builds the
+                process-wide capital manager; called again for every reload.
+            state_service (AsyncMongoUserService): Used to read the state version.
+            refresh_interval (float): Minimum seconds between version checks.
+        """
+        self.create_capital_manager = create_capital_manager
+        self.capital_manager = create_capital_manager()
+        self.state_service = state_service
+        self.refresh_interval = refresh_interval
+        self.state_version: Optional[int] = None
+        self.snapshots = InvestmentSnapshotCache()
+        self._traders: Dict[str, CoinTrader] = {}
+        self._last_check = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False):
+        """
+        Reload the trading state if its version stamp moved since the last load.
+
+        Args:
+            force (bool): Check the version now instead of honoring the refresh interval.
+        """
+        if not force and time.monotonic() - self._last_check < self.refresh_interval:
+            return
+
+        async with self._lock:
+            if not force and time.monotonic() - self._last_check < self.refresh_interval:
+                return
+            try:
+                version = await self.state_service.get_trading_state_version()
+                if version != self.state_version:
+                    capital_manager = await run_in_threadpool(
+                        self._load_capital_manager
+                    )
+                    # Swap the reference; requests holding the previous manager
+                    # and its traders finish on the state they started with
+                    self.capital_manager = capital_manager
+                    self._traders = {}
+                    self.state_version = version
+                    # Snapshots of the previous version can never be served again
+                    self.snapshots.clear()
+                    logging.info(f"Trading state reloaded at version {version}")
+            except Exception as e:
+                # Keep serving the last loaded state if Mongo is unreachable
+                logging.error(f"Failed to refresh trading state: {str(e)}")
+            self._last_check = time.monotonic()
+
+    def _load_capital_manager(self) -> CapitalManager:
+        capital_manager = self.create_capital_manager()
+        capital_manager.load_state()
+        return capital_manager
+
+    def invalidate(self):
+        """Force the next `refresh` to check the version stamp."""
+        self._last_check = 0.0
+
+    async def get_investment_snapshot(
+        self, user_id: str, coin: str, price: float
+    ) -> Tuple[Dict, Dict]:
+        """
+        Return a user's investment details and the coin's performance summary
+        valued at `price`.
+
+        Served from the snapshot cache when the state version and price
+        match, otherwise computed once by the CapitalManager of the current
+        version and stored.
+
+        Args:
+            user_id (str): The user's ID.
+            coin (str): Lowercase coin symbol.
+            price (float): The current coin price.
+
+        Returns:
+            Tuple[Dict, Dict]: (user investment details, coin performance summary).
+        """
+        await self.refresh()
+        # Both figures come from this manager, whatever a concurrent reload swaps in
+        version, capital_manager = self.state_version, self.capital_manager
+        cached = self.snapshots.get(user_id, coin, version, price)
+        if cached is not None:
+            return cached
+
+        details = await run_in_threadpool(
+            capital_manager.get_user_investment_details, user_id, coin, price
+        )
+        summary = self.snapshots.get_coin_summary(coin, version, price)
+        if summary is None:
+            summary = await run_in_threadpool(
+                capital_manager.get_coin_performance_summary, coin, price
+            )
+            self.snapshots.set_coin_summary(coin, version, price, summary)
+        self.snapshots.set(user_id, coin, version, price, details, summary)
+        return details, summary
+
+    def get_trader(self, coin: str) -> CoinTrader:
+        """Return the shared CoinTrader for a coin, creating it on first use."""
+        key = coin.lower()
+        trader = self._traders.get(key)
+        if trader is None:
+            trader = CoinTrader(
+                coin=coin, override=True, capital_manager=self.capital_manager
+            )
+            self._traders[key] = trader
+        return trader
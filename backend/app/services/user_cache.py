@@ -0,0 +1,82 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class UserCache:
+    """
+    Bounded TTL/LRU cache of user documents keyed by user ID (the JWT `sub`).
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_size` is reached. Writers in MongoUserService call
+    `invalidate` so a cached user never outlives a change made in this process.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        """
+        Args:
+            max_size (int): Maximum number of users kept in memory.
+            ttl (float): Seconds a cached user stays valid.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        """Return a copy of the cached user, or None on a miss or expiry."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            user = entry[1]
+        # Callers mutate the returned dict (e.g. `_id` -> `id`), so hand out a copy
+        return copy.deepcopy(user)
+
+    def set(self, user_id: str, user: Dict):
+        """Store a copy of the user document."""
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, copy.deepcopy(user))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop a single user from the cache."""
+        with self._lock:
+            if self._entries.pop(str(user_id), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every cached user."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by get_current_user and the Mongo user services
+user_cache = UserCache()
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure, PyMongoError
+from app.services.user_cache import UserCache, user_cache
+
+# Overlap between polls, so writes from hosts with slightly skewed clocks are not missed
+POLL_OVERLAP = timedelta(seconds=2)
+
+
+class UserCacheSync:
+    """
+    Keeps a process's user cache coherent with writes made by other processes.
+
+    Each API worker and the scheduler hold their own `user_cache`, and a
+    write only invalidates the writer's copy. This follows the users
+    collection's change stream and invalidates every changed or deleted
+    user. Change streams need a replica set; on a standalone server it falls
+    back to polling `updated_at` every `poll_interval` seconds. Deletions
+    are then only picked up when the cache TTL expires.
+    """
+
+    def __init__(
+        self, users, cache: UserCache = user_cache, poll_interval: float = 2.0
+    ):
+        """
+        Args:
+            users: The Motor `users` collection.
+            cache (UserCache): The cache to invalidate.
+            poll_interval (float): Seconds between polls when change streams are
+                unavailable.
+        """
+        self.users = users
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self._resume_token = None
+
+    async def run(self):
+        """Follow user changes until cancelled."""
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                # Standalone servers do not support change streams
+                logging.info(f"User change stream unavailable ({e}), polling instead")
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logging.error(f"User change stream failed: {str(e)}")
+                # Changes may have been missed while disconnected
+                self.cache.clear()
+                await asyncio.sleep(self.poll_interval)
+
+    async def _watch(self):
+        async with self.users.watch(
+            resume_after=self._resume_token, full_document=None
+        ) as stream:
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                operation = change.get("operationType")
+                if operation in ("invalidate", "drop", "dropDatabase", "rename"):
+                    self.cache.clear()
+                    self._resume_token = None
+                    return
+                document_key = change.get("documentKey") or {}
+                if "_id" in document_key:
+                    self.cache.invalidate(str(document_key["_id"]))
+
+    async def _poll(self):
+        since = datetime.utcnow()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            started = datetime.utcnow()
+            try:
+                cursor = self.users.find(
+                    {"updated_at": {"$gte": since - POLL_OVERLAP}}, {"_id": 1}
+                )
+                async for user in cursor:
+                    self.cache.invalidate(str(user["_id"]))
+                since = started
+            except PyMongoError as e:
+                logging.error(f"Failed to poll user changes: {str(e)}")
@@ -1,6 +1,6 @@
 from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -49,6 +49,17 @@ class BalanceResponse(BaseModel):
     balance: float  # Updated balance after the operation
 
 
+class BulkBalanceItem(BaseModel):
+    user_id: str
+    coin: str
+    amount: float = Field(..., gt=0)
+    operation: Literal["deposit", "withdraw"] = "deposit"
+
+
+class BulkBalanceRequest(BaseModel):
+    operations: List[BulkBalanceItem] = Field(..., min_length=1, max_length=50000)
+
+
 class WalletOperation(BaseModel):
     coin: str
     wallet_address: str
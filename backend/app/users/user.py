@@ -1,29 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from typing import Optional, Dict
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+from bson.errors import InvalidId
 from config import config
 from typing import List
 
-from app.services.capital_manager import CapitalManager
+from app.dependencies import get_trading_context
+from app.services.trading_context import TradingContext
+from app.services.async_mongodb_service import AsyncMongoUserService
+from app.services.google_auth import google_token_verifier
+from app.services.jwt_tokens import InvalidTokenError, jwt_codec
 from app.services.mongodb_service import MongoUserService, UserRole, SocialProvider
+from app.services.user_cache import user_cache
 from app.users.models import (
     GoogleTokenRequest,
     Token,
     UserResponse,
     BalanceOperation,
     BalanceResponse,
+    BulkBalanceRequest,
 )
 from app.services.coin_stats import CoinStatsService
 from app.users.models import WalletOperation
 
 # Initialize services
-capital_manager = CapitalManager(initial_capital=1000.0)
 stats_service = CoinStatsService()
-user_service = MongoUserService()
+user_service = AsyncMongoUserService()
+# Balance changes run on the synchronous service, in the threadpool
+balance_service = MongoUserService()
 auth_router = APIRouter()
 
 # OAuth2 configuration
@@ -42,7 +50,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=15)
 
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(
+    encoded_jwt = jwt_codec.encode(
         to_encode, config.jwt_secret_key, algorithm=config.jwt_algorithm
     )
 
@@ -62,29 +70,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
 
     try:
-        payload = jwt.decode(
-            token, config.jwt_secret_key, algorithms=[config.jwt_algorithm]
+        # Tokens verified before are served from the codec's cache
+        payload = jwt_codec.decode(
+            token, config.jwt_secret_key, algorithm=config.jwt_algorithm
         )
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
 
-        user = user_service.get_user_by_id(user_id)
-        if not user:
-            raise credentials_exception
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await user_service.get_user_by_id(user_id)
+            if not user:
+                raise credentials_exception
+            user_cache.set(user_id, user)
 
         user["id"] = str(user.pop("_id", ""))
         return user
-    except JWTError:
+    except InvalidTokenError:
         raise credentials_exception
 
 
 async def verify_google_token(token: str) -> Dict:
     """Verify Google OAuth token and return user information"""
     try:
-
-        idinfo = id_token.verify_oauth2_token(
-            token, requests.Request(), config.google_client_id
+        # Cert lookup may hit the network and signature checks are CPU-bound
+        idinfo = await run_in_threadpool(
+            google_token_verifier.verify, token, config.google_client_id
         )
 
         if idinfo["iss"] not in ["accounts.google.com", "https://accounts.google.com"]:
@@ -112,14 +124,14 @@ async def google_login(token_request: GoogleTokenRequest):
         print("Google token verified.")
 
         # Check if user exists
-        user = user_service.get_user_by_social_id(
+        user = await user_service.get_user_by_social_id(
             user_info["social_id"], SocialProvider.GOOGLE
         )
 
         if not user:
             # Create new user
             print("User not found, creating a new user...")
-            user = user_service.create_user(
+            user = await user_service.create_user(
                 email=user_info["email"],
                 social_id=user_info["social_id"],
                 provider=SocialProvider.GOOGLE,
@@ -129,7 +141,7 @@ async def google_login(token_request: GoogleTokenRequest):
         else:
             # Update last login
             print("Updating last login for existing user...")
-            user = user_service.social_login(
+            user = await user_service.social_login(
                 user_info["social_id"], SocialProvider.GOOGLE
             )
 
@@ -206,7 +218,7 @@ async def update_user_role(
         )
 
     # Prevent changing the super admin's own role
-    target_user = user_service.get_user_by_id(user_id)
+    target_user = await user_service.get_user_by_id(user_id)
     if not target_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -219,7 +231,7 @@ async def update_user_role(
         )
 
     # Update role
-    success = user_service.update_user_role(user_id, role)
+    success = await user_service.update_user_role(user_id, role)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -229,9 +241,33 @@ async def update_user_role(
     return {"message": "Role updated successfully"}
 
 
+def _listed_user_response(user: Dict) -> UserResponse:
+    """Build the UserResponse used in user listings."""
+    role = "super" if user["email"] == config.admin_email else user.get("role", "User")
+    return UserResponse(
+        id=str(user["_id"]),
+        email=user["email"],
+        name=user["name"],
+        profile_picture=user.get("profile_picture"),
+        role=role,
+        created_at=user.get("created_at"),
+    )
+
+
 @auth_router.get("/users", response_model=List[UserResponse])
-async def list_all_users(current_user: Dict = Depends(get_current_user)):
-    """Retrieve a list of all users (Super Admin only)"""
+async def list_all_users(
+    response: Response,
+    cursor: Optional[str] = Query(default=None, description="Last X-Next-Cursor"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    current_user: Dict = Depends(get_current_user),
+):
+    """
+    Retrieve users (Super Admin only).
+
+    `json` returns one page ordered by ID, with the cursor for the next page in
+    the `X-Next-Cursor` header. `ndjson` streams every user, one per line, for exports.
+    """
 
     # Ensure only the super admin can access this route
     if current_user["email"] != config.admin_email:
@@ -240,34 +276,42 @@ async def list_all_users(current_user: Dict = Depends(get_current_user)):
             detail="Only the super admin can list all users",
         )
 
-    # Fetch all users
-    users = user_service.get_all_users()
+    if format == "ndjson":
 
-    # Convert ObjectId to string and include role
-    user_list = []
-    for user in users:
-        user["id"] = str(user.pop("_id", ""))
-        role = (
-            "super" if user["email"] == config.admin_email else user.get("role", "User")
-        )
+        async def export_users():
+            async for user in user_service.iter_users():
+                yield _listed_user_response(user).model_dump_json(by_alias=True) + "\n"
 
-        user_list.append(
-            UserResponse(
-                id=user["id"],
-                email=user["email"],
-                name=user["name"],
-                profile_picture=user.get("profile_picture"),
-                role=role,
-                created_at=user.get("created_at"),
-            )
+        return StreamingResponse(export_users(), media_type="application/x-ndjson")
+
+    try:
+        users = await user_service.list_users_after(cursor, limit)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1]["_id"])
+
+    return [_listed_user_response(user) for user in users]
+
+
+@auth_router.get("/cache/stats")
+async def get_user_cache_stats(current_user: Dict = Depends(get_current_user)):
+    """Return authenticated-user cache hit/miss counters (Super Admin only)"""
+    if current_user["email"] != config.admin_email:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the super admin can view cache statistics",
         )
 
-    return user_list
+    return user_cache.stats()
 
 
 @auth_router.post("/balance/deposit", response_model=BalanceResponse)
 async def deposit_balance(
-    operation: BalanceOperation, current_user: Dict = Depends(get_current_user)
+    operation: BalanceOperation,
+    current_user: Dict = Depends(get_current_user),
+    context: TradingContext = Depends(get_trading_context),
 ):
     """Deposit an amount of a specific coin into the user's balance and update global trading capital."""
     user_id = current_user["id"]
@@ -278,18 +322,23 @@ async def deposit_balance(
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
 
-    # Perform deposit
+    # Perform deposit: user balance and coin ledger in one transaction
     try:
-        capital_manager.deposit(user_id, coin, amount)
-        new_balance = capital_manager.get_user_investment(user_id, coin)
-        return BalanceResponse(coin=coin.upper(), balance=new_balance)
+        result = await run_in_threadpool(
+            balance_service.apply_balance_change, user_id, coin, amount
+        )
+        # The version bump makes the shared CapitalManager reload on next use
+        context.invalidate()
+        return BalanceResponse(coin=coin.upper(), balance=result["investment"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Deposit failed: {str(e)}")
 
 
 @auth_router.post("/balance/withdraw", response_model=BalanceResponse)
 async def withdraw_balance(
-    operation: BalanceOperation, current_user: Dict = Depends(get_current_user)
+    operation: BalanceOperation,
+    current_user: Dict = Depends(get_current_user),
+    context: TradingContext = Depends(get_trading_context),
 ):
     """Withdraw an amount of a specific coin from the user's balance."""
     user_id = current_user["id"]
@@ -300,25 +349,105 @@ async def withdraw_balance(
         raise HTTPException(status_code=400, detail="Amount must be positive")
 
     try:
-        capital_manager.withdraw(user_id, coin, amount)
-        new_balance = capital_manager.get_user_investment(user_id, coin)
-        return BalanceResponse(coin=coin.upper(), balance=new_balance)
+        result = await run_in_threadpool(
+            balance_service.apply_balance_change, user_id, coin, -amount
+        )
+        context.invalidate()
+        return BalanceResponse(coin=coin.upper(), balance=result["investment"])
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Withdrawal failed: {str(e)}")
 
 
+@auth_router.post("/balance/bulk")
+async def bulk_balance_operations(
+    request: BulkBalanceRequest,
+    current_user: Dict = Depends(get_current_user),
+    context: TradingContext = Depends(get_trading_context),
+):
+    """
+    Apply a batch of deposits/withdrawals for any users (Super Admin only).
+
+    Items are validated in order and applied with unordered bulk writes and a
+    single trading state update; each item reports `applied` or `failed`.
+    """
+    if current_user["email"] != config.admin_email:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the super admin can apply bulk balance operations",
+        )
+
+    operations = [
+        {
+            "user_id": item.user_id,
+            "coin": item.coin.lower(),
+            "amount": item.amount if item.operation == "deposit" else -item.amount,
+        }
+        for item in request.operations
+    ]
+    try:
+        outcome = await run_in_threadpool(
+            balance_service.bulk_apply_balance_changes, operations
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Bulk balance operation failed: {str(e)}"
+        )
+    context.invalidate()
+
+    results = outcome["results"]
+    for result, item in zip(results, request.operations):
+        result["coin"] = result["coin"].upper()
+        result["amount"] = item.amount
+        result["operation"] = item.operation
+    applied = sum(1 for result in results if result["status"] == "applied")
+    return {
+        "status": "success",
+        "message": f"Applied {applied} of {len(results)} balance operations",
+        "data": {
+            "applied": applied,
+            "failed": len(results) - applied,
+            "unmatched": outcome["unmatched"],
+            "results": results,
+        },
+    }
+
+
+@auth_router.get("/balance/export")
+async def export_balances(current_user: Dict = Depends(get_current_user)):
+    """Stream every user's balances as NDJSON (Super Admin only)."""
+    if current_user["email"] != config.admin_email:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the super admin can export balances",
+        )
+
+    async def export():
+        projection = {"email": 1, "balances": 1}
+        async for user in user_service.iter_users(projection=projection):
+            line = {
+                "user_id": str(user["_id"]),
+                "email": user.get("email"),
+                "balances": user.get("balances") or {},
+            }
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(export(), media_type="application/x-ndjson")
+
+
 @auth_router.get("/investment/{coin}")
 async def get_investment_details(
-    coin: str, current_user: dict = Depends(get_current_user)
+    coin: str,
+    current_user: dict = Depends(get_current_user),
+    context: TradingContext = Depends(get_trading_context),
 ):
     """Display comprehensive user investment details and coin performance for a given coin."""
     user_id = current_user["id"]
     coin = coin.lower()  # Ensure consistency with CapitalManager
 
     # Fetch current coin stats
-    stats = stats_service.get_latest_stats(coin)
+    stats = await run_in_threadpool(stats_service.get_latest_stats, coin)
     if stats is None or "price" not in stats:
         raise HTTPException(
             status_code=404, detail="Coin not found or no price data available"
@@ -326,16 +455,15 @@ async def get_investment_details(
 
     current_price = stats["price"]
 
-    # Get enhanced user investment details
-    details = capital_manager.get_user_investment_details(user_id, coin, current_price)
+    # Materialized per state version and price
+    details, coin_summary = await context.get_investment_snapshot(
+        user_id, coin, current_price
+    )
 
     # FIXED: Use the correct key "net_investment" instead of "investment"
     if details["net_investment"] == 0.0:
         return {"message": "No investment found for this coin"}
 
-    # Get overall coin performance summary
-    coin_summary = capital_manager.get_coin_performance_summary(coin, current_price)
-
     # Enhanced coin performance metrics
     coin_performance = {
         # Market data
@@ -393,6 +521,28 @@ async def get_investment_details(
     }
 
 
+@auth_router.get("/investment/{coin}/trades")
+async def get_investment_trades(
+    coin: str,
+    days: Optional[int] = Query(default=None, gt=0),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user),
+):
+    """Retrieve a page of the authenticated user's ledger entries for a coin, newest first."""
+    start_date = datetime.utcnow() - timedelta(days=days) if days else None
+    try:
+        return await user_service.get_trades(
+            coin.lower(),
+            start_date=start_date,
+            user_id=current_user["id"],
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @auth_router.post("/wallet/add")
 async def add_wallet_address(
     operation: WalletOperation, current_user: dict = Depends(get_current_user)
@@ -404,7 +554,7 @@ async def add_wallet_address(
     coin = operation.coin.upper()
     wallet_address = operation.wallet_address
 
-    success = user_service.add_wallet(user_id, coin, wallet_address)
+    success = await user_service.add_wallet(user_id, coin, wallet_address)
     if not success:
         raise HTTPException(
             status_code=500, detail="Failed to add or update wallet address"
@@ -421,7 +571,7 @@ async def get_wallet_addresses(
     Retrieve all wallet addresses for the authenticated user.
     """
     user_id = current_user["id"]
-    wallet = user_service.get_wallet(user_id, coin)
+    wallet = await user_service.get_wallet(user_id, coin)
 
     if not wallet:
         raise HTTPException(status_code=404, detail="No wallet found for this user")
@@ -438,6 +588,9 @@ from typing import List, Dict, Any
 async def get_global_profit_trend(
     coin: str,
     days: int = Query(..., gt=0),  # Require days > 0
+    points: Optional[int] = Query(default=None, gt=0, le=5000),
+    interval: Optional[str] = Query(default=None, description="e.g. 15m, 1h, 1d"),
+    mode: str = Query(default="last", pattern="^(last|ohlc)$"),
     current_user: dict = Depends(get_current_user),
 ) -> List[Dict[str, Any]]:
     """
@@ -447,13 +600,21 @@ async def get_global_profit_trend(
     Args:
         coin: The coin symbol (e.g., 'btc', 'eth') or full name (e.g., 'bitcoin', 'ethereum')
         days: Number of days to look back (e.g., 30 for 1 month, 90 for 3 months)
+        points: Downsample server-side to at most this many points
+        interval: Downsample server-side to fixed buckets (e.g. '1h', '1d')
+        mode: 'last' keeps the last snapshot per bucket, 'ohlc' adds price OHLC
     """
     # Calculate date range
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
 
     # Query the trend data
-    trend_data = user_service.get_profit_trend(coin.lower(), start_date, end_date)
+    try:
+        trend_data = await user_service.get_profit_trend(
+            coin.lower(), start_date, end_date, points, interval, mode
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
 
     # Check if no data was found
     if not trend_data:
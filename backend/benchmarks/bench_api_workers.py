@@ -0,0 +1,68 @@
+"""
+API throughput versus number of uvicorn workers.
+
+Starts the API once per worker count (the multi-worker mode `run.py --workers`
+uses), drives `--path` with `--concurrency` keep-alive clients and reports
+requests/sec and latency. Needs the app's MongoDB and config, like run.py.
+Without `--token` the default path is the unauthenticated /coin/top_coins;
+with a token, /auth/users/me exercises the cross-worker user cache. With
+`--stub-mongo` the same app is served with MongoDB stubbed at the service
+layer (see benchmarks/stubbed_api.py), and /auth/users/me is driven with a
+token minted for the stub's user.
+
+    cd backend && python -m benchmarks.bench_api_workers --workers 1 2 4
+    cd backend && python -m benchmarks.bench_api_workers --stub-mongo
+"""
+
+import argparse
+import os
+from datetime import timedelta
+from benchmarks.load import run_load, serve
+
+STUB_USER_ID = "650000000000000000000001"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default=None)
+    parser.add_argument("--token", default=None, help="Bearer token for the requests")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--app", default="app.main:app")
+    parser.add_argument(
+        "--stub-mongo",
+        action="store_true",
+        help="Serve the app with MongoDB stubbed at the service layer",
+    )
+    args = parser.parse_args()
+
+    if args.stub_mongo:
+        from app.users.user import create_access_token
+
+        # Read by the stub in every worker, which seeds this user
+        os.environ.setdefault("LOAD_TEST_USER_ID", STUB_USER_ID)
+        args.app = "benchmarks.stubbed_api:app"
+        args.token = args.token or create_access_token(
+            {"sub": os.environ["LOAD_TEST_USER_ID"]}, timedelta(hours=1)
+        ).access_token
+
+    path = args.path or ("/auth/users/me" if args.token else "/coin/top_coins")
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+
+    print(f"GET {path}, {args.concurrency} concurrent clients, {args.duration}s each")
+    print(f"{'workers':>8} {'req/s':>10} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    baseline = None
+    for workers in args.workers:
+        with serve(args.app, workers=workers) as url:
+            result = run_load(url + path, args.concurrency, args.duration, headers)
+        baseline = baseline or result["rps"]
+        print(
+            f"{workers:>8} {result['rps']:10.0f} {result['rps'] / baseline:7.2f}x "
+            f"{result['p50_ms']:8.1f} {result['p99_ms']:8.1f}"
+            + (f"  ({result['errors']} errors)" if result["errors"] else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+DataCleaner full scan versus incremental cleanup over 100k timestamped files.
+
+Builds a scratch data directory with `--files` snapshots spread over
+`--dirs` directories (one file per group, the steady state after a cleanup),
+then times one cleanup after a single group gained a new snapshot:
+
+- full: `clean_timestamped_files(incremental=False)`, walking the whole tree
+- incremental (cold): the first incremental run, loading the persisted index
+  and reconciling it with one listing of the tree
+- incremental (warm): a later run with the index in memory, as under the watcher
+
+    cd backend && python -m benchmarks.bench_data_cleaner --files 100000
+"""
+
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from app.services.file_manager import DataCleaner
+
+
+def populate(data_dir: Path, files: int, dirs: int):
+    for i in range(files):
+        directory = data_dir / f"dir_{i % dirs:04d}"
+        directory.mkdir(exist_ok=True)
+        (directory / f"dataset_{i:06d}_20250101_000000.json").touch()
+
+
+def add_snapshot(data_dir: Path, run: int) -> Path:
+    path = data_dir / "dir_0000" / f"dataset_000000_20250102_{run:06d}.json"
+    path.touch()
+    return path
+
+
+def timed(action) -> float:
+    start = time.perf_counter()
+    action()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--dirs", type=int, default=100)
+    args = parser.parse_args()
+    # Per-group "no duplicates" lines would dominate the full run
+    logging.disable(logging.INFO)
+
+    data_dir = Path(tempfile.mkdtemp(prefix="bench_data_cleaner_"))
+    try:
+        populate(data_dir, args.files, args.dirs)
+        DataCleaner(str(data_dir)).clean_timestamped_files(incremental=False).result()
+
+        add_snapshot(data_dir, 1)
+        full_ms = timed(
+            lambda: DataCleaner(str(data_dir))
+            .clean_timestamped_files(incremental=False)
+            .result()
+        )
+
+        cleaner = DataCleaner(str(data_dir))
+        cleaner.record_file(add_snapshot(data_dir, 2))
+        cold_ms = timed(
+            lambda: cleaner.clean_timestamped_files(incremental=True).result()
+        )
+
+        cleaner.record_file(add_snapshot(data_dir, 3))
+        warm_ms = timed(
+            lambda: cleaner.clean_timestamped_files(incremental=True).result()
+        )
+
+        print(f"files: {args.files}, directories: {args.dirs}")
+        print(f"full scan:            {full_ms:10.1f} ms")
+        print(f"incremental (cold):   {cold_ms:10.1f} ms")
+        print(f"incremental (warm):   {warm_ms:10.1f} ms")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Access token verification throughput, with and without the verified-token cache.
+
+Decodes `--tokens` distinct tokens round-robin for `--seconds` per case and
+reports tokens/sec for each JWT backend available (python-jose, and PyJWT
+when installed), cold (cache disabled) and warm (every token cached).
+
+    cd backend && python -m benchmarks.bench_jwt_decode
+"""
+
+import argparse
+import time
+from app.services.jwt_tokens import JWTCodec
+
+SECRET = "benchmark-secret"
+ALGORITHM = "HS256"
+
+
+def throughput(codec: JWTCodec, tokens, seconds: float) -> float:
+    decoded = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for token in tokens:
+            codec.decode(token, SECRET, ALGORITHM)
+        decoded += len(tokens)
+    return decoded / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    expires = int(time.time()) + 3600
+    print(f"{'backend':>8} {'cache':>6} {'tokens/sec':>12}")
+    for backend in ("jose", "pyjwt"):
+        codec = JWTCodec(backend=backend, cache_size=0)
+        if codec.backend != backend:
+            continue
+        claims = [
+            {"sub": f"user{i}@example.com", "exp": expires} for i in range(args.tokens)
+        ]
+        tokens = [codec.encode(c, SECRET, ALGORITHM) for c in claims]
+        for cache_size in (0, args.tokens):
+            codec = JWTCodec(backend=backend, cache_size=cache_size)
+            rate = throughput(codec, tokens, args.seconds)
+            label = "warm" if cache_size else "off"
+            print(f"{backend:>8} {label:>6} {rate:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
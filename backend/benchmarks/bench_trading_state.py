@@ -0,0 +1,113 @@
+"""
+Trading state save latency versus number of stored trade records.
+
+Compares the legacy layout (one `scheduler_state` document `$set` in full on
+every save) with the per-coin layout of MongoUserService, where a save after
+one trade writes one coin's changed fields and one new trade record.
+
+Runs against the MongoDB configured for the app, in a scratch database that
+is dropped afterwards:
+
+    cd backend && python -m benchmarks.bench_trading_state --sizes 1000 10000 50000
+"""
+
+import argparse
+import statistics
+import time
+from pymongo.errors import DocumentTooLarge
+from app.services.mongodb_service import MongoUserService
+
+COINS = ("btc", "eth", "sol", "xrp", "ada")
+
+
+def scratch_service(db_name: str) -> MongoUserService:
+    """A MongoUserService whose collections live in `db_name`."""
+    service = MongoUserService()
+    service.db = service.client[db_name]
+    service.trading_state = service.db.trading_state
+    service.coin_states = service.db.coin_trading_state
+    service.trades = service.db.trades
+    service.trades.create_index([("coin", 1), ("seq", 1)], unique=True)
+    return service
+
+
+def build_state(records: int) -> dict:
+    per_coin = records // len(COINS)
+    return {
+        "user_investments": {coin: {"u1": 500.0, "u2": 500.0} for coin in COINS},
+        "total_deposits": {coin: 1000.0 for coin in COINS},
+        "capital": {coin: 1000.0 for coin in COINS},
+        "positions": {coin: {"quantity": 0.0} for coin in COINS},
+        "total_cost": {coin: 0.0 for coin in COINS},
+        "trade_records": {
+            coin: [
+                {"timestamp": 1700000000 + i, "side": "buy", "price": 100.0, "qty": 0.1}
+                for i in range(per_coin)
+            ]
+            for coin in COINS
+        },
+    }
+
+
+def one_trade(state: dict, i: int):
+    """Apply one trade on btc in memory, as a trading cycle would."""
+    state["capital"]["btc"] -= 10.0
+    state["positions"]["btc"]["quantity"] += 0.1
+    state["trade_records"]["btc"].append(
+        {"timestamp": 1800000000 + i, "side": "buy", "price": 100.0, "qty": 0.1}
+    )
+
+
+def time_saves(save, state: dict, repeat: int) -> list:
+    timings = []
+    for i in range(repeat):
+        one_trade(state, i)
+        start = time.perf_counter()
+        save(state)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", default="bench_trading_state")
+    args = parser.parse_args()
+
+    service = scratch_service(args.db)
+    print(f"{'records':>10} {'legacy p50 ms':>14} {'per-coin p50 ms':>16}")
+    try:
+        for size in args.sizes:
+            service.client.drop_database(args.db)
+            service = scratch_service(args.db)
+
+            legacy_state = build_state(size)
+            legacy = service.db.legacy_state
+
+            def save_legacy(state):
+                legacy.update_one(
+                    {"_id": "scheduler_state"}, {"$set": state}, upsert=True
+                )
+
+            try:
+                save_legacy(legacy_state)
+                legacy_ms = statistics.median(
+                    time_saves(save_legacy, legacy_state, args.repeat)
+                )
+                legacy_text = f"{legacy_ms:14.2f}"
+            except DocumentTooLarge:
+                legacy_text = f"{'over 16MB':>14}"
+
+            service.set_trading_state(build_state(size))
+            state = service.get_trading_state()
+            per_coin_ms = statistics.median(
+                time_saves(service.set_trading_state, state, args.repeat)
+            )
+            print(f"{size:>10} {legacy_text} {per_coin_ms:16.2f}")
+    finally:
+        service.client.drop_database(args.db)
+
+
+if __name__ == "__main__":
+    main()
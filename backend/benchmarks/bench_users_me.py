@@ -0,0 +1,81 @@
+"""
+p99 latency of /auth/users/me under concurrent traffic, before and after.
+
+Serves the API from a git worktree of `--before` (a branch, tag or commit,
+e.g. the one before the routes moved to the Motor-backed
+AsyncMongoUserService, when every route blocked the event loop on pymongo)
+and from the working tree, each with one worker, and drives /auth/users/me
+with `--concurrency` clients. The deployment's config.py and .env are copied
+into the worktree. Needs the app's MongoDB and an existing user:
+
+    cd backend && python -m benchmarks.bench_users_me \
+        --before main --user-id <ObjectId>
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from benchmarks.load import BACKEND_DIR, run_load, serve
+
+
+@contextmanager
+def worktree(ref: str):
+    """Check `ref` out into a temporary worktree and yield its backend directory."""
+    path = tempfile.mkdtemp(prefix="bench_users_me_")
+    subprocess.run(
+        ["git", "worktree", "add", "--detach", path, ref], cwd=BACKEND_DIR, check=True
+    )
+    try:
+        backend = os.path.join(path, "backend")
+        for name in ("config.py", ".env"):
+            if os.path.exists(os.path.join(BACKEND_DIR, name)):
+                shutil.copy(os.path.join(BACKEND_DIR, name), backend)
+        yield backend
+    finally:
+        subprocess.run(
+            ["git", "worktree", "remove", "--force", path], cwd=BACKEND_DIR, check=False
+        )
+
+
+def access_token(user_id: str) -> str:
+    from config import config
+    from app.services.jwt_tokens import jwt_codec
+
+    claims = {"sub": user_id, "exp": int(time.time()) + 3600}
+    return jwt_codec.encode(claims, config.jwt_secret_key, config.jwt_algorithm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument(
+        "--before", required=True, help="Git ref to compare the working tree to"
+    )
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {access_token(args.user_id)}"}
+    results = {}
+    with worktree(args.before) as before_dir:
+        for label, cwd in (("before", before_dir), ("after", BACKEND_DIR)):
+            with serve(workers=1, cwd=cwd) as url:
+                results[label] = run_load(
+                    url + "/auth/users/me", args.concurrency, args.duration, headers
+                )
+
+    print(f"GET /auth/users/me, {args.concurrency} concurrent clients, 1 worker")
+    print(f"{'':>7} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, result in results.items():
+        print(
+            f"{label:>7} {result['rps']:10.0f} {result['p50_ms']:8.1f} "
+            f"{result['p99_ms']:8.1f} {result['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
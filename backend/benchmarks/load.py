@@ -0,0 +1,160 @@
+"""
+HTTP load helpers shared by the API benchmarks.
+
+`serve` starts uvicorn for an app in a subprocess and waits until it answers;
+`run_load` drives a URL from several client processes, each with a pool of
+threads on a keep-alive session, so the client is not the bottleneck when
+the server runs several workers.
+"""
+
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(
+    app: str = "app.main:app",
+    workers: int = 1,
+    port: Optional[int] = None,
+    cwd: str = BACKEND_DIR,
+    ready_path: str = "/metrics",
+    timeout: float = 60.0,
+):
+    """
+    Run `uvicorn <app> --workers <workers>` from `cwd` and yield its base URL.
+
+    Args:
+        app (str): The ASGI app, as uvicorn takes it.
+        workers (int): Number of uvicorn worker processes.
+        port (Optional[int]): Port to bind; a free one by default.
+        cwd (str): Directory the app is imported from, e.g. a worktree of an
+            older commit for a before/after comparison.
+        ready_path (str): Polled until it answers before yielding.
+        timeout (float): Seconds to wait for the server to come up.
+    """
+    port = port or free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "uvicorn", app, "--port", str(port)]
+    command += ["--workers", str(workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=cwd)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                requests.get(url + ready_path, timeout=1)
+                break
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Server did not answer on {url} in {timeout}s")
+                time.sleep(0.2)
+        # Let every worker finish its startup before measuring
+        time.sleep(min(5.0, workers * 0.5))
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _client(url: str, headers: Dict, threads: int, duration: float, results):
+    """One client process: `threads` keep-alive loops for `duration` seconds."""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop():
+        session = requests.Session()
+        local, failed = [], 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = session.get(url, headers=headers, timeout=30).status_code < 400
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - start)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=loop) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((latencies, errors[0]))
+
+
+def run_load(
+    url: str,
+    concurrency: int = 64,
+    duration: float = 10.0,
+    headers: Optional[Dict] = None,
+    clients: Optional[int] = None,
+) -> Dict:
+    """
+    Send GET requests to `url` from `concurrency` concurrent loops for `duration`.
+
+    Returns:
+        Dict: `requests`, `errors`, `rps`, and `p50_ms`/`p99_ms` latencies.
+    """
+    clients = clients or min(concurrency, os.cpu_count() or 1)
+    results = multiprocessing.Queue()
+    per_client = [concurrency // clients] * clients
+    for i in range(concurrency % clients):
+        per_client[i] += 1
+    processes = [
+        multiprocessing.Process(
+            target=_client, args=(url, headers or {}, threads, duration, results)
+        )
+        for threads in per_client
+        if threads
+    ]
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - start
+
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        p50, p99 = cuts[49] * 1000, cuts[98] * 1000
+    else:
+        p50 = p99 = float("nan")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p99_ms": p99,
+    }
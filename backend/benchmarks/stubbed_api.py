@@ -0,0 +1,78 @@
+"""
+The real API, `app.main:app`, with MongoDB stubbed at the service layer.
+
+Routes, middleware, JWT checks, the user cache and the TradingContext are
+the ones run.py serves; only the Mongo services answer from memory. The
+synchronous MongoUserService, which CapitalManager and the balance routes
+use, gets a mongomock client. The routes' AsyncMongoUserService reads the
+same in-memory users, and its users collection reports that change streams
+are unavailable, so UserCacheSync polls and finds nothing. Every worker
+process seeds the user LOAD_TEST_USER_ID names (a fixed ID by default),
+so a token minted for it with `create_access_token` is valid on all of them.
+
+    uvicorn benchmarks.stubbed_api:app --workers 2
+"""
+
+import os
+from datetime import datetime
+import mongomock
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from app.services import mongo_client, mongodb_service
+
+LOAD_TEST_USER_ID = os.getenv("LOAD_TEST_USER_ID", "650000000000000000000001")
+
+client = mongomock.MongoClient()
+# Patched before the app builds its services
+mongo_client.get_mongo_client = lambda: client
+mongodb_service.get_mongo_client = lambda: client
+client.user_management.users.insert_one(
+    {
+        "_id": ObjectId(LOAD_TEST_USER_ID),
+        "email": "load@example.com",
+        "name": "Load Test",
+        "role": "user",
+        "balances": {"btc": 100.0},
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+)
+
+from app.main import app  # noqa: E402,F401
+from app.users.user import balance_service, user_service  # noqa: E402
+
+
+class _NoDocuments:
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+class _StubUsers:
+    """Stands in for the Motor users collection UserCacheSync follows."""
+
+    def watch(self, **kwargs):
+        raise OperationFailure("Change streams are not available on the stub")
+
+    def find(self, *args, **kwargs):
+        return _NoDocuments()
+
+
+async def _ensure_indexes():
+    pass
+
+
+async def _get_user_by_id(user_id: str):
+    return balance_service.users.find_one({"_id": ObjectId(user_id)})
+
+
+async def _get_trading_state_version():
+    return balance_service.get_trading_state_version()
+
+
+user_service.ensure_indexes = _ensure_indexes
+user_service.get_user_by_id = _get_user_by_id
+user_service.get_trading_state_version = _get_trading_state_version
+user_service.users = _StubUsers()
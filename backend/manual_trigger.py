@@ -1,13 +1,49 @@
+import os
+import sys
 from datetime import datetime, timezone
-import time
+from app.services.coin_pipeline import ParallelCoinRunner
 from app.services.coin_scheduler import CoinScheduler
+from app.services.execution_log_store import ExecutionLogStore
+from app.services.file_manager import DataCleaner
+from app.services.job_events import JobCompletionEvents, JobFailedError
+from app.services.mongodb_service import MongoUserService
+
+# How long to wait for each chain before giving up
+JOB_TIMEOUT = float(os.getenv("MANUAL_TRIGGER_TIMEOUT", 3600))
 
 # Set trading configuration with trading enabled by default
 trading_config = {"enabled": True, "initial_capital": 1000.0, "override": False}
 
 # Initialize and start the CoinScheduler
+MongoUserService().ensure_indexes()
 scheduler = CoinScheduler(trading_config=trading_config)
+store = ExecutionLogStore()
+trading_runner = ParallelCoinRunner.from_env(store=store)
+cleaner = DataCleaner()
+cleaner.start_watching()
 scheduler.start()
+if trading_runner is not None:
+    trading_runner.attach(scheduler.scheduler)
+cleaner.clean_after_jobs(scheduler.scheduler)
+
+# Get notified as soon as each job in a chain finishes
+job_events = JobCompletionEvents()
+job_events.attach(scheduler, store=store)
+
+
+def wait_for(job_name: str, since: datetime):
+    """Wait for `job_name` to complete; shut down and exit if it fails or stalls."""
+    try:
+        if job_events.wait_for(job_name, since=since, timeout=JOB_TIMEOUT):
+            return
+        print(f"Timed out after {JOB_TIMEOUT:.0f}s waiting for {job_name}.")
+    except JobFailedError as e:
+        print(f"{e}; {job_name} will not run.")
+    scheduler.shutdown()
+    cleaner.stop_watching()
+    cleaner.close()
+    sys.exit(1)
+
 
 # Trigger the top_coins chain
 start_time1 = datetime.now(timezone.utc)
@@ -15,14 +51,7 @@ scheduler.trigger_top_coins_now()
 print("Triggered top_coins. Waiting for data_cleanup to complete...")
 
 # Wait for the data_cleanup job (end of top_coins chain) to complete
-while True:
-    log_data = scheduler.load_execution_log()
-    last_run_str = log_data.get("data_cleanup", {}).get("last_execution")
-    if last_run_str:
-        last_run_time = datetime.fromisoformat(last_run_str)
-        if last_run_time > start_time1:
-            break
-    time.sleep(10)  # Check every 10 seconds
+wait_for("data_cleanup", start_time1)
 
 print("data_cleanup completed.")
 
@@ -33,16 +62,11 @@ final_job = "trading_bot" if trading_config["enabled"] else "coin_prices"
 print(f"Triggered news_sentiment. Waiting for {final_job} to complete...")
 
 # Wait for the final job in the news_sentiment chain to complete
-while True:
-    log_data = scheduler.load_execution_log()
-    last_run_str = log_data.get(final_job, {}).get("last_execution")
-    if last_run_str:
-        last_run_time = datetime.fromisoformat(last_run_str)
-        if last_run_time > start_time2:
-            break
-    time.sleep(10)  # Check every 10 seconds
+wait_for(final_job, start_time2)
 
 print(f"{final_job} completed.")
 
 # Shut down the scheduler
 scheduler.shutdown()
+cleaner.stop_watching()
+cleaner.close()
@@ -1,13 +1,19 @@
+import argparse
 import asyncio
 import uvicorn
 import logging
 import multiprocessing
 import os
-import sys
 import time
 from watchdog.observers import Observer
+from app.services.coin_pipeline import ParallelCoinRunner
 from app.services.coin_scheduler import CoinScheduler
+from app.services.execution_log_store import ExecutionLogStore
+from app.services.file_manager import DataCleaner
 from app.services.file_handler import FileChangeHandler
+from app.services.job_events import JobCompletionEvents
+from app.services.metrics import observe_scheduler
+from app.services.mongodb_service import MongoUserService
 from config import config
 
 # Configure logging
@@ -17,14 +23,21 @@ logger = logging.getLogger("server")
 
 
 class FastAPIServer:
-    def __init__(self):
-        self.config = uvicorn.Config(
-            "app.main:app",
+    def __init__(self, workers: int = 1):
+        """
+        Args:
+            workers (int): Number of uvicorn worker processes.
+        """
+        self.workers = workers
+        self.options = dict(
             host="0.0.0.0",
             port=config.get_port,
             reload=False,
             loop="asyncio",
+            # On SIGTERM, stop accepting and let in-flight requests finish
+            timeout_graceful_shutdown=int(os.getenv("API_GRACEFUL_TIMEOUT", "30")),
         )
+        self.config = uvicorn.Config("app.main:app", **self.options)
         self.server = uvicorn.Server(self.config)
 
     async def start(self):
@@ -33,18 +46,45 @@ class FastAPIServer:
         except Exception as e:
             logger.error(f"Error starting FastAPI server: {e}")
 
+    def run(self):
+        """Serve in this process, or supervise `workers` processes sharing the port."""
+        if self.workers <= 1:
+            asyncio.run(self.start())
+            return
+        # uvicorn's supervisor restarts crashed workers, and restarts them one at
+        # a time on SIGHUP for a rolling restart
+        try:
+            uvicorn.run("app.main:app", workers=self.workers, **self.options)
+        except Exception as e:
+            logger.error(f"Error starting FastAPI workers: {e}")
+
 
-def run_fastapi():
+def run_fastapi(workers: int = 1):
     """Run FastAPI server in a separate process."""
-    server = FastAPIServer()
-    asyncio.run(server.start())
+    server = FastAPIServer(workers=workers)
+    server.run()
 
 
 def run_coin_scheduler():
     """Run CoinScheduler in a separate process."""
+    # Once per process, before the jobs start writing trades and snapshots
+    MongoUserService().ensure_indexes()
     scheduler = CoinScheduler(log_file="scheduler.log")
+    store = ExecutionLogStore()
+    # Set when TRADING_PIPELINE names the per-coin pipeline to run in parallel
+    trading_runner = ParallelCoinRunner.from_env(store=store)
+    # Clean the groups the watcher saw change as soon as each job finishes
+    cleaner = DataCleaner()
+    cleaner.start_watching()
     try:
         scheduler.start()
+        if trading_runner is not None:
+            trading_runner.attach(scheduler.scheduler)
+        cleaner.clean_after_jobs(scheduler.scheduler)
+        # Publish job completions to the append-only store the API process reads
+        job_events = JobCompletionEvents()
+        job_events.attach(scheduler, store=store)
+        observe_scheduler(scheduler.scheduler)
         # Keep the process running
         while True:
             time.sleep(60)  # Sleep to reduce CPU usage
@@ -53,21 +93,42 @@ def run_coin_scheduler():
     except Exception as e:
         logger.error(f"Error running CoinScheduler: {e}")
         scheduler.shutdown()
+    finally:
+        cleaner.stop_watching()
+        cleaner.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the API and the coin scheduler.")
+    parser.add_argument(
+        "folder", nargs="?", default="./data", help="Folder watched for log changes"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("API_WORKERS", "1")),
+        help="Number of API worker processes (default: API_WORKERS or 1)",
+    )
+    return parser.parse_args()
 
 
 def main():
     """Run FastAPI and CoinScheduler processes with log file watching."""
-    if len(sys.argv) > 1:
-        folder_to_watch = os.path.abspath(sys.argv[1])
-    else:
-        folder_to_watch = os.path.abspath("./data")
+    args = parse_args()
+    folder_to_watch = os.path.abspath(args.folder)
+
+    if args.workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        logger.warning(
+            "Running several API workers without PROMETHEUS_MULTIPROC_DIR; "
+            "/metrics will only report the worker that serves the scrape"
+        )
 
-    logger.info("Starting FastAPI and CoinScheduler services...")
+    logger.info(f"Starting FastAPI ({args.workers} worker(s)) and CoinScheduler...")
     logger.info(f"Watching folder: {folder_to_watch} 👀")
     logger.info("Monitoring for changes in log files...")
 
     # Create processes for FastAPI and CoinScheduler
-    fastapi_process = multiprocessing.Process(target=run_fastapi)
+    fastapi_process = multiprocessing.Process(target=run_fastapi, args=(args.workers,))
     scheduler_process = multiprocessing.Process(target=run_coin_scheduler)
 
     # Start the processes
@@ -98,6 +159,9 @@ def main():
         # Terminate processes and stop observer
         fastapi_process.terminate()
         scheduler_process.terminate()
+        # Give the API time to drain in-flight requests
+        fastapi_process.join(int(os.getenv("API_GRACEFUL_TIMEOUT", "30")) + 5)
+        scheduler_process.join(10)
         observer.stop()
         observer.join()
 
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# Import `app` the way run.py does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py is written per deployment; stand in for it with test values
+    config_module = types.ModuleType("config")
+    config_module.config = types.SimpleNamespace(
+        mongodb_uri="mongodb://localhost:27017",
+        mongodb_username="",
+        mongodb_password="",
+        telegram_bot_token="test-token",
+        telegram_chat_id="test-chat",
+        google_client_id="test-client-id",
+        jwt_secret_key="test-secret",
+        jwt_algorithm="HS256",
+        access_token_expire_minutes=30,
+        admin_email="admin@example.com",
+        get_port=8000,
+    )
+    sys.modules["config"] = config_module
+
+
+class StubServer:
+    """
+    Local HTTP server answering from a script of responses.
+
+    Each request pops the next `(status, body, headers)` from `responses`;
+    once the script runs out, `default` is answered. Requests are recorded
+    as `(method, path, json body or None)`.
+    """
+
+    def __init__(self):
+        self.responses = []
+        self.default = (200, {"ok": True}, {})
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                with stub._lock:
+                    stub.requests.append(
+                        (self.command, self.path, json.loads(raw) if raw else None)
+                    )
+                    status, body, headers = (
+                        stub.responses.pop(0) if stub.responses else stub.default
+                    )
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def respond(self, *responses):
+        """Queue `(status, body)` or `(status, body, headers)` responses."""
+        with self._lock:
+            for response in responses:
+                status, body, *headers = response
+                self.responses.append((status, body, headers[0] if headers else {}))
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    server._thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
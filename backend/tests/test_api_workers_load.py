@@ -0,0 +1,35 @@
+import os
+import sys
+from datetime import timedelta
+import pytest
+from bson import ObjectId
+from benchmarks.load import run_load, serve
+
+
+@pytest.mark.skipif(
+    (os.cpu_count() or 1) < 4, reason="Throughput scaling needs at least 4 CPUs"
+)
+def test_throughput_scales_with_worker_count(monkeypatch):
+    pytest.importorskip("mongomock")
+    if getattr(sys.modules.get("config"), "__file__", None) is None:
+        pytest.skip("The API workers need the deployment's config.py")
+    # The real app, so the proprietary trading modules must be installed
+    pytest.importorskip("app.main")
+    from app.users.user import create_access_token
+
+    # Seeded by every worker of the stubbed API
+    user_id = str(ObjectId())
+    monkeypatch.setenv("LOAD_TEST_USER_ID", user_id)
+    token = create_access_token({"sub": user_id}, timedelta(hours=1))
+    headers = {"Authorization": f"Bearer {token.access_token}"}
+
+    rates = {}
+    for workers in (1, 2):
+        with serve("benchmarks.stubbed_api:app", workers=workers) as url:
+            result = run_load(
+                url + "/auth/users/me", 16, duration=3, headers=headers, clients=2
+            )
+        assert result["errors"] == 0
+        rates[workers] = result["rps"]
+
+    assert rates[2] > 1.4 * rates[1]
@@ -0,0 +1,95 @@
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+LEDGER_FIELDS = (
+    "user_investments",
+    "user_withdrawals",
+    "total_deposits",
+    "total_withdrawals",
+    "capital",
+)
+
+
+class _NoTransactions:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, callback):
+        raise OperationFailure("Transaction numbers are only allowed on replica sets", 20)
+
+
+@pytest.fixture
+def use_database(monkeypatch):
+    """Point the Mongo services at a fresh in-memory database per call."""
+    mongomock = pytest.importorskip("mongomock")
+    from app.services import mongo_client, mongodb_service
+    from app.services.user_cache import user_cache
+
+    monkeypatch.setattr(user_cache, "invalidate", lambda user_id: None)
+
+    def use(user_id):
+        client = mongomock.MongoClient()
+        client.start_session = lambda: _NoTransactions()
+        monkeypatch.setattr(mongo_client, "get_mongo_client", lambda: client)
+        monkeypatch.setattr(mongodb_service, "get_mongo_client", lambda: client)
+        service = mongodb_service.MongoUserService()
+        service.users.insert_one(
+            {"_id": ObjectId(user_id), "email": "u@example.com", "balances": {}}
+        )
+        return service
+
+    return use
+
+
+def stored(service, user_id):
+    ledger = service.coin_states.find_one({"_id": "btc"}) or {}
+    user = service.users.find_one({"_id": ObjectId(user_id)})
+    return (
+        {field: ledger.get(field) for field in LEDGER_FIELDS},
+        user.get("balances", {}),
+    )
+
+
+def test_withdrawal_beyond_investment_is_rejected_and_reverted(use_database):
+    user_id = str(ObjectId())
+    service = use_database(user_id)
+    service.apply_balance_change(user_id, "btc", 500.0)
+    # Balance credited outside the ledger, e.g. by an earlier release
+    service.deposit_balance(user_id, "btc", 1000.0)
+
+    with pytest.raises(ValueError, match="Insufficient investment"):
+        service.apply_balance_change(user_id, "btc", -800.0)
+
+    ledger, balances = stored(service, user_id)
+    assert balances == {"btc": 1500.0}
+    assert ledger["capital"] == 500.0
+    assert service.apply_balance_change(user_id, "btc", -200.0) == {
+        "balance": 1300.0,
+        "investment": 300.0,
+    }
+
+
+def test_ledger_matches_capital_manager(use_database):
+    capital_manager = pytest.importorskip("app.services.capital_manager")
+    changes = [500.0, 250.0, -300.0]
+    user_id = str(ObjectId())
+
+    service = use_database(user_id)
+    for amount in changes:
+        service.apply_balance_change(user_id, "btc", amount)
+    applied = stored(service, user_id)
+
+    service = use_database(user_id)
+    manager = capital_manager.CapitalManager(initial_capital=1000.0)
+    manager.load_state()
+    for amount in changes:
+        if amount > 0:
+            manager.deposit(user_id, "btc", amount)
+        else:
+            manager.withdraw(user_id, "btc", -amount)
+
+    assert applied == stored(service, user_id)
@@ -0,0 +1,96 @@
+import threading
+import time
+import pytest
+from apscheduler.events import EVENT_JOB_ERROR
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.services.coin_pipeline import ParallelCoinRunner
+
+release = threading.Event()
+
+
+def trade(coin, cancel_event):
+    if coin == "fail":
+        raise ValueError("no data")
+    time.sleep(0.2)
+
+
+def ignore_cancel(coin, cancel_event):
+    if coin == "slow":
+        release.wait(10)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_coins_run_side_by_side(executor):
+    runner = ParallelCoinRunner(trade, max_workers=4, executor=executor)
+    start = time.monotonic()
+    results = runner.run(["btc", "eth", "sol", "fail"])
+
+    assert time.monotonic() - start < 0.6
+    assert {coin: r["status"] for coin, r in results.items()} == {
+        "btc": "completed",
+        "eth": "completed",
+        "sol": "completed",
+        "fail": "failed",
+    }
+    assert results["fail"]["error"] == "no data"
+
+
+def test_thread_timeout_does_not_wait_for_the_coin():
+    runner = ParallelCoinRunner(ignore_cancel, coin_timeout=0.2, executor="thread")
+    start = time.monotonic()
+    results = runner.run(["slow", "btc"])
+    release.set()
+
+    assert time.monotonic() - start < 2
+    assert results["slow"]["status"] == "timeout"
+    assert results["btc"]["status"] == "completed"
+
+
+def test_attach_runs_the_trading_job_through_the_runner():
+    scheduler = BackgroundScheduler()
+    scheduler.start()
+    errors = []
+    failed = threading.Event()
+
+    def on_error(event):
+        errors.append((event.job_id, str(event.exception)))
+        failed.set()
+
+    scheduler.add_listener(on_error, EVENT_JOB_ERROR)
+    runner = ParallelCoinRunner(
+        trade, executor="thread", coins=lambda: ["btc", "fail"]
+    )
+    runner.attach(scheduler)
+    # Added after attaching, as the chain adds it when triggered
+    scheduler.add_job(lambda: None, id="trading_bot")
+
+    assert failed.wait(5)
+    scheduler.shutdown()
+    assert errors == [
+        ("trading_bot", "Trading pipeline did not complete for 1 of 2 coins: fail")
+    ]
+
+
+def test_scoped_saves_only_write_their_coin(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    from app.services import mongodb_service
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mongodb_service, "get_mongo_client", lambda: client)
+    service = mongodb_service.MongoUserService()
+    service.set_trading_state(
+        {"capital": {"btc": 100.0, "eth": 100.0}, "initial_capital": 1000.0}
+    )
+
+    # Two workers load the same state; each trades and saves everything
+    for coin in ("btc", "eth"):
+        worker = mongodb_service.MongoUserService()
+        state = worker.get_trading_state()
+        state["capital"] = {c: v - 10.0 for c, v in state["capital"].items()}
+        state["initial_capital"] = 0.0
+        with mongodb_service.trading_state_scope([coin]):
+            assert worker.set_trading_state(state)
+
+    state = service.get_trading_state()
+    assert state["capital"] == {"btc": 90.0, "eth": 90.0}
+    assert state["initial_capital"] == 1000.0
@@ -0,0 +1,120 @@
+import os
+import tarfile
+import threading
+import pytest
+from apscheduler.events import EVENT_JOB_EXECUTED
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.services.file_manager import DataCleaner
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "currencies").mkdir()
+    return tmp_path
+
+
+def write(data_dir, name):
+    path = data_dir / "currencies" / name
+    path.write_text("{}")
+    return path
+
+
+def listing(data_dir):
+    return sorted(os.listdir(data_dir / "currencies"))
+
+
+def test_first_incremental_run_picks_up_files_written_while_down(data_dir):
+    write(data_dir, "top_coins_20250101_000000.json")
+    write(data_dir, "prices_20250101_000000.json")
+    DataCleaner(str(data_dir)).clean_timestamped_files(incremental=True).result()
+
+    # Written and removed by hand while no cleaner was running
+    write(data_dir, "top_coins_20250102_000000.json")
+    os.remove(data_dir / "currencies" / "prices_20250101_000000.json")
+
+    cleaner = DataCleaner(str(data_dir))
+    cleaner.clean_timestamped_files(incremental=True).result()
+    assert listing(data_dir) == ["top_coins_20250102_000000.json"]
+    assert cleaner._groups == {
+        ("currencies", "top_coins", "json"): {
+            "top_coins_20250102_000000.json": "20250102_000000"
+        }
+    }
+
+
+def test_reconcile_keeps_files_recorded_during_the_scan(data_dir):
+    cleaner = DataCleaner(str(data_dir))
+    write(data_dir, "top_coins_20250101_000000.json")
+    scan = cleaner._scan
+
+    def scan_then_write():
+        groups = scan()
+        cleaner.record_file(write(data_dir, "top_coins_20250102_000000.json"))
+        return groups
+
+    cleaner._scan = scan_then_write
+    cleaner.load_index()
+    assert set(cleaner._groups[("currencies", "top_coins", "json")]) == {
+        "top_coins_20250101_000000.json",
+        "top_coins_20250102_000000.json",
+    }
+    assert ("currencies", "top_coins", "json") in cleaner._dirty
+
+
+def test_each_run_adds_an_archive_without_rewriting_earlier_ones(data_dir):
+    cleaner = DataCleaner(str(data_dir), archive=True)
+    write(data_dir, "top_coins_20250101_000000.json")
+    write(data_dir, "top_coins_20250101_010000.json")
+    cleaner.clean_timestamped_files(incremental=False).result()
+    archive_dir = data_dir / "archive" / "currencies"
+    (first,) = archive_dir.iterdir()
+    first_bytes = first.read_bytes()
+
+    write(data_dir, "top_coins_20250101_020000.json")
+    cleaner.clean_timestamped_files(incremental=False).result()
+
+    archives = sorted(archive_dir.iterdir())
+    assert [a.name for a in archives] == [
+        "top_coins_20250101.json.000000.tar.gz",
+        "top_coins_20250101.json.010000.tar.gz",
+    ]
+    assert first.read_bytes() == first_bytes
+    with tarfile.open(archives[1]) as tar:
+        assert tar.getnames() == ["top_coins_20250101_010000.json"]
+    assert listing(data_dir) == ["top_coins_20250101_020000.json"]
+
+
+def test_cleanup_returns_before_the_groups_are_processed(data_dir):
+    cleaner = DataCleaner(str(data_dir))
+    release = threading.Event()
+    process_group = cleaner._process_group
+    cleaner._process_group = lambda *args: release.wait(5) and process_group(*args)
+    write(data_dir, "top_coins_20250101_000000.json")
+    write(data_dir, "top_coins_20250101_010000.json")
+
+    future = cleaner.clean_timestamped_files(incremental=False)
+    assert not future.done()
+    release.set()
+    future.result(5)
+    assert listing(data_dir) == ["top_coins_20250101_010000.json"]
+    cleaner.close()
+
+
+def test_cleans_after_each_scheduler_job(data_dir):
+    cleaner = DataCleaner(str(data_dir))
+    scheduler = BackgroundScheduler()
+    scheduler.start()
+    cleaner.clean_after_jobs(scheduler)
+    cleaner.load_index()
+    done = threading.Event()
+
+    def top_coins():
+        for stamp in ("20250101_000000", "20250101_010000"):
+            cleaner.record_file(write(data_dir, f"top_coins_{stamp}.json"))
+
+    scheduler.add_listener(lambda event: done.set(), EVENT_JOB_EXECUTED)
+    scheduler.add_job(top_coins)
+    assert done.wait(5)
+    scheduler.shutdown()
+    cleaner.close()
+    assert listing(data_dir) == ["top_coins_20250101_010000.json"]
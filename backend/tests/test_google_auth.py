@@ -0,0 +1,139 @@
+import time
+import types
+import pytest
+import rsa
+from google.auth import crypt, jwt as google_jwt
+from app.services import google_auth
+from app.services.google_auth import GoogleTokenVerifier
+
+CLIENT_ID = "client-id.apps.googleusercontent.com"
+
+
+@pytest.fixture(scope="module")
+def keys():
+    """Two signing keys by key id, as Google publishes them around a rotation."""
+    generated = {}
+    for key_id in ("key-1", "key-2"):
+        public, private = rsa.newkeys(1024)
+        generated[key_id] = (
+            public.save_pkcs1().decode(),
+            crypt.RSASigner.from_string(private.save_pkcs1(), key_id=key_id),
+        )
+    return generated
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the verifier's monotonic clock with one the test advances."""
+    now = [1000.0]
+    monkeypatch.setattr(
+        google_auth, "time", types.SimpleNamespace(monotonic=lambda: now[0])
+    )
+    return now
+
+
+def make_token(keys, key_id="key-1", **claims):
+    issued = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "user@example.com",
+        "iat": issued,
+        "exp": issued + 3600,
+        **claims,
+    }
+    return google_jwt.encode(keys[key_id][1], payload).decode()
+
+
+def publish(stub_server, keys, key_ids=("key-1",), max_age=None):
+    headers = {"Cache-Control": f"public, max-age={max_age}"} if max_age else {}
+    stub_server.respond(
+        (200, {key_id: keys[key_id][0] for key_id in key_ids}, headers)
+    )
+
+
+def cert_fetches(stub_server):
+    return sum(1 for method, path, _ in stub_server.requests if path == "/certs")
+
+
+def test_verifies_and_serves_later_logins_from_the_cache(stub_server, keys, clock):
+    publish(stub_server, keys, max_age=600)
+    verifier = GoogleTokenVerifier(certs_url=f"{stub_server.url}/certs")
+
+    for _ in range(5):
+        claims = verifier.verify(make_token(keys), CLIENT_ID)
+        assert claims["email"] == "user@example.com"
+    assert cert_fetches(stub_server) == 1
+
+
+def test_refetches_when_max_age_expires(stub_server, keys, clock):
+    publish(stub_server, keys, max_age=60)
+    publish(stub_server, keys, max_age=60)
+    verifier = GoogleTokenVerifier(certs_url=f"{stub_server.url}/certs")
+
+    verifier.verify(make_token(keys), CLIENT_ID)
+    clock[0] += 59
+    verifier.verify(make_token(keys), CLIENT_ID)
+    assert cert_fetches(stub_server) == 1
+
+    clock[0] += 2
+    verifier.verify(make_token(keys), CLIENT_ID)
+    assert cert_fetches(stub_server) == 2
+
+
+def test_uses_default_max_age_without_cache_control(stub_server, keys, clock):
+    publish(stub_server, keys)
+    publish(stub_server, keys)
+    verifier = GoogleTokenVerifier(
+        certs_url=f"{stub_server.url}/certs", default_max_age=120
+    )
+
+    verifier.get_certs()
+    clock[0] += 119
+    verifier.get_certs()
+    assert cert_fetches(stub_server) == 1
+    clock[0] += 2
+    verifier.get_certs()
+    assert cert_fetches(stub_server) == 2
+
+
+def test_unknown_key_id_refetches_once_per_interval(stub_server, keys, clock):
+    publish(stub_server, keys, key_ids=("key-1",), max_age=3600)
+    publish(stub_server, keys, key_ids=("key-1", "key-2"), max_age=3600)
+    verifier = GoogleTokenVerifier(
+        certs_url=f"{stub_server.url}/certs", min_refresh_interval=30
+    )
+    verifier.verify(make_token(keys, "key-1"), CLIENT_ID)
+
+    # Rotated key within the refresh interval: not refetched yet
+    clock[0] += 10
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys, "key-2"), CLIENT_ID)
+    assert cert_fetches(stub_server) == 1
+
+    clock[0] += 30
+    claims = verifier.verify(make_token(keys, "key-2"), CLIENT_ID)
+    assert claims["sub"] == "1234567890"
+    assert cert_fetches(stub_server) == 2
+
+
+def test_keeps_cached_certs_when_refresh_fails(stub_server, keys, clock):
+    publish(stub_server, keys, max_age=60)
+    stub_server.respond((503, {}))
+    verifier = GoogleTokenVerifier(certs_url=f"{stub_server.url}/certs")
+    verifier.verify(make_token(keys), CLIENT_ID)
+
+    clock[0] += 61
+    assert verifier.verify(make_token(keys), CLIENT_ID)["sub"] == "1234567890"
+    assert cert_fetches(stub_server) == 2
+
+
+def test_rejects_wrong_issuer_and_audience(stub_server, keys, clock):
+    publish(stub_server, keys, max_age=600)
+    verifier = GoogleTokenVerifier(certs_url=f"{stub_server.url}/certs")
+
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys, iss="https://evil.example.com"), CLIENT_ID)
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys, aud="someone-else"), CLIENT_ID)
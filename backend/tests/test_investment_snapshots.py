@@ -0,0 +1,140 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from app.services.investment_snapshots import InvestmentSnapshotCache
+
+DETAILS = {
+    "net_investment": 250.0,
+    "current_share_value": 262.5,
+    "portfolio_breakdown": {"capital_portion": 100.0, "position_portion": 162.5},
+    "coin": "btc",
+}
+SUMMARY = {"capital": 400.0, "position_value": 2500.0, "status": "active"}
+
+
+def test_snapshot_is_served_for_the_same_version_and_price():
+    cache = InvestmentSnapshotCache(max_size=10)
+    cache.set("u1", "btc", 7, 1000.0, DETAILS, SUMMARY)
+
+    assert cache.get("u1", "btc", 7, 1000.0) == (DETAILS, SUMMARY)
+    assert cache.stats()["hits"] == 1
+
+
+def test_snapshot_misses_on_new_version_or_any_price_move():
+    cache = InvestmentSnapshotCache(max_size=10)
+    cache.set("u1", "btc", 1, 1000.0, DETAILS, SUMMARY)
+
+    assert cache.get("u1", "btc", 2, 1000.0) is None
+    # No interpolation: even a move well inside 0.1% is recomputed
+    assert cache.get("u1", "btc", 1, 1000.2) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_snapshots_are_copies():
+    cache = InvestmentSnapshotCache(max_size=10)
+    cache.set("u1", "btc", 1, 1000.0, DETAILS, SUMMARY)
+    details, _ = cache.get("u1", "btc", 1, 1000.0)
+    details["portfolio_breakdown"]["capital_portion"] = 0.0
+
+    assert cache.get("u1", "btc", 1, 1000.0)[0] == DETAILS
+
+
+def test_coin_summary_is_shared_per_version_and_price():
+    cache = InvestmentSnapshotCache(max_size=10)
+    cache.set_coin_summary("btc", 1, 1000.0, SUMMARY)
+
+    assert cache.get_coin_summary("btc", 1, 1000.0) == SUMMARY
+    assert cache.get_coin_summary("btc", 1, 1000.3) is None
+    assert cache.get_coin_summary("btc", 2, 1000.0) is None
+
+
+def test_least_recently_used_snapshots_are_evicted():
+    cache = InvestmentSnapshotCache(max_size=2)
+    for user_id in ("u1", "u2", "u3"):
+        cache.set(user_id, "btc", 1, 1000.0, DETAILS, SUMMARY)
+
+    assert cache.get("u1", "btc", 1, 1000.0) is None
+    assert cache.stats()["size"] == 2
+
+
+class _NoTransactions:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, callback):
+        raise OperationFailure("Transaction numbers are only allowed on replica sets", 20)
+
+
+class _StateVersion:
+    """Stands in for AsyncMongoUserService.get_trading_state_version."""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def get_trading_state_version(self):
+        return self.service.get_trading_state_version()
+
+
+@pytest.fixture
+def trading_state(monkeypatch):
+    """The real CapitalManager over an in-memory Mongo holding one deposit."""
+    mongomock = pytest.importorskip("mongomock")
+    capital_manager = pytest.importorskip("app.services.capital_manager")
+    pytest.importorskip("app.trader_bot.coin_trader")
+    from app.services import mongo_client, mongodb_service
+    from app.services.user_cache import user_cache
+
+    client = mongomock.MongoClient()
+    client.start_session = lambda: _NoTransactions()
+    monkeypatch.setattr(mongo_client, "get_mongo_client", lambda: client)
+    monkeypatch.setattr(mongodb_service, "get_mongo_client", lambda: client)
+    monkeypatch.setattr(user_cache, "invalidate", lambda user_id: None)
+
+    service = mongodb_service.MongoUserService()
+    user_id = str(ObjectId())
+    service.users.insert_one(
+        {"_id": ObjectId(user_id), "email": "u@example.com", "balances": {}}
+    )
+    service.apply_balance_change(user_id, "btc", 500.0)
+    return capital_manager.CapitalManager, service, user_id
+
+
+def test_snapshots_match_capital_manager_output(trading_state):
+    from app.services.trading_context import TradingContext
+
+    CapitalManager, service, user_id = trading_state
+    context = TradingContext(
+        lambda: CapitalManager(initial_capital=1000.0), _StateVersion(service)
+    )
+
+    def expected(price):
+        manager = CapitalManager(initial_capital=1000.0)
+        manager.load_state()
+        return (
+            manager.get_user_investment_details(user_id, "btc", price),
+            manager.get_coin_performance_summary("btc", price),
+        )
+
+    async def snapshots(prices):
+        await context.refresh(force=True)
+        return [
+            await context.get_investment_snapshot(user_id, "btc", price)
+            for price in prices
+        ]
+
+    prices = [1000.0, 1000.0, 1000.7, 1500.0]
+    for price, snapshot in zip(prices, asyncio.run(snapshots(prices))):
+        assert snapshot == expected(price)
+    assert context.snapshots.stats()["hits"] == 1
+
+    # A deposit bumps the version: a new manager is swapped in and rebuilt from
+    previous = context.capital_manager
+    service.apply_balance_change(user_id, "btc", 250.0)
+    context.invalidate()
+    (snapshot,) = asyncio.run(snapshots([1000.0]))
+    assert context.capital_manager is not previous
+    assert snapshot == expected(1000.0)
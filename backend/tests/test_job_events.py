@@ -0,0 +1,62 @@
+import types
+from datetime import datetime, timedelta, timezone
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.services.job_events import JobCompletionEvents, JobFailedError
+
+
+@pytest.fixture
+def coin_scheduler():
+    """A CoinScheduler stand-in: a real APScheduler and an in-memory execution log."""
+    log = {}
+    scheduler = BackgroundScheduler()
+    scheduler.start()
+    yield types.SimpleNamespace(
+        scheduler=scheduler, load_execution_log=lambda: dict(log), log=log
+    )
+    scheduler.shutdown(wait=False)
+
+
+def test_wait_for_returns_when_the_job_logs_its_execution(coin_scheduler):
+    events = JobCompletionEvents()
+    events.attach(coin_scheduler)
+    since = datetime.now(timezone.utc)
+
+    def data_cleanup():
+        stamp = datetime.now(timezone.utc) + timedelta(milliseconds=1)
+        coin_scheduler.log["data_cleanup"] = {"last_execution": stamp.isoformat()}
+
+    coin_scheduler.scheduler.add_job(data_cleanup, id="data_cleanup")
+    assert events.wait_for("data_cleanup", since=since, timeout=5) is True
+
+
+def test_wait_for_raises_when_a_job_in_the_chain_fails(coin_scheduler):
+    events = JobCompletionEvents()
+    events.attach(coin_scheduler)
+    since = datetime.now(timezone.utc)
+
+    def top_coins():
+        raise RuntimeError("exchange unavailable")
+
+    coin_scheduler.scheduler.add_job(top_coins, id="top_coins")
+    with pytest.raises(JobFailedError) as failed:
+        events.wait_for("data_cleanup", since=since, timeout=5)
+    assert failed.value.job_id == "top_coins"
+    assert "exchange unavailable" in failed.value.error
+
+
+def test_wait_for_times_out(coin_scheduler):
+    events = JobCompletionEvents()
+    events.attach(coin_scheduler)
+
+    since = datetime.now(timezone.utc)
+    assert events.wait_for("data_cleanup", since=since, timeout=0.1) is False
+
+
+def test_failures_before_the_wait_are_ignored():
+    events = JobCompletionEvents()
+    failed_at = datetime.now(timezone.utc)
+    events.record_failure("top_coins", "earlier run", failed_at=failed_at)
+
+    since = failed_at + timedelta(seconds=1)
+    assert events.wait_for("data_cleanup", since=since, timeout=0.05) is False
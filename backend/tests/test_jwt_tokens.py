@@ -0,0 +1,36 @@
+import time
+import pytest
+from app.services.jwt_tokens import InvalidTokenError, JWTCodec
+
+
+@pytest.fixture
+def codec():
+    return JWTCodec(backend="jose", cache_size=10)
+
+
+def make_token(codec, secret="old-secret", algorithm="HS256"):
+    claims = {"sub": "user@example.com", "exp": int(time.time()) + 3600}
+    return codec.encode(claims, secret, algorithm)
+
+
+def test_cached_token_is_served_without_reverifying(codec):
+    token = make_token(codec)
+    assert codec.decode(token, "old-secret", "HS256")["sub"] == "user@example.com"
+    assert codec.decode(token, "old-secret", "HS256")["sub"] == "user@example.com"
+    assert codec.cache.stats()["hits"] == 1
+
+
+def test_rotated_secret_does_not_hit_the_cache(codec):
+    token = make_token(codec)
+    codec.decode(token, "old-secret", "HS256")
+
+    with pytest.raises(InvalidTokenError):
+        codec.decode(token, "new-secret", "HS256")
+
+
+def test_changed_algorithm_does_not_hit_the_cache(codec):
+    token = make_token(codec)
+    codec.decode(token, "old-secret", "HS256")
+
+    with pytest.raises(InvalidTokenError):
+        codec.decode(token, "old-secret", "HS512")
@@ -0,0 +1,146 @@
+import pytest
+from app.services.messaging import (
+    TELEGRAM_MAX_LENGTH,
+    NotificationSink,
+    Notifier,
+    SinkWorker,
+    TelegramSink,
+    WebhookSink,
+)
+
+
+def no_backoff(sink):
+    """Retry immediately instead of after seconds of exponential backoff."""
+    sink._backoff = lambda attempt: 0.01
+    return sink
+
+
+def test_notification_sink_requires_deliver():
+    class Incomplete(NotificationSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_webhook_retries_server_errors_until_delivered(stub_server):
+    stub_server.respond((503, {}), (502, {}))
+    sink = no_backoff(WebhookSink(f"{stub_server.url}/hook", max_retries=5))
+
+    assert sink.deliver("hello") is True
+    assert [r[2] for r in stub_server.requests] == [{"text": "hello"}] * 3
+
+
+def test_webhook_does_not_retry_client_errors(stub_server):
+    stub_server.respond((400, {"error": "bad"}))
+    sink = no_backoff(WebhookSink(f"{stub_server.url}/hook"))
+
+    assert sink.deliver("hello") is False
+    assert len(stub_server.requests) == 1
+
+
+def test_webhook_gives_up_after_max_retries(stub_server):
+    stub_server.default = (500, {}, {})
+    sink = no_backoff(WebhookSink(f"{stub_server.url}/hook", max_retries=3))
+
+    assert sink.deliver("hello") is False
+    assert len(stub_server.requests) == 3
+
+
+def test_telegram_honors_retry_after(stub_server):
+    stub_server.respond(
+        (429, {"ok": False, "parameters": {"retry_after": 0.2}}),
+    )
+    sink = no_backoff(
+        TelegramSink(
+            bot_token="abc",
+            chat_id="42",
+            api_url=stub_server.url,
+            min_interval=0,
+        )
+    )
+
+    assert sink.deliver("*bold*") is True
+    assert len(stub_server.requests) == 2
+    method, path, body = stub_server.requests[-1]
+    assert (method, path) == ("POST", "/botabc/sendMessage")
+    assert body == {"chat_id": "42", "text": "*bold*", "parse_mode": "Markdown"}
+
+
+def test_worker_coalesces_and_retries_through_the_queue(stub_server):
+    stub_server.respond((503, {}))
+    worker = SinkWorker(
+        no_backoff(WebhookSink(f"{stub_server.url}/hook")), coalesce_window=0.2
+    )
+
+    assert worker.send("first")
+    assert worker.send("second")
+    assert worker.flush(5)
+    worker.stop(1)
+
+    # One coalesced delivery, retried once after the 503
+    assert [r[2] for r in stub_server.requests] == [{"text": "first\n\nsecond"}] * 2
+    metrics = worker.metrics.snapshot()
+    assert (metrics["queued"], metrics["sent"], metrics["dropped"]) == (2, 2, 0)
+
+
+def test_notifier_drops_only_on_the_failing_sink(stub_server):
+    stub_server.default = (500, {}, {})
+    failing = no_backoff(WebhookSink(f"{stub_server.url}/down", max_retries=2))
+    failing.name = "down"
+    delivered = []
+
+    class Recording(NotificationSink):
+        name = "recording"
+
+        def deliver(self, text):
+            delivered.append(text)
+            return True
+
+    notifier = Notifier([failing, Recording()], coalesce_window=0)
+    assert notifier.send("alert")
+    assert notifier.flush(5)
+    notifier.stop(1)
+
+    assert delivered == ["alert"]
+    metrics = notifier.metrics()
+    assert metrics["down"]["dropped"] == 1
+    assert metrics["recording"]["sent"] == 1
+    assert len(stub_server.requests) == 2
+
+
+def telegram_sink(stub_server):
+    return no_backoff(
+        TelegramSink(
+            bot_token="abc", chat_id="42", api_url=stub_server.url, min_interval=0
+        )
+    )
+
+
+def test_telegram_resends_rejected_markdown_as_plain_text(stub_server):
+    stub_server.respond((400, {"ok": False, "description": "can't parse entities"}))
+    sink = telegram_sink(stub_server)
+
+    assert sink.deliver("price_change *up") is True
+    bodies = [r[2] for r in stub_server.requests]
+    assert bodies == [
+        {"chat_id": "42", "text": "price_change *up", "parse_mode": "Markdown"},
+        {"chat_id": "42", "text": "price_change *up"},
+    ]
+
+
+def test_worker_splits_messages_over_the_telegram_limit(stub_server):
+    worker = SinkWorker(telegram_sink(stub_server), coalesce_window=0.2)
+    long_report = "\n".join(f"line {i:05d} " + "x" * 90 for i in range(100))
+
+    assert worker.send("short alert")
+    assert worker.send(long_report)
+    assert worker.flush(5)
+    worker.stop(1)
+
+    texts = [r[2]["text"] for r in stub_server.requests]
+    assert all(len(text) <= TELEGRAM_MAX_LENGTH for text in texts)
+    assert len(texts) == 3
+    assert "\n".join(texts).replace("\n\n", "\n") == "short alert\n" + long_report
+    metrics = worker.metrics.snapshot()
+    assert (metrics["queued"], metrics["sent"], metrics["dropped"]) == (2, 2, 0)
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+from app.services.top_coins_cache import TopCoinsCache
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.threads = set()
+
+    def __call__(self):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        return [{"symbol": "BTC"}, {"symbol": "ETH"}]
+
+
+def watching_cache(tmp_path, loader):
+    cache = TopCoinsCache(loader, data_dir=str(tmp_path))
+    # Stand in for a running watcher; events are fed through notify_file
+    cache.observer = object()
+    return cache
+
+
+def test_reload_records_the_loaded_stamp(tmp_path):
+    (tmp_path / "top_coins_20250101_120000.feather").touch()
+    loader = Loader()
+    cache = watching_cache(tmp_path, loader)
+
+    asyncio.run(cache.get_response(1))
+    # An event for an older snapshot, e.g. the cleaner archiving it
+    cache.notify_file(str(tmp_path / "top_coins_20250101_110000.json"))
+    asyncio.run(cache.get_response(1))
+    assert loader.calls == 1
+
+    cache.notify_file(str(tmp_path / "top_coins_20250101_130000.parquet"))
+    asyncio.run(cache.get_response(1))
+    assert loader.calls == 2
+
+
+def test_reload_runs_off_the_event_loop(tmp_path):
+    loader = Loader()
+    cache = watching_cache(tmp_path, loader)
+
+    async def serve():
+        bodies = await asyncio.gather(*(cache.get_response(2) for _ in range(10)))
+        return threading.get_ident(), bodies
+
+    loop_thread, bodies = asyncio.run(serve())
+    assert loader.calls == 1
+    assert loop_thread not in loader.threads
+    assert len(set(bodies)) == 1
+    assert b'"symbol":"ETH"' in bodies[0]